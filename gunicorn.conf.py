@@ -16,3 +16,27 @@ keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
 # немного гигиены на долгоживущих процессах
 max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
 max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+
+
+# prometheus_client в multiprocess-режиме: воркеры пишут метрики в файлы.
+# Только для gunicorn: воркеры наследуют окружение мастера, а pytest, скрипты и
+# `docker exec` в том же образе остаются в обычном режиме. Пустое значение
+# в окружении отключает режим.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus")
+
+
+def on_starting(server):
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        return
+    # файлы прошлого запуска дали бы накопленные счётчики умерших процессов
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        os.remove(os.path.join(path, name))
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
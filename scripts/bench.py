@@ -0,0 +1,404 @@
+# scripts/bench.py
+"""Нагрузочный бенчмарк API на настоящем приложении и настоящем FilmService.
+
+ES и Redis подменяются in-memory заменителями с задержкой (bench_standins.py),
+запросы идут в ASGI-приложение напрямую через httpx.ASGITransport — без сети,
+так что измеряется сам сервис: роутинг, кеш, сериализация.
+
+    python scripts/bench.py --catalog 10000 --concurrency 32 --duration 20
+    python scripts/bench.py --rate 500 --duration 20 --save-baseline bench.json
+    python scripts/bench.py --rate 500 --duration 20 --baseline bench.json
+    python scripts/bench.py --catalog 500 --duration 2 --max-error-rate 0
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import httpx  # noqa: E402
+from bench_standins import (  # noqa: E402
+    FakeElastic,
+    FakeRedis,
+    Latency,
+    generate_catalog,
+    load_seed,
+    tokens,
+)
+
+from core.settings import settings  # noqa: E402
+from db import elastic, redis  # noqa: E402
+from main import app  # noqa: E402
+from services import (  # noqa: E402
+    cache_generation,
+    cache_invalidation,
+    circuit_breaker,
+    local_cache,
+    rank_views,
+)
+
+OPERATIONS = ("detail", "list", "search")
+API = "/api/v1/films"
+
+
+class Workload:
+    """Генератор запросов: карточки по Zipf, страницы и запросы — случайно."""
+
+    def __init__(
+        self, catalog: List[dict], mix: Dict[str, float], zipf: float, seed: int
+    ):
+        self.rnd = random.Random(seed)
+        self.ids = [doc["id"] for doc in catalog]
+        self.rnd.shuffle(self.ids)
+        # веса 1/rank^s: небольшое число горячих карточек и длинный хвост
+        weights = [1.0 / (rank**zipf) for rank in range(1, len(self.ids) + 1)]
+        self._cum = list(_accumulate(weights))
+        self.genres = sorted({g for doc in catalog for g in doc.get("genre") or []})
+        self.words = sorted({w for doc in catalog for w in tokens(doc.get("title"))})
+        self.ops = [op for op in OPERATIONS if mix.get(op)]
+        self.op_weights = [mix[op] for op in self.ops]
+
+    def next(self) -> Tuple[str, str]:
+        op = self.rnd.choices(self.ops, self.op_weights)[0]
+        if op == "detail":
+            film_id = self.rnd.choices(self.ids, cum_weights=self._cum)[0]
+            return op, f"{API}/{film_id}"
+        if op == "list":
+            page = min(int(self.rnd.expovariate(0.7)) + 1, 20)
+            url = f"{API}/?sort=-imdb_rating&page_size=50&page_number={page}"
+            if self.genres and self.rnd.random() < 0.5:
+                url += f"&genre={self.rnd.choice(self.genres)}"
+            return op, url
+        query = " ".join(
+            self.rnd.choice(self.words) for _ in range(self.rnd.randint(1, 2))
+        )
+        return op, f"{API}/search?query={query}&page_size=50&page_number=1"
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[int, int] = defaultdict(int)
+        self.errors = 0
+        self.started = 0.0
+        self.finished = 0.0
+
+    def add(self, op: str, latency: float, status: Optional[int]) -> None:
+        self.latencies[op].append(latency)
+        if status is None:
+            self.errors += 1
+        else:
+            self.statuses[status] += 1
+            if status >= 500:
+                self.errors += 1
+
+    def report(self) -> Dict[str, Any]:
+        elapsed = max(self.finished - self.started, 1e-9)
+        every = [x for values in self.latencies.values() for x in values]
+        result: Dict[str, Any] = {
+            "requests": len(every),
+            "errors": self.errors,
+            "error_rate": round(self.errors / max(len(every), 1), 6),
+            "elapsed": round(elapsed, 3),
+            "rps": round(len(every) / elapsed, 1),
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "latency_ms": _percentiles(every),
+            "by_operation": {
+                op: {"requests": len(values), "latency_ms": _percentiles(values)}
+                for op, values in sorted(self.latencies.items())
+            },
+        }
+        return result
+
+
+def _accumulate(values: List[float]):
+    total = 0.0
+    for value in values:
+        total += value
+        yield total
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(values)
+
+    def rank(q: float) -> float:
+        # nearest-rank: значение, которое реально наблюдали
+        idx = max(math.ceil(q * len(ordered)) - 1, 0)
+        return round(ordered[idx] * 1000, 3)
+
+    return {"p50": rank(0.50), "p95": rank(0.95), "p99": rank(0.99), "max": rank(1.0)}
+
+
+async def _call(client: httpx.AsyncClient, url: str) -> Optional[int]:
+    try:
+        resp = await client.get(url)
+    except Exception:  # noqa: BLE001 — любой сбой считаем ошибкой запроса
+        return None
+    return resp.status_code
+
+
+async def run_closed(
+    client: httpx.AsyncClient,
+    workload: Workload,
+    recorder: Recorder,
+    concurrency: int,
+    deadline: float,
+    limit: Optional[int],
+) -> None:
+    """Фиксированная конкурентность: N клиентов шлют запросы друг за другом."""
+    sent = 0
+
+    async def user() -> None:
+        nonlocal sent
+        while time.perf_counter() < deadline and (limit is None or sent < limit):
+            sent += 1
+            op, url = workload.next()
+            started = time.perf_counter()
+            status = await _call(client, url)
+            recorder.add(op, time.perf_counter() - started, status)
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+
+
+async def run_open(
+    client: httpx.AsyncClient,
+    workload: Workload,
+    recorder: Recorder,
+    rate: float,
+    deadline: float,
+    limit: Optional[int],
+) -> None:
+    """Фиксированная частота: запросы уходят по расписанию, не дожидаясь ответов.
+
+    Латентность считается от запланированного момента отправки, поэтому отставание
+    генератора не прячет очередь (coordinated omission).
+    """
+    interval = 1.0 / rate
+    tasks = set()
+
+    async def one(op: str, url: str, scheduled: float) -> None:
+        status = await _call(client, url)
+        recorder.add(op, time.perf_counter() - scheduled, status)
+
+    start = time.perf_counter()
+    n = 0
+    while limit is None or n < limit:
+        scheduled = start + n * interval
+        if scheduled >= deadline:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        op, url = workload.next()
+        task = asyncio.create_task(one(op, url, scheduled))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        n += 1
+    if tasks:
+        await asyncio.gather(*tasks)
+
+
+def compare(
+    report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float
+) -> List[str]:
+    """Регрессии относительно baseline: рост доли ошибок, просадка RPS или рост
+    перцентилей. Ошибки проверяются первыми: быстрые отказы улучшают латентность.
+    """
+    problems = []
+    now, was = _error_rate(report), _error_rate(baseline)
+    # при чистом baseline регрессия — любая ошибка
+    if now > was * (1 + tolerance):
+        problems.append(f"error rate {now:.2%} > baseline {was:.2%}")
+    if report["rps"] < baseline["rps"] * (1 - tolerance):
+        problems.append(f"rps {report['rps']} < baseline {baseline['rps']}")
+    for q in ("p50", "p95", "p99"):
+        now, was = report["latency_ms"][q], baseline["latency_ms"][q]
+        if was and now > was * (1 + tolerance):
+            problems.append(f"{q} {now}ms > baseline {was}ms")
+    return problems
+
+
+def _error_rate(report: Dict[str, Any]) -> float:
+    # в старых baseline поля error_rate нет
+    return report["errors"] / max(report["requests"], 1)
+
+
+def install_standins(args: argparse.Namespace, catalog: List[dict]):
+    es = FakeElastic(catalog, Latency(args.es_latency, args.jitter, args.seed))
+    fake_redis = FakeRedis(Latency(args.redis_latency, args.jitter, args.seed + 1))
+    # то же, что делает lifespan в main.py, только с заменителями
+    redis.redis = fake_redis
+    elastic.es = es
+    circuit_breaker.es_breaker = (
+        circuit_breaker.CircuitBreaker(
+            window=settings.ES_BREAKER_WINDOW,
+            min_calls=settings.ES_BREAKER_MIN_CALLS,
+            failure_ratio=settings.ES_BREAKER_FAILURE_RATIO,
+            slow_call_seconds=settings.ES_BREAKER_SLOW_CALL_SECONDS,
+            slow_call_ratio=settings.ES_BREAKER_SLOW_CALL_RATIO,
+            open_seconds=settings.ES_BREAKER_OPEN_SECONDS,
+            half_open_calls=settings.ES_BREAKER_HALF_OPEN_CALLS,
+        )
+        if settings.ES_BREAKER_ENABLED
+        else None
+    )
+    cache_generation.generation = cache_generation.CacheGeneration(
+        fake_redis,
+        key=settings.CACHE_GENERATION_KEY,
+        refresh_interval=settings.CACHE_GENERATION_REFRESH,
+    )
+    if settings.L1_CACHE_ENABLED and not args.no_l1:
+        local_cache.local_cache = local_cache.LocalCache(
+            max_items=settings.L1_CACHE_MAX_ITEMS,
+            max_bytes=settings.L1_CACHE_MAX_BYTES,
+            ttl=settings.L1_CACHE_TTL,
+        )
+        local_cache.compressed_cache = (
+            local_cache.LocalCache(
+                max_items=settings.L1_CACHE_MAX_ITEMS,
+                max_bytes=settings.L1_COMPRESSED_MAX_BYTES,
+                ttl=settings.L1_CACHE_TTL,
+            )
+            if settings.L1_COMPRESSED_MAX_BYTES > 0
+            else None
+        )
+        cache_invalidation.invalidator = cache_invalidation.CacheInvalidator(
+            fake_redis,
+            local_cache.local_cache,
+            channel=settings.CACHE_INVALIDATION_CHANNEL,
+        )
+    else:
+        local_cache.local_cache = None
+        local_cache.compressed_cache = None
+        cache_invalidation.invalidator = None
+    if settings.RANK_VIEWS_ENABLED and not args.no_rank_views:
+        # как после scripts/es_load.py: представления уже построены
+        fake_redis.load_rank_views(catalog, settings.RANK_VIEWS_PREFIX)
+        rank_views.rank_views = rank_views.RankViews(
+            fake_redis, prefix=settings.RANK_VIEWS_PREFIX
+        )
+    else:
+        rank_views.rank_views = None
+    return es, fake_redis
+
+
+async def main_async(args: argparse.Namespace) -> int:
+    # лог каждого запроса клиента съел бы заметную часть CPU бенча
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    seed_docs = load_seed(args.bulk)
+    catalog = generate_catalog(seed_docs, args.catalog, seed=args.seed)
+    mix = dict(
+        (op, float(weight))
+        for op, weight in (part.split("=") for part in args.mix.split(","))
+    )
+    es, fake_redis = install_standins(args, catalog)
+    workload = Workload(catalog, mix, args.zipf, args.seed)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        if args.warmup:
+            warm = Recorder()
+            await run_closed(
+                client, workload, warm, args.concurrency, math.inf, args.warmup
+            )
+
+        recorder = Recorder()
+        recorder.started = time.perf_counter()
+        deadline = recorder.started + args.duration
+        if args.rate:
+            await run_open(
+                client, workload, recorder, args.rate, deadline, args.requests
+            )
+        else:
+            await run_closed(
+                client, workload, recorder, args.concurrency, deadline, args.requests
+            )
+        recorder.finished = time.perf_counter()
+
+    report = recorder.report()
+    report["config"] = {
+        "catalog": args.catalog,
+        "mode": f"rate={args.rate}" if args.rate else f"concurrency={args.concurrency}",
+        "mix": mix,
+        "es_latency": args.es_latency,
+        "redis_latency": args.redis_latency,
+        "l1": local_cache.local_cache is not None,
+    }
+    report["backend_calls"] = {"es": dict(es.calls), "redis": dict(fake_redis.calls)}
+    print(json.dumps(report, indent=2))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print("Baseline saved:", args.save_baseline)
+    if args.max_error_rate is not None and report["error_rate"] > args.max_error_rate:
+        print(
+            f"ERRORS: error rate {report['error_rate']:.2%} > {args.max_error_rate:.2%}"
+        )
+        return 1
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = compare(report, baseline, args.tolerance)
+        for problem in problems:
+            print("REGRESSION:", problem)
+        if problems:
+            return 1
+        print(f"No regressions (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the films API")
+    parser.add_argument("--bulk", default=os.path.join(ROOT, "data/movies.bulk.ndjson"))
+    parser.add_argument("--catalog", type=int, default=10000, help="films in catalog")
+    parser.add_argument("--mix", default="detail=60,list=25,search=15")
+    parser.add_argument(
+        "--zipf", type=float, default=1.1, help="detail popularity skew"
+    )
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rate", type=float, help="fixed request rate (req/s)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--requests", type=int, help="stop after N requests")
+    parser.add_argument("--warmup", type=int, default=500, help="requests not measured")
+    parser.add_argument("--es-latency", type=float, default=0.005, help="seconds")
+    parser.add_argument("--redis-latency", type=float, default=0.0005, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.2, help="fraction of latency")
+    parser.add_argument("--no-l1", action="store_true", help="disable worker L1 cache")
+    parser.add_argument(
+        "--no-rank-views",
+        action="store_true",
+        help="serve rating-ordered lists from ES instead of Redis ZSETs",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", help="compare with a saved report")
+    parser.add_argument("--save-baseline", help="save this report as a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument(
+        "--max-error-rate",
+        type=float,
+        help="fail if the share of failed requests is above this (smoke runs)",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    sys.exit(asyncio.run(main_async(parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+# scripts/bench_standins.py
+"""In-memory заменители Elasticsearch и Redis для бенчмарка.
+
+Реализуют ровно то подмножество API клиентов, которым пользуются FilmService,
+CacheInvalidator, FillLock и CacheGeneration, и добавляют к каждому вызову
+настраиваемую задержку, чтобы профиль был похож на сетевой.
+"""
+
+import asyncio
+import itertools
+import json
+import random
+import re
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from elastic_transport import ApiResponseMeta, HttpHeaders, NodeConfig
+from elasticsearch import NotFoundError
+
+_TOKEN = re.compile(r"\w+")
+_NODE = NodeConfig("http", "bench", 9200)
+
+
+def tokens(text: Optional[str]) -> List[str]:
+    return _TOKEN.findall((text or "").lower())
+
+
+def load_seed(path: str) -> List[dict]:
+    docs = []
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            action = json.loads(line)
+            if "index" in action or "create" in action:
+                docs.append(json.loads(next(f)))
+    return docs
+
+
+def generate_catalog(seed_docs: List[dict], size: int, seed: int = 42) -> List[dict]:
+    """Каталог нужного размера: слова, жанры и рейтинги берутся из исходных фильмов."""
+    rnd = random.Random(seed)
+    words = sorted({w for doc in seed_docs for w in tokens(doc.get("title"))})
+    phrases = [doc.get("description") or "" for doc in seed_docs]
+    genres = sorted({g for doc in seed_docs for g in doc.get("genre") or []})
+    catalog = [dict(doc) for doc in seed_docs[:size]]
+    namespace = uuid.UUID("6ba7b811-9dad-11d1-80b4-00c04fd430c8")
+    for n in range(len(catalog), size):
+        title = " ".join(rnd.choice(words).title() for _ in range(rnd.randint(1, 4)))
+        catalog.append(
+            {
+                "id": str(uuid.uuid5(namespace, f"bench-{seed}-{n}")),
+                "title": title,
+                "description": rnd.choice(phrases),
+                # часть фильмов без рейтинга: проверяем missing: _last
+                "imdb_rating": (
+                    round(rnd.uniform(1.0, 9.9), 1) if rnd.random() > 0.02 else None
+                ),
+                "genre": rnd.sample(genres, k=min(len(genres), rnd.randint(1, 2))),
+            }
+        )
+    return catalog
+
+
+def _not_found(what: str) -> NotFoundError:
+    meta = ApiResponseMeta(
+        status=404, http_version="1.1", headers=HttpHeaders(), duration=0.0, node=_NODE
+    )
+    return NotFoundError(what, meta, {"error": {"type": what}})
+
+
+class Latency:
+    """Задержка вызова: база + равномерный джиттер в долях базы."""
+
+    def __init__(self, base: float, jitter: float = 0.0, seed: int = 0):
+        self.base = base
+        self.jitter = jitter
+        self._rnd = random.Random(seed)
+
+    async def wait(self) -> None:
+        if self.base <= 0:
+            await asyncio.sleep(0)
+            return
+        spread = self.base * self.jitter
+        await asyncio.sleep(self.base + self._rnd.uniform(-spread, spread))
+
+
+class FakeElastic:
+    def __init__(self, docs: List[dict], latency: Latency, index: str = "movies"):
+        self.index = index
+        self.latency = latency
+        self.docs: Dict[str, dict] = {doc["id"]: doc for doc in docs}
+        self._ids = list(self.docs)
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        for doc in docs:
+            for word in tokens(doc.get("title")) + tokens(doc.get("description")):
+                self._postings[word].add(doc["id"])
+        self._orders: Dict[str, List[str]] = {}
+        # готовые выборки под (сортировка, фильтр): стенд не должен есть CPU бенча
+        self._matches: "OrderedDict[Tuple[str, str], List[str]]" = OrderedDict()
+        self._pits = itertools.count(1)
+        self.calls: Dict[str, int] = defaultdict(int)
+
+    # ---------- API клиента ----------
+    def options(self, **_: Any) -> "FakeElastic":
+        # request_timeout из дедлайна: задержку стенд задаёт сам
+        return self
+
+    async def info(self) -> Dict[str, Any]:
+        return {"version": {"number": "8.13.2"}}
+
+    async def get(self, index: str, id: str, **_: Any) -> Dict[str, Any]:
+        self.calls["get"] += 1
+        await self.latency.wait()
+        doc = self.docs.get(id)
+        if doc is None:
+            raise _not_found("document_missing")
+        return {"_index": index, "_id": id, "found": True, "_source": doc}
+
+    async def mget(self, index: str, ids: List[str], **_: Any) -> Dict[str, Any]:
+        self.calls["mget"] += 1
+        await self.latency.wait()
+        return {
+            "docs": [
+                (
+                    {"_id": i, "found": True, "_source": self.docs[i]}
+                    if i in self.docs
+                    else {"_id": i, "found": False}
+                )
+                for i in ids
+            ]
+        }
+
+    async def open_point_in_time(self, index: str, keep_alive: str) -> Dict[str, str]:
+        self.calls["open_pit"] += 1
+        await self.latency.wait()
+        return {"id": f"pit-{next(self._pits)}"}
+
+    async def close_point_in_time(self, id: str) -> Dict[str, Any]:
+        self.calls["close_pit"] += 1
+        return {"succeeded": True}
+
+    async def search(self, **search: Any) -> Dict[str, Any]:
+        self.calls["search"] += 1
+        await self.latency.wait()
+        sort = search.get("sort") or [{"_shard_doc": "asc"}]
+        ids = self._match(search.get("query") or {"match_all": {}}, sort)
+
+        start = search.get("from_", 0)
+        search_after = search.get("search_after")
+        if search_after is not None:
+            # tiebreaker (id или _shard_doc) всегда последний в сортировке
+            last = search_after[-1]
+            start = (last + 1) if isinstance(last, int) else self._after(ids, last)
+        size = search.get("size", 10)
+        page = ids[start : start + size]
+
+        source = search.get("_source", True)
+        hits = []
+        for pos, doc_id in enumerate(page, start):
+            doc = self.docs[doc_id]
+            if isinstance(source, list):
+                doc = {k: v for k, v in doc.items() if k in source}
+            hits.append(
+                {
+                    "_id": doc_id,
+                    "_source": doc,
+                    "sort": self._sort_values(self.docs[doc_id], sort, pos),
+                }
+            )
+        resp: Dict[str, Any] = {
+            "hits": {"total": {"value": len(ids), "relation": "eq"}, "hits": hits}
+        }
+        if "pit" in search:
+            resp["pit_id"] = search["pit"]["id"]
+        return resp
+
+    async def close(self) -> None:
+        return None
+
+    # ---------- внутреннее ----------
+    def _match(self, query: Dict[str, Any], sort: List[Dict[str, Any]]) -> List[str]:
+        key = (json.dumps(sort, sort_keys=True), json.dumps(query, sort_keys=True))
+        cached = self._matches.get(key)
+        if cached is not None:
+            self._matches.move_to_end(key)
+            return cached
+        order = self._order(sort)
+        allowed = self._filter(query)
+        ids = order if allowed is None else [i for i in order if i in allowed]
+        self._matches[key] = ids
+        if len(self._matches) > 4096:
+            self._matches.popitem(last=False)
+        return ids
+
+    def _filter(self, query: Dict[str, Any]) -> Optional[Set[str]]:
+        if "multi_match" in query:
+            # оператор OR, как у multi_match по умолчанию; fuzziness не эмулируем
+            found: Set[str] = set()
+            for word in tokens(query["multi_match"]["query"]):
+                found |= self._postings.get(word, set())
+            return found
+        clauses = query.get("bool", {})
+        allowed: Optional[Set[str]] = None
+        for clause in itertools.chain(
+            clauses.get("must", []), clauses.get("filter", [])
+        ):
+            for field, values in clause.get("terms", {}).items():
+                wanted = set(values)
+                ids = {
+                    i
+                    for i, doc in self.docs.items()
+                    if wanted & set(doc.get(field) or [])
+                }
+                allowed = ids if allowed is None else allowed & ids
+        return allowed
+
+    def _order(self, sort: List[Dict[str, Any]]) -> List[str]:
+        key = json.dumps(sort, sort_keys=True)
+        order = self._orders.get(key)
+        if order is not None:
+            return order
+        order = list(self._ids)
+        # устойчивая сортировка: проходы от младшего ключа к старшему
+        for spec in reversed(sort):
+            ((field, opts),) = spec.items()
+            if field == "_shard_doc":
+                continue
+            desc = (opts if isinstance(opts, str) else opts.get("order")) == "desc"
+            present = [i for i in order if self.docs[i].get(field) is not None]
+            missing = [i for i in order if self.docs[i].get(field) is None]
+            present.sort(key=lambda i: self.docs[i][field], reverse=desc)
+            order = present + missing
+        self._orders[key] = order
+        return order
+
+    def _after(self, ids: List[str], last_id: str) -> int:
+        try:
+            return ids.index(last_id) + 1
+        except ValueError:
+            return len(ids)
+
+    @staticmethod
+    def _sort_values(doc: dict, sort: List[Dict[str, Any]], pos: int) -> List[Any]:
+        values: List[Any] = []
+        for spec in sort:
+            ((field, _),) = spec.items()
+            values.append(pos if field == "_shard_doc" else doc.get(field))
+        return values
+
+
+class FakePipeline:
+    def __init__(self, redis: "FakeRedis"):
+        self.redis = redis
+        self._ops: List[Tuple[str, tuple, dict]] = []
+
+    async def __aenter__(self) -> "FakePipeline":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self._ops.clear()
+
+    def set(self, *args: Any, **kwargs: Any) -> "FakePipeline":
+        self._ops.append(("set", args, kwargs))
+        return self
+
+    def zrange(self, *args: Any) -> "FakePipeline":
+        self._ops.append(("zrange", args, {}))
+        return self
+
+    def exists(self, *args: Any) -> "FakePipeline":
+        self._ops.append(("exists", args, {}))
+        return self
+
+    async def execute(self) -> List[Any]:
+        # один round-trip на весь pipeline
+        await self.redis.latency.wait()
+        self.redis.calls["pipeline"] += 1
+        return [getattr(self.redis, "_" + op)(*a, **kw) for op, a, kw in self._ops]
+
+
+class FakeRedis:
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        # key -> (expires_at | None, value)
+        self._data: Dict[str, Tuple[Optional[float], bytes]] = {}
+        # представления списков: ZSET как упорядоченный список id + HASH строк
+        self._zsets: Dict[str, List[str]] = {}
+        self._hashes: Dict[str, Dict[str, bytes]] = {}
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.published = 0
+
+    # ---------- API клиента ----------
+    async def get(self, key: str) -> Optional[bytes]:
+        self.calls["get"] += 1
+        await self.latency.wait()
+        return self._get(key)
+
+    async def mget(self, keys: Iterable[str]) -> List[Optional[bytes]]:
+        self.calls["mget"] += 1
+        await self.latency.wait()
+        return [self._get(k) for k in keys]
+
+    async def set(self, *args: Any, **kwargs: Any) -> Optional[bool]:
+        self.calls["set"] += 1
+        await self.latency.wait()
+        return self._set(*args, **kwargs)
+
+    async def hmget(self, key: str, fields: List[Any]) -> List[Optional[bytes]]:
+        self.calls["hmget"] += 1
+        await self.latency.wait()
+        values = self._hashes.get(key, {})
+        return [values.get(_as_bytes(f).decode("utf-8")) for f in fields]
+
+    async def zrank(self, key: str, member: str) -> Optional[int]:
+        self.calls["zrank"] += 1
+        await self.latency.wait()
+        try:
+            return self._zsets.get(key, []).index(member)
+        except ValueError:
+            return None
+
+    async def incr(self, key: str) -> int:
+        await self.latency.wait()
+        value = int(self._get(key) or 0) + 1
+        self._set(key, str(value).encode())
+        return value
+
+    async def eval(self, script: str, numkeys: int, key: str, token: str) -> int:
+        # единственный скрипт приложения — снятие лока по токену
+        await self.latency.wait()
+        if self._get(key) == _as_bytes(token):
+            self._data.pop(key, None)
+            return 1
+        return 0
+
+    async def publish(self, channel: str, message: Any) -> int:
+        self.published += 1
+        return 0
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:
+        return FakePipeline(self)
+
+    async def aclose(self) -> None:
+        return None
+
+    def __bool__(self) -> bool:
+        # FilmService проверяет клиент через "if not self.redis"
+        return True
+
+    def load_rank_views(self, docs: List[dict], prefix: str) -> None:
+        """То же содержимое, что строит scripts/es_load.py (rebuild_views)."""
+        ordered = sorted(
+            docs,
+            key=lambda d: (
+                d.get("imdb_rating") is None,
+                -(d.get("imdb_rating") or 0),
+                d["id"],
+            ),
+        )
+        self._hashes[f"{prefix}:rows"] = {
+            d["id"]: json.dumps(
+                {
+                    "uuid": d["id"],
+                    "title": d.get("title", ""),
+                    "imdb_rating": d.get("imdb_rating"),
+                },
+                ensure_ascii=False,
+                separators=(",", ":"),
+            ).encode("utf-8")
+            for d in docs
+        }
+        self._zsets[f"{prefix}:all"] = [d["id"] for d in ordered]
+        for doc in ordered:
+            for genre in doc.get("genre") or []:
+                self._zsets.setdefault(f"{prefix}:genre:{genre}", []).append(doc["id"])
+
+    # ---------- внутреннее ----------
+    def _zrange(self, key: str, start: int, stop: int) -> List[bytes]:
+        members = self._zsets.get(key, [])
+        return [m.encode("utf-8") for m in members[start : stop + 1]]
+
+    def _exists(self, *keys: str) -> int:
+        return sum(1 for k in keys if k in self._zsets or self._get(k) is not None)
+
+    def _get(self, key: str) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def _set(
+        self,
+        key: str,
+        value: Any,
+        ex: Optional[float] = None,
+        px: Optional[int] = None,
+        nx: bool = False,
+    ) -> Optional[bool]:
+        if nx and self._get(key) is not None:
+            return None
+        ttl = ex if ex is not None else (px / 1000 if px is not None else None)
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._data[key] = (expires_at, _as_bytes(value))
+        return True
+
+
+def _as_bytes(value: Any) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode("utf-8")
@@ -1,54 +1,637 @@
 # scripts/es_load.py
+import argparse
+import asyncio
+import hashlib
 import json
 import os
+import re
 import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
-import requests
+import redis.exceptions as redis_exc
+from elasticsearch import ApiError, AsyncElasticsearch, NotFoundError, TransportError
+from redis.asyncio import Redis
 
 ES = os.getenv("ELASTIC_URL", "http://localhost:9200").rstrip("/")
 INDEX = os.getenv("ES_INDEX", "movies")
 ES_WAIT_TIMEOUT = int(os.getenv("ES_WAIT_TIMEOUT", "60"))
 MAPPING_PATH = os.getenv("ES_MAPPING_PATH", "data/movies.mapping.json")
 BULK_PATH = os.getenv("ES_BULK_PATH", "data/movies.bulk.ndjson")
+# хеши содержимого документов, залитых в текущее поколение индекса
+MANIFEST_PATH = os.getenv("ES_MANIFEST_PATH", "data/movies.manifest.json")
+# full — новое поколение и alias swap; incremental — только дельта по манифесту
+LOAD_MODE = os.getenv("ES_LOAD_MODE", "full")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CACHE_INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "films:invalidate")
+CACHE_GENERATION_KEY = os.getenv("CACHE_GENERATION_KEY", "films:generation")
+# списки "по рейтингу" в Redis для API (services/rank_views.py)
+RANK_VIEWS_PREFIX = os.getenv("RANK_VIEWS_PREFIX", "films:rank")
+RANK_VIEWS_BATCH = 1000
 
+# размер одного _bulk: по байтам и по числу документов (что наступит раньше)
+BULK_CHUNK_BYTES = int(os.getenv("ES_BULK_CHUNK_BYTES", str(5 * 1024 * 1024)))
+BULK_CHUNK_DOCS = int(os.getenv("ES_BULK_CHUNK_DOCS", "2000"))
+# сколько _bulk-запросов летит одновременно
+BULK_CONCURRENCY = int(os.getenv("ES_BULK_CONCURRENCY", "4"))
+# повторы упавших документов (429/5xx) с экспоненциальной паузой
+BULK_MAX_RETRIES = int(os.getenv("ES_BULK_MAX_RETRIES", "5"))
+BULK_BACKOFF = float(os.getenv("ES_BULK_BACKOFF", "0.5"))
+# реплики и refresh_interval, которые вернуть индексу после загрузки
+ES_REPLICAS = int(os.getenv("ES_REPLICAS", "0"))
+ES_REFRESH_INTERVAL = os.getenv("ES_REFRESH_INTERVAL", "1s")
+# сколько прошлых поколений индекса оставить для отката
+ES_KEEP_INDICES = int(os.getenv("ES_KEEP_INDICES", "1"))
 
-def wait_es(url: str, timeout: int = ES_WAIT_TIMEOUT):
+RETRIABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# строки одной операции _bulk (уже в байтах, с переводом строки):
+# action + source для index, только action для delete
+BulkItem = Tuple[bytes, ...]
+
+# префиксы ключей кеша списков/поиска в API (services/film.py)
+LIST_PREFIX = "films:list:"
+SEARCH_PREFIX = "films:search:"
+
+
+class BulkStats:
+    def __init__(self):
+        self.indexed = 0
+        self.failed = 0
+        self.retried = 0
+        # чанки, упавшие целиком (неповторяемая ошибка ES)
+        self.failed_chunks = 0
+        self.errors: List[dict] = []
+
+
+async def wait_es(client: AsyncElasticsearch, timeout: int = ES_WAIT_TIMEOUT):
     start = time.time()
     while time.time() - start < timeout:
         try:
-            r = requests.get(url, timeout=2)
-            r.raise_for_status()
+            await client.info()
             return
-        except requests.RequestException:
-            time.sleep(1)
-    raise RuntimeError(f"Elasticsearch not ready at {url}")
+        except (ApiError, TransportError):
+            await asyncio.sleep(1)
+    raise RuntimeError(f"Elasticsearch not ready at {ES}")
 
 
-def main():
-    mapping_path = MAPPING_PATH
-    bulk_path = BULK_PATH
+class Doc:
+    def __init__(self, doc_id: str, action: bytes, source: bytes, genres: List[str]):
+        self.id = doc_id
+        self.action = action
+        self.source = source
+        self.genres = genres
+        self.hash = content_hash(source)
+
+    def item(self) -> BulkItem:
+        return (self.action, self.source)
+
+
+def content_hash(source: bytes) -> str:
+    # канонический JSON: пробелы и порядок ключей в файле на хеш не влияют
+    canonical = json.dumps(json.loads(source), sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def read_bulk_file(path: str) -> Iterator[Doc]:
+    # файл читаем потоково: в памяти только текущий чанк
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            action = json.loads(line)
+            source = next(f).rstrip(b"\n") + b"\n"
+            # индекс задаётся в URL _bulk: цель — новое поколение, а не alias
+            (meta,) = action.values()
+            meta.pop("_index", None)
+            body = json.loads(source)
+            yield Doc(
+                doc_id=str(meta.get("_id") or body["id"]),
+                action=json.dumps(action).encode("utf-8") + b"\n",
+                source=source,
+                genres=list(body.get("genre") or []),
+            )
+
+
+def delete_item(doc_id: str) -> BulkItem:
+    return (json.dumps({"delete": {"_id": doc_id}}).encode("utf-8") + b"\n",)
+
+
+def chunked(items: Iterator[BulkItem]) -> Iterator[List[BulkItem]]:
+    chunk: List[BulkItem] = []
+    size = 0
+    for item in items:
+        item_size = sum(len(line) for line in item)
+        if chunk and (
+            size + item_size > BULK_CHUNK_BYTES or len(chunk) >= BULK_CHUNK_DOCS
+        ):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(item)
+        size += item_size
+    if chunk:
+        yield chunk
+
+
+async def send_chunk(
+    client: AsyncElasticsearch, index: str, chunk: List[BulkItem], stats: BulkStats
+):
+    pending = chunk
+    for attempt in range(BULK_MAX_RETRIES + 1):
+        if attempt:
+            stats.retried += len(pending)
+            await asyncio.sleep(BULK_BACKOFF * 2 ** (attempt - 1))
+        try:
+            resp = await client.bulk(
+                index=index,
+                operations=[line for item in pending for line in item],
+                filter_path="errors,items.*.status,items.*.error",
+            )
+        except ApiError as e:
+            if e.meta.status not in RETRIABLE_STATUSES:
+                raise
+            continue
+        except TransportError:
+            # запрос целиком не дошёл — повторяем весь остаток
+            continue
+
+        if not resp.get("errors"):
+            stats.indexed += len(pending)
+            return
+
+        retry: List[BulkItem] = []
+        for item, result in zip(pending, resp["items"]):
+            (outcome,) = result.values()
+            status = outcome.get("status", 500)
+            # 404 на delete: документа уже нет — цель достигнута
+            if status < 300 or (status == 404 and "delete" in result):
+                stats.indexed += 1
+            elif status in RETRIABLE_STATUSES:
+                retry.append(item)
+            else:
+                stats.failed += 1
+                stats.errors.append(outcome.get("error", {}))
+        if not retry:
+            return
+        # повторяем только упавшие документы
+        pending = retry
+
+    stats.failed += len(pending)
 
-    wait_es(ES)  # дождаться подъёма
 
-    requests.delete(f"{ES}/{INDEX}")
+async def bulk_load(
+    client: AsyncElasticsearch, index: str, items: Iterable[BulkItem]
+) -> BulkStats:
+    stats = BulkStats()
+    slots = asyncio.Semaphore(BULK_CONCURRENCY)
+    # держим все задачи до конца: ошибка любого чанка должна дойти до отчёта
+    tasks: List[Tuple["asyncio.Task[None]", int]] = []
 
+    async def worker(chunk: List[BulkItem]):
+        try:
+            await send_chunk(client, index, chunk, stats)
+        finally:
+            slots.release()
+
+    for chunk in chunked(iter(items)):
+        # не читаем файл дальше, пока все слоты заняты
+        await slots.acquire()
+        tasks.append((asyncio.create_task(worker(chunk)), len(chunk)))
+    results = await asyncio.gather(*(task for task, _ in tasks), return_exceptions=True)
+    for (_, size), result in zip(tasks, results):
+        if isinstance(result, BaseException):
+            stats.failed_chunks += 1
+            stats.failed += size
+            stats.errors.append({"chunk": repr(result)})
+    return stats
+
+
+async def current_indices(client: AsyncElasticsearch) -> List[str]:
+    try:
+        resp = await client.indices.get_alias(name=INDEX)
+    except NotFoundError:
+        return []
+    return list(resp.keys())
+
+
+async def swap_alias(client: AsyncElasticsearch, new_index: str):
+    actions: List[dict] = [{"add": {"index": new_index, "alias": INDEX}}]
+    old_indices = await current_indices(client)
+    for old in old_indices:
+        actions.append({"remove": {"index": old, "alias": INDEX}})
+    if not old_indices and await client.indices.exists(index=INDEX):
+        # старая схема: INDEX — обычный индекс; удаляем его в той же атомарной операции
+        actions.append({"remove_index": {"index": INDEX}})
+    await client.indices.update_aliases(actions=actions)
+
+
+# только поколения, созданные load_full: INDEX_ГГГГММДДччммсс
+GENERATION_RE = re.compile(re.escape(INDEX) + r"_\d{14}")
+
+
+async def drop_old_generations(client: AsyncElasticsearch, keep: str):
+    resp = await client.indices.get(index=f"{INDEX}_*", expand_wildcards="open")
+    # чужие индексы с тем же префиксом (movies_archive и т.п.) не трогаем
+    old = sorted(
+        name for name in resp if name != keep and GENERATION_RE.fullmatch(name)
+    )
+    stale = old[: max(len(old) - ES_KEEP_INDICES, 0)]
+    for name in stale:
+        await client.indices.delete(index=name)
+        print("Old index deleted:", name)
+
+
+def load_manifest(path: str) -> Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_manifest(path: str, index: str, docs: Dict[str, dict]):
+    # пишем через временный файл: оборванный запуск не портит манифест
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"index": index, "docs": docs}, f, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def manifest_entry(doc: Doc) -> dict:
+    return {"h": doc.hash, "g": doc.genres}
+
+
+def report(stats: BulkStats, elapsed: float):
+    print(
+        f"Bulk loaded: {stats.indexed} docs, {stats.failed} failed "
+        f"({stats.failed_chunks} chunks), {stats.retried} retried in {elapsed:.2f}s "
+        f"({stats.indexed / elapsed if elapsed else 0:.0f} docs/s)"
+    )
+    for error in stats.errors[:10]:
+        print("  error:", error)
+
+
+async def load_full(
+    client: AsyncElasticsearch,
+    mapping_path: str,
+    bulk_path: str,
+    manifest_path: Optional[str] = None,
+):
     with open(mapping_path, "r", encoding="utf-8") as f:
         mapping = json.load(f)
 
-    r = requests.put(f"{ES}/{INDEX}", json=mapping)
-    r.raise_for_status()
-    print("Index created:", r.json())
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+    new_index = f"{INDEX}_{stamp}"
+    # на время загрузки: без реплик и без refresh
+    settings = dict(mapping.get("settings", {}))
+    settings.update({"number_of_replicas": 0, "refresh_interval": "-1"})
+    await client.indices.create(
+        index=new_index, mappings=mapping.get("mappings"), settings=settings
+    )
+    print("Index created:", new_index)
+
+    docs: Dict[str, dict] = {}
 
-    with open(bulk_path, "rb") as f:
-        r = requests.post(
-            f"{ES}/_bulk", data=f, headers={"Content-Type": "application/x-ndjson"}
+    def items() -> Iterator[BulkItem]:
+        for doc in read_bulk_file(bulk_path):
+            docs[doc.id] = manifest_entry(doc)
+            yield doc.item()
+
+    started = time.monotonic()
+    stats = await bulk_load(client, new_index, items())
+    report(stats, time.monotonic() - started)
+    if stats.failed:
+        raise RuntimeError(
+            f"{stats.failed} documents ({stats.failed_chunks} whole chunks) failed, "
+            "alias not switched"
         )
-    r.raise_for_status()
-    print("Bulk loaded")
 
-    requests.post(f"{ES}/{INDEX}/_refresh")
+    await client.indices.put_settings(
+        index=new_index,
+        settings={
+            "number_of_replicas": ES_REPLICAS,
+            "refresh_interval": ES_REFRESH_INTERVAL,
+        },
+    )
+    await client.indices.refresh(index=new_index)
     print("Refreshed")
 
+    await swap_alias(client, new_index)
+    print(f"Alias {INDEX} -> {new_index}")
+    await drop_old_generations(client, keep=new_index)
+    if manifest_path:
+        save_manifest(manifest_path, new_index, docs)
+    return new_index
+
+
+def diff_manifest(
+    docs: Iterable[Doc], known: Dict[str, dict]
+) -> Tuple[List[Doc], List[str], Dict[str, dict]]:
+    """Новые/изменённые документы, удалённые id и манифест после загрузки."""
+    changed: List[Doc] = []
+    current: Dict[str, dict] = {}
+    for doc in docs:
+        current[doc.id] = manifest_entry(doc)
+        old = known.get(doc.id)
+        if old is None or old["h"] != doc.hash:
+            changed.append(doc)
+    deleted = sorted(set(known) - set(current))
+    return changed, deleted, current
+
+
+class Delta:
+    """Итог инкрементальной загрузки относительно манифеста."""
+
+    def __init__(self, changed: List[Doc], deleted: List[str], known: Dict[str, dict]):
+        self.changed = changed
+        # удалённые id -> жанры, в которых они были
+        self.deleted = {doc_id: known[doc_id].get("g", []) for doc_id in deleted}
+        # прежние жанры изменённых фильмов
+        self.old_genres = {
+            doc.id: known.get(doc.id, {}).get("g", []) for doc in changed
+        }
+
+    @property
+    def ids(self) -> Set[str]:
+        return {doc.id for doc in self.changed} | set(self.deleted)
+
+    @property
+    def genres(self) -> Set[str]:
+        genres: Set[str] = set()
+        for doc in self.changed:
+            genres.update(doc.genres)
+            # жанры, из которых фильм ушёл, тоже затронуты
+            genres.update(self.old_genres[doc.id])
+        for old in self.deleted.values():
+            genres.update(old)
+        return genres
+
+
+async def load_incremental(
+    client: AsyncElasticsearch, mapping_path: str, bulk_path: str, manifest_path: str
+) -> Optional[Delta]:
+    """Шлёт в индекс только дельту и возвращает её.
+
+    None — дельту посчитать не удалось и была выполнена полная загрузка.
+    """
+    manifest = load_manifest(manifest_path)
+    indices = await current_indices(client)
+    if manifest is None or indices != [manifest.get("index")]:
+        # манифест не описывает то, что сейчас за alias, — дельте верить нельзя
+        print("Manifest does not match alias target, falling back to full load")
+        await load_full(client, mapping_path, bulk_path, manifest_path)
+        return None
+
+    index = manifest["index"]
+    known: Dict[str, dict] = manifest.get("docs", {})
+    changed, deleted, current = diff_manifest(read_bulk_file(bulk_path), known)
+    print(
+        f"Delta: {len(changed)} new/changed, {len(deleted)} deleted, "
+        f"{len(current) - len(changed)} unchanged"
+    )
+    delta = Delta(changed, deleted, known)
+    if not changed and not deleted:
+        return delta
+
+    items: List[BulkItem] = [doc.item() for doc in changed]
+    items.extend(delete_item(doc_id) for doc_id in deleted)
+    started = time.monotonic()
+    stats = await bulk_load(client, index, items)
+    report(stats, time.monotonic() - started)
+    if stats.failed:
+        # манифест не трогаем: следующий запуск пошлёт ту же дельту ещё раз
+        raise RuntimeError(f"{stats.failed} documents failed, manifest not updated")
+    await client.indices.refresh(index=index)
+    save_manifest(manifest_path, index, current)
+    return delta
+
+
+def _key_params(key: str, prefix: str) -> Dict[str, str]:
+    return dict(
+        part.split("=", 1) for part in key[len(prefix) :].split("|") if "=" in part
+    )
+
+
+async def bump_generation(redis: Redis) -> int:
+    """Новое поколение кеша API: все прежние ключи перестают читаться сразу."""
+    return int(await redis.incr(CACHE_GENERATION_KEY))
+
+
+async def purge_cache(redis: Redis, ids: Set[str], genres: Set[str]) -> int:
+    """Удаляет карточки изменённых фильмов и затронутые страницы списков/поиска."""
+    # ключи API живут в пространстве текущего поколения: v<N>:<key>
+    prefix = f"v{int(await redis.get(CACHE_GENERATION_KEY) or 0)}:"
+    keys: List[str] = sorted(prefix + doc_id for doc_id in ids)
+    async for raw in redis.scan_iter(match=prefix + LIST_PREFIX + "*", count=1000):
+        key = raw.decode("utf-8")
+        genre = _key_params(key, prefix + LIST_PREFIX).get("genre")
+        # общие списки меняются всегда, жанровые — только для затронутых жанров
+        if genre is None or genre in genres:
+            keys.append(key)
+    # по запросу нельзя понять, попадёт ли в него фильм, — чистим весь поиск
+    async for raw in redis.scan_iter(match=prefix + SEARCH_PREFIX + "*", count=1000):
+        keys.append(raw.decode("utf-8"))
+
+    for start in range(0, len(keys), 1000):
+        await redis.unlink(*keys[start : start + 1000])
+    # L1 воркеров API: то же сообщение, что шлёт CacheInvalidator.publish
+    message = json.dumps({"o": "es_load", "k": keys})
+    await redis.publish(CACHE_INVALIDATION_CHANNEL, message)
+    return len(keys)
+
+
+def rank_score(rating: Optional[float]) -> float:
+    # ZRANGE по возрастанию = рейтинг по убыванию, без рейтинга — в конце;
+    # равные score Redis упорядочивает по id — как tiebreaker в API
+    return float("inf") if rating is None else -float(rating)
+
+
+def view_row(doc: Doc) -> Tuple[bytes, float]:
+    """Строка FilmListItem (как её отдаёт API) и score фильма."""
+    body = json.loads(doc.source)
+    row = {
+        "uuid": doc.id,
+        "title": body.get("title", ""),
+        "imdb_rating": body.get("imdb_rating"),
+    }
+    raw = json.dumps(row, ensure_ascii=False, separators=(",", ":"))
+    return raw.encode("utf-8"), rank_score(body.get("imdb_rating"))
+
+
+def _view_key(prefix: str, genre: Optional[str]) -> str:
+    return f"{prefix}:genre:{genre}" if genre else f"{prefix}:all"
+
+
+async def rebuild_views(redis: Redis, docs: Iterable[Doc]) -> int:
+    """Строит представления во временных ключах и атомарно подменяет живые."""
+    tmp = f"{RANK_VIEWS_PREFIX}:tmp:{uuid.uuid4().hex}"
+    genres: Set[str] = set()
+    count = 0
+    batch: List[Doc] = []
+
+    async def flush():
+        rows: Dict[str, bytes] = {}
+        scores: Dict[Optional[str], Dict[str, float]] = defaultdict(dict)
+        for doc in batch:
+            rows[doc.id], score = view_row(doc)
+            for genre in [None] + doc.genres:
+                scores[genre][doc.id] = score
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.hset(f"{tmp}:rows", mapping=rows)
+            for genre, members in scores.items():
+                pipe.zadd(_view_key(tmp, genre), members)
+            await pipe.execute()
+        batch.clear()
+
+    for doc in docs:
+        batch.append(doc)
+        genres.update(doc.genres)
+        count += 1
+        if len(batch) >= RANK_VIEWS_BATCH:
+            await flush()
+    if batch:
+        await flush()
+
+    genres_key = f"{RANK_VIEWS_PREFIX}:genres"
+    old_genres = {g.decode("utf-8") for g in await redis.smembers(genres_key)}
+    async with redis.pipeline(transaction=True) as pipe:
+        if count:
+            pipe.rename(f"{tmp}:rows", f"{RANK_VIEWS_PREFIX}:rows")
+            for genre in [None] + sorted(genres):
+                pipe.rename(_view_key(tmp, genre), _view_key(RANK_VIEWS_PREFIX, genre))
+        else:
+            pipe.delete(f"{RANK_VIEWS_PREFIX}:rows", f"{RANK_VIEWS_PREFIX}:all")
+        for genre in old_genres - genres:
+            pipe.delete(_view_key(RANK_VIEWS_PREFIX, genre))
+        pipe.delete(genres_key)
+        if genres:
+            pipe.sadd(genres_key, *genres)
+        await pipe.execute()
+    return count
+
+
+async def apply_views_delta(redis: Redis, delta: Delta) -> None:
+    """Точечно обновляет представления: изменённые фильмы и удалённые id."""
+    async with redis.pipeline(transaction=True) as pipe:
+        genres: Set[str] = set()
+        for doc in delta.changed:
+            row, score = view_row(doc)
+            pipe.hset(f"{RANK_VIEWS_PREFIX}:rows", doc.id, row)
+            for genre in [None] + doc.genres:
+                pipe.zadd(_view_key(RANK_VIEWS_PREFIX, genre), {doc.id: score})
+            for genre in set(delta.old_genres[doc.id]) - set(doc.genres):
+                pipe.zrem(_view_key(RANK_VIEWS_PREFIX, genre), doc.id)
+            genres.update(doc.genres)
+        for doc_id, old in delta.deleted.items():
+            pipe.hdel(f"{RANK_VIEWS_PREFIX}:rows", doc_id)
+            for genre in [None] + old:
+                pipe.zrem(_view_key(RANK_VIEWS_PREFIX, genre), doc_id)
+        if genres:
+            pipe.sadd(f"{RANK_VIEWS_PREFIX}:genres", *genres)
+        await pipe.execute()
+
+
+async def update_views(redis: Redis, delta: Optional[Delta], bulk_path: str) -> None:
+    # дельту можно применить только к уже построенным представлениям
+    if delta is not None and await redis.exists(f"{RANK_VIEWS_PREFIX}:all"):
+        if not (delta.changed or delta.deleted):
+            return
+        await apply_views_delta(redis, delta)
+        print(f"Rank views updated: {len(delta.ids)} films")
+    else:
+        count = await rebuild_views(redis, read_bulk_file(bulk_path))
+        print(f"Rank views rebuilt: {count} films")
+    # страницы представлений в L1 воркеров: ключ v<N>:<prefix>:...
+    prefix = f"v{int(await redis.get(CACHE_GENERATION_KEY) or 0)}:{RANK_VIEWS_PREFIX}:"
+    message = json.dumps({"o": "es_load", "k": [], "p": [prefix]})
+    await redis.publish(CACHE_INVALIDATION_CHANNEL, message)
+
+
+async def update_cache(
+    delta: Optional[Delta], bulk_path: Optional[str] = None, purge: bool = True
+):
+    redis = Redis.from_url(REDIS_URL)
+    try:
+        # представления — копия индекса, а не кеш: обновляются и при --no-purge
+        if bulk_path:
+            await update_views(redis, delta, bulk_path)
+        if not purge:
+            print(
+                "API cache not purged (--no-purge): cached pages and cards may "
+                "disagree with the index and rank views until their TTL"
+            )
+        elif delta is None:
+            generation = await bump_generation(redis)
+            print("Cache generation bumped to", generation)
+        elif delta.changed or delta.deleted:
+            purged = await purge_cache(redis, delta.ids, delta.genres)
+            print(f"Cache purged: {purged} keys")
+    except redis_exc.RedisError as e:
+        # кеш дотухнет по TTL; сама загрузка уже прошла
+        print("Cache update failed:", e)
+    finally:
+        await redis.close()
+
+
+async def main_async(args: argparse.Namespace):
+    if args.mode == "bump":
+        await update_cache(None)
+        return
+    if args.mode == "views":
+        # только представления из файла, ES и кеш не трогаем
+        redis = Redis.from_url(REDIS_URL)
+        try:
+            await update_views(redis, None, args.bulk)
+        finally:
+            await redis.close()
+        return
+
+    client = AsyncElasticsearch(
+        hosts=[ES], connections_per_node=BULK_CONCURRENCY, request_timeout=120
+    )
+    try:
+        await wait_es(client)  # дождаться подъёма
+        if args.mode == "full":
+            await load_full(client, args.mapping, args.bulk, args.manifest)
+            delta = None
+        else:
+            delta = await load_incremental(
+                client, args.mapping, args.bulk, args.manifest
+            )
+    finally:
+        await client.close()
+
+    if args.changed_ids and delta is not None:
+        with open(args.changed_ids, "w", encoding="utf-8") as f:
+            f.writelines(doc_id + "\n" for doc_id in sorted(delta.ids))
+    # полная загрузка — новое поколение, дельта — точечная чистка
+    await update_cache(delta, args.bulk, purge=not args.no_purge)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load movies into Elasticsearch")
+    parser.add_argument(
+        "--mode", choices=["full", "incremental", "bump", "views"], default=LOAD_MODE
+    )
+    parser.add_argument("--mapping", default=MAPPING_PATH)
+    parser.add_argument("--bulk", default=BULK_PATH)
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument(
+        "--changed-ids", help="file to write ids of new/changed/deleted films to"
+    )
+    parser.add_argument(
+        "--no-purge",
+        action="store_true",
+        help="do not purge API cache in Redis (rank views are still updated)",
+    )
+    return parser.parse_args()
+
+
+def main():
+    asyncio.run(main_async(parse_args()))
+
 
 if __name__ == "__main__":
     main()
@@ -1,46 +1,198 @@
 # src/api/v1/films.py
 
+import asyncio
+import zlib
 from http import HTTPStatus
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional, Type, Union
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 
+from core import deadline
+from core.compression import ENCODINGS, compress, mark_encoded, negotiate
 from core.pagination import PaginationParams
-from models.film import FilmDetail, FilmListItem
+from core.query import STOP_WORDS, normalize_query
+from core.settings import settings
+from models.film import (
+    Film,
+    FilmBatch,
+    FilmBatchRequest,
+    FilmDetail,
+    FilmListEnvelope,
+    FilmListItem,
+)
+from services import local_cache
+from services.cache_entry import CacheEntry
 from services.film import FilmService, get_film_service
+from services.hot_keys import HotKeyTracker, get_hot_keys
+from services.suggest import SuggestService, get_suggest_service
 
 router = APIRouter()
 
+# заголовок с курсором следующей страницы
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+STALE_HEADER = "X-Cache-Stale"
+PARTIAL_HEADER = "X-Partial-Results"
+
+CURSOR_DESCRIPTION = (
+    "Курсор из заголовка `X-Next-Cursor` предыдущего ответа. "
+    "Если передан, `page_number` игнорируется."
+)
+PIT_DESCRIPTION = (
+    "Листать курсором по неизменному снапшоту индекса (point-in-time). "
+    "Такие страницы не кешируются."
+)
+FIELDS_DESCRIPTION = (
+    "Поля ответа через запятую, например `uuid,title` (по умолчанию все). "
+    "Остальные поля не читаются из ES и не попадают в ответ."
+)
+ENVELOPE_DESCRIPTION = (
+    "Вернуть объект `{items, total, genres}`: страница, число найденных фильмов "
+    "(`relation: gte` — подсчёт остановлен на пороге) и фасеты по жанрам."
+)
+
+
+async def _cached_response(
+    entry: CacheEntry,
+    request: Optional[Request] = None,
+    cache_control: Optional[str] = None,
+) -> Response:
+    # тело уже сериализовано под response_model — отдаём байты как есть,
+    # без построения и валидации моделей
+    headers = {}
+    if entry.next_cursor:
+        headers[NEXT_CURSOR_HEADER] = entry.next_cursor
+    if entry.degraded:
+        # ES недоступен, отдана последняя известная копия
+        headers[STALE_HEADER] = "1"
+    if entry.partial:
+        # ES не успел опросить все шарды за дедлайн запроса
+        headers[PARTIAL_HEADER] = "1"
+    if request is not None:
+        headers["ETag"] = entry.etag
+        headers["Cache-Control"] = cache_control if entry.cacheable else "no-store"
+        if settings.HTTP_VARY:
+            headers["Vary"] = settings.HTTP_VARY
+        if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+            # у клиента актуальная копия — тело не отправляем
+            return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+        encoding = _encoding(request, entry)
+        if encoding is not None:
+            body = await _compressed(entry, encoding)
+            response = Response(
+                content=body, media_type="application/json", headers=headers
+            )
+            # middleware увидит Content-Encoding и второй раз не сожмёт
+            mark_encoded(response.headers, encoding, len(body))
+            return response
+    return Response(
+        content=entry.payload, media_type="application/json", headers=headers
+    )
+
+
+async def _compressed(entry: CacheEntry, encoding: str) -> bytes:
+    # ETag — всегда хеш текущего тела (CacheEntry.etag): горячее тело сжимается
+    # один раз на воркер, а байты учитываются в лимите своего LRU
+    cache = local_cache.compressed_cache
+    key = f"{encoding}:{entry.etag}"
+    body = cache.get(key) if cache is not None else None
+    if body is None:
+        body = await compress(
+            entry.payload, encoding, settings.COMPRESSION_THREAD_MIN_BYTES
+        )
+        if cache is not None:
+            cache.set(key, body, len(body))
+    return body
+
+
+def _encoding(request: Request, entry: CacheEntry) -> Optional[str]:
+    if (
+        not settings.COMPRESSION_ENABLED
+        or len(entry.payload) < settings.COMPRESSION_MIN_BYTES
+    ):
+        return None
+    return negotiate(request.headers.get("accept-encoding"), ENCODINGS)
+
+
+def _parse_fields(fields: Optional[str], model: Type[BaseModel]) -> Optional[List[str]]:
+    """Поля из `fields=a,b` в порядке модели (одинаковый ключ кеша); None — все."""
+    if not fields:
+        return None
+    selected = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = sorted(selected - set(model.model_fields))
+    if unknown:
+        raise HTTPException(
+            status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
+            detail=f"unknown fields: {', '.join(unknown)}",
+        )
+    return [f for f in model.model_fields if f in selected] or None
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match сравнивается "слабо": W/"x" совпадает с "x"
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
 
 # ================================
 # 📋 Список фильмов
 # ================================
 @router.get(
     "/",
-    response_model=List[FilmListItem],
+    response_model=Union[List[FilmListItem], FilmListEnvelope],
     summary="List films",
     description=(
         "Список фильмов с сортировкой, пагинацией и фильтром по жанру.\n\n"
         "- Сортировка: передайте поле с префиксом `-` (например, `-imdb_rating`).\n"
         "- Пагинация: `page_number` и `page_size`.\n"
-        "- Фильтр по жанру: `genre` — UUID жанра."
+        "- Глубокие страницы: курсор `cursor` из заголовка `X-Next-Cursor`.\n"
+        "- Фильтр по жанру: `genre` — UUID жанра.\n"
+        "- `envelope=true` — страница вместе с total и фасетами по жанрам."
     ),
 )
 async def films_list(
+    request: Request,
     sort: Optional[str] = Query(default="-imdb_rating", description="..."),
     genre: Optional[str] = Query(
         default=None, description="UUID жанра для фильтрации."
     ),
+    cursor: Optional[str] = Query(default=None, description=CURSOR_DESCRIPTION),
+    pit: bool = Query(default=False, description=PIT_DESCRIPTION),
+    envelope: bool = Query(default=False, description=ENVELOPE_DESCRIPTION),
+    fields: Optional[str] = Query(default=None, description=FIELDS_DESCRIPTION),
     pagination: PaginationParams = Depends(),
     film_service: FilmService = Depends(get_film_service),
-) -> List[FilmListItem]:
-    return await film_service.list_films(
-        sort=sort,
-        page_number=pagination.page_number,
-        page_size=pagination.page_size,
-        genre=genre,
-    )
+    hot_keys: Optional[HotKeyTracker] = Depends(get_hot_keys),
+) -> Response:
+    selected = _parse_fields(fields, FilmListItem)
+    if hot_keys and cursor is None and not pit:
+        hot_keys.record(
+            "list",
+            sort=sort,
+            genre=genre,
+            page_number=pagination.page_number,
+            page_size=pagination.page_size,
+            envelope=envelope or None,
+            fields=selected,
+        )
+    with deadline.budget(settings.DEADLINE_LIST):
+        entry = await film_service.list_films_raw(
+            sort=sort,
+            page_number=pagination.page_number,
+            page_size=pagination.page_size,
+            genre=genre,
+            cursor=cursor,
+            pit=pit,
+            envelope=envelope,
+            fields=selected,
+        )
+    return await _cached_response(entry, request, settings.HTTP_CACHE_CONTROL_LIST)
 
 
 # ================================
@@ -48,26 +200,158 @@ async def films_list(
 # ================================
 @router.get(
     "/search",
-    response_model=List[FilmListItem],
+    response_model=Union[List[FilmListItem], FilmListEnvelope],
     summary="Search films",
     description=(
         "Полнотекстовый поиск по названию и описанию фильмов.\n\n"
         "- Поле запроса: `query` (минимум 1 символ).\n"
         "- Сортировка результата по рейтингу `imdb_rating` по убыванию; "
         "значения `None` — в конце.\n"
-        "- Пагинация: `page_number` и `page_size`."
+        "- Пагинация: `page_number` и `page_size`; глубже — курсор `cursor`.\n"
+        "- `envelope=true` — страница вместе с total и фасетами по жанрам."
     ),
 )
 async def films_search(
+    request: Request,
     query: str = Query(min_length=1, description="Строка поиска (минимум 1 символ)."),
+    cursor: Optional[str] = Query(default=None, description=CURSOR_DESCRIPTION),
+    pit: bool = Query(default=False, description=PIT_DESCRIPTION),
+    envelope: bool = Query(default=False, description=ENVELOPE_DESCRIPTION),
+    fields: Optional[str] = Query(default=None, description=FIELDS_DESCRIPTION),
     pagination: PaginationParams = Depends(),
     film_service: FilmService = Depends(get_film_service),
-) -> List[FilmListItem]:
-    return await film_service.search_films(
-        query_str=query,
-        page_number=pagination.page_number,
-        page_size=pagination.page_size,
-    )
+    hot_keys: Optional[HotKeyTracker] = Depends(get_hot_keys),
+) -> Response:
+    selected = _parse_fields(fields, FilmListItem)
+    if hot_keys and cursor is None and not pit:
+        hot_keys.record(
+            "search",
+            query=normalize_query(query, STOP_WORDS),
+            page_number=pagination.page_number,
+            page_size=pagination.page_size,
+            envelope=envelope or None,
+            fields=selected,
+        )
+    with deadline.budget(settings.DEADLINE_SEARCH):
+        entry = await film_service.search_films_raw(
+            query_str=query,
+            page_number=pagination.page_number,
+            page_size=pagination.page_size,
+            cursor=cursor,
+            pit=pit,
+            envelope=envelope,
+            fields=selected,
+        )
+    return await _cached_response(entry, request, settings.HTTP_CACHE_CONTROL_SEARCH)
+
+
+# ================================
+# 💡 Подсказки по названию
+# ================================
+@router.get(
+    "/suggest",
+    response_model=List[FilmListItem],
+    summary="Suggest film titles",
+    description=(
+        "Подсказки для строки поиска по началу названия или любого его слова.\n\n"
+        "- Регистр, диакритика и пунктуация не учитываются.\n"
+        "- Сортировка по `imdb_rating` по убыванию.\n"
+        "- Отдаётся из индекса в памяти, без запросов к ES и Redis."
+    ),
+)
+async def films_suggest(
+    request: Request,
+    prefix: str = Query(min_length=1, description="Начало названия."),
+    limit: int = Query(
+        default=settings.SUGGEST_LIMIT_MAX,
+        ge=1,
+        le=settings.SUGGEST_LIMIT_MAX,
+        description="Сколько подсказок вернуть.",
+    ),
+    suggest_service: Optional[SuggestService] = Depends(get_suggest_service),
+) -> Response:
+    index = suggest_service.index if suggest_service else None
+    if index is None:
+        raise HTTPException(
+            status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+            detail="suggest index is not ready",
+        )
+    entry = CacheEntry(payload=index.payload(prefix, limit))
+    return await _cached_response(entry, request, settings.HTTP_CACHE_CONTROL_SUGGEST)
+
+
+# ================================
+# 🎞️ Пакетная выдача карточек
+# ================================
+@router.post(
+    "/batch",
+    response_model=FilmBatch,
+    summary="Film details batch",
+    description=(
+        "Карточки нескольких фильмов за один запрос (например, для каруселей).\n\n"
+        '- Тело: `{"ids": [UUID, ...]}`, до `FILM_BATCH_MAX_IDS` id.\n'
+        "- `items` — в порядке запроса (повторы схлопываются).\n"
+        "- `missing` — id, которых нет в каталоге."
+    ),
+)
+async def films_batch(
+    body: FilmBatchRequest,
+    fields: Optional[str] = Query(default=None, description=FIELDS_DESCRIPTION),
+    film_service: FilmService = Depends(get_film_service),
+) -> Response:
+    selected = _parse_fields(fields, FilmDetail)
+    with deadline.budget(settings.DEADLINE_BATCH):
+        entry = await film_service.get_many_raw([str(x) for x in body.ids], selected)
+    return await _cached_response(entry)
+
+
+# ================================
+# 📦 Выгрузка каталога (NDJSON)
+# ================================
+@router.get(
+    "/export",
+    summary="Export catalog",
+    description=(
+        "Потоковая выгрузка всего каталога в NDJSON (документ индекса на строку).\n\n"
+        "- Читается из снапшота ES (point-in-time) срезами `search_after`.\n"
+        "- `fields` — поля через запятую (по умолчанию все).\n"
+        "- `genre` — UUID жанра для фильтрации.\n"
+        "- `gzip=true` — сжатый поток (`Content-Encoding: gzip`)."
+    ),
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def films_export(
+    fields: Optional[str] = Query(
+        default=None, description="Поля через запятую, например `id,title`."
+    ),
+    genre: Optional[str] = Query(
+        default=None, description="UUID жанра для фильтрации."
+    ),
+    gzip: bool = Query(default=False, description="Сжимать поток gzip."),
+    film_service: FilmService = Depends(get_film_service),
+) -> StreamingResponse:
+    selected = _parse_fields(fields, Film)
+    chunks = await film_service.export_films(fields=selected, genre=genre)
+    headers = {
+        "Cache-Control": "no-store",
+        # nginx не должен копить поток в буфере
+        "X-Accel-Buffering": "no",
+    }
+    if gzip:
+        chunks = _gzip_stream(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(chunks, media_type="application/x-ndjson", headers=headers)
+
+
+async def _gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        # сжатие среза — в потоке, чтобы не блокировать event loop
+        data = await asyncio.to_thread(compressor.compress, chunk)
+        if data:
+            yield data
+    yield compressor.flush()
 
 
 # ================================
@@ -86,19 +370,21 @@ async def films_search(
     },
 )
 async def film_details(
-    film_id: UUID, film_service: FilmService = Depends(get_film_service)
-) -> FilmDetail:
+    film_id: UUID,
+    request: Request,
+    fields: Optional[str] = Query(default=None, description=FIELDS_DESCRIPTION),
+    film_service: FilmService = Depends(get_film_service),
+    hot_keys: Optional[HotKeyTracker] = Depends(get_hot_keys),
+) -> Response:
     """
     Возвращает полную информацию о фильме по его UUID.
     Если фильм не найден — 404.
     """
-    film = await film_service.get_by_id(str(film_id))
-    if not film:
+    selected = _parse_fields(fields, FilmDetail)
+    if hot_keys:
+        hot_keys.record("detail", film_id=str(film_id))
+    with deadline.budget(settings.DEADLINE_DETAIL):
+        entry = await film_service.get_film_raw(str(film_id), selected)
+    if entry is None:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="film not found")
-    return FilmDetail(
-        uuid=film.id,
-        title=film.title,
-        imdb_rating=film.imdb_rating,
-        description=film.description,
-        genre=film.genre,
-    )
+    return await _cached_response(entry, request, settings.HTTP_CACHE_CONTROL_DETAIL)
@@ -0,0 +1,152 @@
+# src/core/compression.py
+import asyncio
+import gzip
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.metrics import HTTP_COMPRESSION_BYTES
+from core.settings import settings
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - зависит от окружения
+    zstandard = None
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# уровни под онлайн-сжатие: быстро, но заметно лучше минимальных
+_COMPRESSORS: Dict[str, Callable[[bytes], bytes]] = {
+    "gzip": lambda body: gzip.compress(body, compresslevel=5, mtime=0),
+}
+if zstandard is not None:
+    # ZstdCompressor не потокобезопасен — свой на каждый вызов
+    _COMPRESSORS["zstd"] = lambda body: zstandard.ZstdCompressor(level=3).compress(body)
+if brotli is not None:
+    _COMPRESSORS["br"] = lambda body: brotli.compress(body, quality=4)
+
+# сжимаем только текст: картинки и архивы сжатием не уменьшить
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def available(encodings: Sequence[str]) -> Tuple[str, ...]:
+    """Кодировки из настроек, для которых установлен компрессор (порядок — приоритет)."""
+    return tuple(e for e in encodings if e in _COMPRESSORS)
+
+
+ENCODINGS = available(
+    [e.strip().lower() for e in settings.COMPRESSION_ENCODINGS.split(",")]
+)
+
+
+def negotiate(
+    accept_encoding: Optional[str], encodings: Sequence[str]
+) -> Optional[str]:
+    """Лучшая кодировка по Accept-Encoding; при равных q — в порядке `encodings`."""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in encodings:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+async def compress(body: bytes, encoding: str, thread_min_size: int) -> bytes:
+    """Сжатое тело; большое сжимается в потоке, чтобы не держать event loop."""
+    fn = _COMPRESSORS[encoding]
+    if len(body) >= thread_min_size:
+        data = await asyncio.to_thread(fn, body)
+    else:
+        data = fn(body)
+    HTTP_COMPRESSION_BYTES.labels(encoding, "raw").inc(len(body))
+    HTTP_COMPRESSION_BYTES.labels(encoding, "sent").inc(len(data))
+    return data
+
+
+def mark_encoded(headers: MutableHeaders, encoding: str, length: int) -> None:
+    headers["Content-Encoding"] = encoding
+    headers["Content-Length"] = str(length)
+    vary = headers.get("Vary", "")
+    if "accept-encoding" not in vary.lower():
+        headers["Vary"] = f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        # байты другие, содержимое то же: слабый валидатор (как делает nginx)
+        headers["ETag"] = "W/" + etag
+
+
+class CompressionMiddleware:
+    """ASGI-middleware: сжатие ответа по Accept-Encoding.
+
+    Не трогает ответы меньше `minimum_size`, уже сжатые (есть Content-Encoding —
+    например, тело из кеша, сжатое заранее) и потоковые (тело в нескольких
+    сообщениях: выгрузка NDJSON).
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        encodings: Sequence[str] = ENCODINGS,
+        minimum_size: int = 1024,
+        thread_min_size: int = 65536,
+    ):
+        self.app = app
+        self.encodings = available(encodings)
+        self.minimum_size = minimum_size
+        self.thread_min_size = thread_min_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        encoding = None
+        if scope["type"] == "http":
+            accept = Headers(scope=scope).get("accept-encoding")
+            encoding = negotiate(accept, self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                # заголовки отправим, когда станет ясно, сжимаем ли тело
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            passthrough = True
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start["headers"])
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+            ):
+                await send(start)
+                await send(message)
+                return
+            data = await compress(body, encoding, self.thread_min_size)
+            mark_encoded(headers, encoding, len(data))
+            await send(start)
+            await send({"type": "http.response.body", "body": data})
+
+        await self.app(scope, receive, send_wrapper)
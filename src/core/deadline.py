@@ -0,0 +1,66 @@
+# src/core/deadline.py
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# момент (time.monotonic), к которому запрос должен ответить; None — без дедлайна.
+# Задачи, созданные внутри запроса (single-flight, хедж), наследуют его.
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Бюджет запроса исчерпан — ответ 504 (или stale-копия из кеша)."""
+
+
+@contextmanager
+def budget(seconds: Optional[float]) -> Iterator[None]:
+    """Дедлайн через `seconds` секунд; вложенный бюджет не продлевает внешний.
+
+    `None` снимает дедлайн — для фоновых задач, которые не должны умирать
+    вместе с запросом, породившим их. 0 — эндпоинт без дедлайна.
+    """
+    if seconds is None:
+        deadline = None
+    elif seconds <= 0:
+        deadline = _deadline.get()
+    else:
+        deadline = time.monotonic() + seconds
+        outer = _deadline.get()
+        if outer is not None:
+            deadline = min(deadline, outer)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Сколько секунд осталось; None — без дедлайна. Истёк — DeadlineExceeded."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded("deadline exceeded")
+    return left
+
+
+def expired() -> bool:
+    deadline = _deadline.get()
+    return deadline is not None and time.monotonic() >= deadline
+
+
+async def bounded(fn: Callable[[], Awaitable[T]]) -> T:
+    """`fn()` не дольше остатка бюджета; не успел — DeadlineExceeded."""
+    left = remaining()
+    if left is None:
+        return await fn()
+    try:
+        return await asyncio.wait_for(fn(), left)
+    except asyncio.TimeoutError as exc:
+        raise DeadlineExceeded("deadline exceeded") from exc
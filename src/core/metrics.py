@@ -0,0 +1,216 @@
+# src/core/metrics.py
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# бакеты под API с кешем: от попаданий в L1 до медленного ES
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "HTTP response body size by route template",
+    ["method", "route"],
+    buckets=SIZE_BUCKETS,
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests being served right now",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+CACHE_REQUESTS = Counter(
+    "film_cache_requests_total",
+    "FilmService cache lookups and writes by helper, layer and result",
+    ["helper", "layer", "result"],
+)
+CACHE_PAYLOAD_SIZE = Histogram(
+    "film_cache_payload_bytes",
+    "Encoded size of cache entries written to Redis",
+    ["helper"],
+    buckets=SIZE_BUCKETS,
+)
+CACHE_CODEC_BYTES = Counter(
+    "film_cache_codec_bytes_total",
+    "Cache entry bytes before (raw) and after (stored) the cache codec",
+    ["helper", "stage"],
+)
+CACHE_COALESCED = Counter(
+    "film_cache_coalesced_total",
+    "Cache fills by single-flight role: leader loads, follower reuses its result "
+    "(scope local — within the worker, remote — via the Redis fill lock)",
+    ["scope", "result"],
+)
+CACHE_LOOKUPS = Counter(
+    "film_cache_lookups_total",
+    "Cache lookups by endpoint: hit — served without Elasticsearch",
+    ["endpoint", "result"],
+)
+CACHE_TTL_SECONDS = Histogram(
+    "film_cache_ttl_seconds",
+    "Fresh TTL chosen by the TTL policy for written cache entries",
+    ["endpoint"],
+    buckets=(30, 60, 120, 300, 600, 900, 1800, 3600, 7200),
+)
+CACHE_TTL_BYTE_SECONDS = Counter(
+    "film_cache_ttl_byte_seconds_total",
+    "Stored bytes times Redis TTL: adaptive policy vs the fixed one",
+    ["endpoint", "policy"],
+)
+HTTP_COMPRESSION_BYTES = Counter(
+    "http_compression_bytes_total",
+    "Response bytes before (raw) and after (sent) compression by encoding",
+    ["encoding", "stage"],
+)
+BACKEND_LATENCY = Histogram(
+    "backend_request_duration_seconds",
+    "Elasticsearch and Redis call latency by operation",
+    ["backend", "operation"],
+    buckets=LATENCY_BUCKETS,
+)
+
+BACKEND_NODE_LATENCY = Gauge(
+    "backend_node_latency_ewma_seconds",
+    "Peak-EWMA latency the balancer uses to pick ES/Redis read nodes",
+    ["backend", "node"],
+    multiprocess_mode="livemax",
+)
+BACKEND_NODE_REQUESTS = Counter(
+    "backend_node_requests_total",
+    "Requests routed to each ES/Redis read node by result",
+    ["backend", "node", "result"],
+)
+BACKEND_POOL_CONNECTIONS = Gauge(
+    "backend_pool_connections",
+    "Connection pool size per ES/Redis node: max, in_use, idle",
+    ["backend", "node", "state"],
+    multiprocess_mode="livesum",
+)
+
+CIRCUIT_BREAKER_STATE = Gauge(
+    "circuit_breaker_state",
+    "1 for the current circuit breaker state (closed | open | half_open); "
+    "open means responses come from stale cache copies",
+    ["breaker", "state"],
+    multiprocess_mode="livemax",
+)
+CIRCUIT_BREAKER_TRANSITIONS = Counter(
+    "circuit_breaker_transitions_total",
+    "Circuit breaker state changes by the state entered",
+    ["breaker", "state"],
+)
+CIRCUIT_BREAKER_REJECTED = Counter(
+    "circuit_breaker_rejected_total",
+    "Calls rejected by an open circuit breaker without a backend request",
+    ["breaker"],
+)
+DEADLINE_EXCEEDED = Counter(
+    "deadline_exceeded_total",
+    "Requests that ran out of their deadline budget, by outcome (stale | timeout)",
+    ["outcome"],
+)
+ES_HEDGES = Counter(
+    "es_hedged_requests_total",
+    "Hedged ES reads: sent, won (the hedge answered first) or throttled",
+    ["operation", "result"],
+)
+
+# путь запроса, не попавшего ни в один роут: не плодим метки на каждый URL
+UNMATCHED_ROUTE = "unmatched"
+
+
+@contextmanager
+def track(backend: str, operation: str) -> Iterator[None]:
+    """Время вызова ES/Redis; исключения тоже учитываются."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        BACKEND_LATENCY.labels(backend, operation).observe(
+            time.perf_counter() - started
+        )
+
+
+def cache_event(helper: str, layer: str, result: str, count: int = 1) -> None:
+    CACHE_REQUESTS.labels(helper, layer, result).inc(count)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    # под gunicorn каждый воркер пишет свои файлы; собираем их все
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: латентность, размер ответа и in-flight по шаблону роута."""
+
+    def __init__(self, app: ASGIApp, skip_paths: Tuple[str, ...] = ()):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        size = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_progress.dec()
+            # роутер кладёт найденный роут в scope — берём его шаблон пути
+            route = scope.get("route")
+            template = getattr(route, "path", UNMATCHED_ROUTE)
+            HTTP_REQUEST_DURATION.labels(method, template, str(status)).observe(elapsed)
+            HTTP_RESPONSE_SIZE.labels(method, template).observe(size)
@@ -1,3 +1,9 @@
+import base64
+import hashlib
+import json
+import math
+from typing import Any, List, Optional, Tuple
+
 from fastapi import Query
 from pydantic import BaseModel, field_validator
 
@@ -39,3 +45,43 @@ class PaginationParams(BaseModel):
         ),
     ):
         super().__init__(page_number=page_number, page_size=page_size)
+
+
+# ---------- курсорная пагинация (search_after) ----------
+def _scope_tag(scope: str) -> str:
+    return hashlib.blake2b(scope.encode("utf-8"), digest_size=6).hexdigest()
+
+
+def encode_cursor(
+    search_after: List[Any], scope: str, pit_id: Optional[str] = None
+) -> str:
+    """Непрозрачный курсор: sort-значения последнего хита + PIT + метка запроса."""
+    data = {"a": search_after, "s": _scope_tag(scope)}
+    if pit_id:
+        data["p"] = pit_id
+    # stdlib json: sort-значения для missing бывают ±Infinity
+    raw = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str, scope: str) -> Tuple[List[Any], Optional[str]]:
+    """Возвращает (search_after, pit_id); ValueError — курсор битый или чужой."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as exc:
+        raise ValueError("malformed cursor") from exc
+    if not isinstance(data, dict) or not isinstance(data.get("a"), list):
+        raise ValueError("malformed cursor")
+    if data.get("s") != _scope_tag(scope):
+        raise ValueError("cursor belongs to another query")
+    # ES не принимает Infinity литералом, но парсит его из строки
+    search_after = [
+        (
+            ("Infinity" if v > 0 else "-Infinity")
+            if isinstance(v, float) and math.isinf(v)
+            else v
+        )
+        for v in data["a"]
+    ]
+    return search_after, data.get("p")
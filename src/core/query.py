@@ -0,0 +1,25 @@
+# src/core/query.py
+import unicodedata
+from typing import AbstractSet, FrozenSet
+
+from core.settings import settings
+
+
+def normalize_query(text: str, stop_words: AbstractSet[str] = frozenset()) -> str:
+    """Каноническая форма поискового запроса.
+
+    "Star  Wars ", "STAR WARS" и "star wars" дают одну строку — один ключ кеша
+    и один запрос к ES. Регистр и лишние пробелы на результат ES не влияют:
+    анализатор всё равно приводит текст к нижнему регистру и режет на слова.
+    """
+    words = unicodedata.normalize("NFKC", text).casefold().split()
+    kept = [word for word in words if word not in stop_words]
+    # запрос из одних стоп-слов не выбрасываем целиком — иначе искать нечего
+    return " ".join(kept or words)
+
+
+def parse_stop_words(raw: str) -> FrozenSet[str]:
+    return frozenset(normalize_query(word) for word in raw.split(",") if word.strip())
+
+
+STOP_WORDS = parse_stop_words(settings.SEARCH_STOP_WORDS)
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -7,6 +9,20 @@ class Settings(BaseSettings):
     ELASTIC_URL: str = "http://127.0.0.1:9200"
     ES_INDEX: str = "movies"
 
+    # Узлы: чтения кеша — с реплик Redis (через запятую), запись — в REDIS_URL;
+    # ES — по узлам ELASTIC_HOSTS (пусто — ELASTIC_URL), узлы ищутся sniffing'ом
+    REDIS_REPLICA_URLS: str = ""
+    REDIS_MAX_CONNECTIONS: int = 100
+    ELASTIC_HOSTS: str = ""
+    ES_CONNECTIONS_PER_NODE: int = 10
+    ES_SNIFF_ON_START: bool = False
+    ES_SNIFF_ON_NODE_FAILURE: bool = False
+    ES_SNIFF_INTERVAL: float = 60.0
+    # узел чтения выбирается по peak EWMA задержки (сглаживание спада)
+    NODE_LATENCY_ALPHA: float = 0.3
+    # как часто снимать размеры пулов соединений в метрики
+    POOL_METRICS_INTERVAL: float = 15.0
+
     # Docs / OpenAPI
     DOCS_URL: str = "/api/openapi"
     OPENAPI_URL: str = "/api/openapi.json"
@@ -18,9 +34,153 @@ class Settings(BaseSettings):
     # Pagination
     PAGE_SIZE_DEFAULT: int = 50
     PAGE_SIZE_MAX: int = 1000
+    # index.max_result_window: глубже from+size листать только курсором
+    ES_MAX_RESULT_WINDOW: int = 10000
+    # keep_alive снапшота (point-in-time) для курсоров с pit=true
+    CURSOR_PIT_KEEP_ALIVE: str = "1m"
+
+    # Export: размер среза search_after и keep_alive PIT для выгрузки каталога
+    EXPORT_SLICE_SIZE: int = 1000
+    EXPORT_PIT_KEEP_ALIVE: str = "5m"
+
+    # Search: стоп-слова через запятую, которые выбрасываются из запроса
+    # до кеша и ES (пусто — не выбрасывать ничего)
+    SEARCH_STOP_WORDS: str = ""
+
+    # Batch: максимум id в одном запросе /films/batch
+    FILM_BATCH_MAX_IDS: int = 100
+
+    # Конверт списка/поиска (envelope=true): total считается до этого числа
+    # (дальше relation "gte"), 0 — точно; сколько жанров отдавать в фасетах
+    FACETS_TOTAL_HITS_LIMIT: int = 10000
+    FACETS_GENRES_SIZE: int = 50
+
+    # Списки по рейтингу из Redis ZSET (ведёт scripts/es_load.py)
+    RANK_VIEWS_ENABLED: bool = True
+    RANK_VIEWS_PREFIX: str = "films:rank"
+
+    # Suggest: in-process индекс названий воркера для /films/suggest
+    SUGGEST_ENABLED: bool = True
+    SUGGEST_LIMIT_MAX: int = 10
+    # как часто проверять поколение каталога и максимальный возраст индекса
+    SUGGEST_CHECK_INTERVAL: float = 5.0
+    SUGGEST_MAX_AGE: float = 300.0
 
     # Cache
     FILM_CACHE_TTL: int = 300
+    # сколько ещё отдавать запись списка после FILM_CACHE_TTL, обновляя её в фоне
+    FILM_CACHE_STALE_TTL: int = 300
+    # stale-if-error: сколько ещё хранить запись, чтобы отдать её при отказе ES
+    FILM_CACHE_STALE_IF_ERROR_TTL: int = 86400
+    # XFetch: >1 — обновлять раньше, 0 — только после мягкого истечения
+    CACHE_XFETCH_BETA: float = 1.0
+    # адаптивные TTL: популярные ключи живут дольше (до потолка), разовые
+    # поисковые запросы — коротко; без них у всех эндпоинтов FILM_CACHE_TTL
+    CACHE_TTL_ADAPTIVE: bool = True
+    # базовый TTL эндпоинта (по умолчанию FILM_CACHE_TTL) и его границы
+    CACHE_TTL_DETAIL: Optional[int] = None
+    CACHE_TTL_DETAIL_MIN: int = 300
+    CACHE_TTL_DETAIL_MAX: int = 3600
+    CACHE_TTL_LIST: Optional[int] = None
+    CACHE_TTL_LIST_MIN: int = 300
+    CACHE_TTL_LIST_MAX: int = 1800
+    CACHE_TTL_SEARCH: Optional[int] = None
+    CACHE_TTL_SEARCH_MIN: int = 60
+    CACHE_TTL_SEARCH_MAX: int = 900
+    # разброс TTL (±доля), чтобы записи одной волны не истекали разом
+    CACHE_TTL_JITTER: float = 0.1
+    # раз в столько секунд счётчики популярности ключей стареют вдвое
+    CACHE_TTL_WINDOW: float = 300.0
+
+    # Формат значений в Redis: raw | columnar | msgpack (списки — колонками;
+    # меньше до сжатия, но каждое чтение из Redis пересобирает JSON)
+    CACHE_CODEC: str = "raw"
+    # сжатие значений не меньше CACHE_COMPRESS_MIN_BYTES: none | zlib | zstd | lz4
+    CACHE_COMPRESSION: str = "zstd"
+    CACHE_COMPRESS_MIN_BYTES: int = 1024
+    CACHE_COMPRESSION_LEVEL: int = 3
+
+    # Circuit breaker вокруг ES: окно последних вызовов и пороги размыкания
+    ES_BREAKER_ENABLED: bool = True
+    ES_BREAKER_WINDOW: int = 20
+    ES_BREAKER_MIN_CALLS: int = 10
+    ES_BREAKER_FAILURE_RATIO: float = 0.5
+    ES_BREAKER_SLOW_CALL_SECONDS: float = 1.0
+    ES_BREAKER_SLOW_CALL_RATIO: float = 0.8
+    # сколько держать разомкнутым до пробных запросов (half-open)
+    ES_BREAKER_OPEN_SECONDS: float = 5.0
+    ES_BREAKER_HALF_OPEN_CALLS: int = 3
+
+    # Дедлайн запроса по эндпоинтам, секунды (0 — без дедлайна): ограничивает
+    # чтения Redis и таймауты ES; не успели — stale-копия или 504
+    DEADLINE_DETAIL: float = 1.0
+    DEADLINE_LIST: float = 2.0
+    DEADLINE_SEARCH: float = 3.0
+    DEADLINE_BATCH: float = 2.0
+    # доля остатка бюджета на `timeout` поиска: ES успеет вернуть частичный ответ
+    DEADLINE_ES_TIMEOUT_SHARE: float = 0.8
+    # хедж чтений ES: нет ответа за квантиль задержки — второй запрос на другой узел
+    ES_HEDGE_ENABLED: bool = False
+    ES_HEDGE_QUANTILE: float = 0.95
+    ES_HEDGE_MIN_DELAY: float = 0.005
+    # не больше такой доли запросов получает хедж (ограничение нагрузки)
+    ES_HEDGE_MAX_RATIO: float = 0.1
+    # сколько последних задержек держать для квантиля
+    ES_HEDGE_WINDOW: int = 1024
+
+    # L1: in-process кеш воркера перед Redis
+    L1_CACHE_ENABLED: bool = True
+    L1_CACHE_TTL: float = 10.0
+    L1_CACHE_MAX_ITEMS: int = 2048
+    L1_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    # сжатые тела горячих ответов (отдельный LRU, 0 — не хранить)
+    L1_COMPRESSED_MAX_BYTES: int = 8 * 1024 * 1024
+    # pub/sub канал для сброса L1 во всех воркерах
+    CACHE_INVALIDATION_CHANNEL: str = "films:invalidate"
+    # слушать keyspace notifications (нужен notify-keyspace-events "Exeg")
+    CACHE_KEYSPACE_EVENTS: bool = False
+    # поколение каталога: ключ-счётчик в Redis и как часто воркер его перечитывает
+    CACHE_GENERATION_KEY: str = "films:generation"
+    CACHE_GENERATION_REFRESH: float = 1.0
+
+    # HTTP-кеширование (nginx/CDN): Cache-Control по эндпоинтам + Vary
+    HTTP_CACHE_CONTROL_DETAIL: str = "public, max-age=60"
+    HTTP_CACHE_CONTROL_LIST: str = "public, max-age=30"
+    HTTP_CACHE_CONTROL_SEARCH: str = "public, max-age=30"
+    HTTP_CACHE_CONTROL_SUGGEST: str = "public, max-age=60"
+    HTTP_VARY: str = "Accept-Encoding"
+
+    # Сжатие ответов по Accept-Encoding (порядок — приоритет при равных q;
+    # br — если установлен пакет brotli). Тела меньше COMPRESSION_MIN_BYTES не
+    # сжимаются, от COMPRESSION_THREAD_MIN_BYTES — сжимаются вне event loop
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_ENCODINGS: str = "zstd,br,gzip"
+    COMPRESSION_MIN_BYTES: int = 1024
+    COMPRESSION_THREAD_MIN_BYTES: int = 65536
+
+    # Single-flight: при промахе кеш заполняет один запрос на весь кластер
+    CACHE_FILL_LOCK_TTL_MS: int = 5000
+    CACHE_FILL_LOCK_WAIT: float = 0.5
+    CACHE_FILL_LOCK_POLL: float = 0.05
+
+    # Горячие запросы: top-K воркера (count-min sketch) -> ZSET окна в Redis
+    HOT_KEYS_ENABLED: bool = True
+    HOT_KEYS_KEY: str = "films:hot"
+    HOT_KEYS_TRACK: int = 200
+    HOT_KEYS_FLUSH_INTERVAL: float = 30.0
+    # окно счёта в секундах и сколько последних окон образуют горячий набор
+    HOT_KEYS_WINDOW: int = 300
+    HOT_KEYS_WINDOWS: int = 12
+    # служебный эндпоинт с горячим набором (наружу nginx его не отдаёт)
+    HOT_KEYS_PATH: str = "/hot-keys"
+    # прогрев кеша горячими запросами при старте и после перезаливки
+    CACHE_PREWARM_ENABLED: bool = True
+    CACHE_PREWARM_KEYS: int = 200
+    CACHE_PREWARM_CONCURRENCY: int = 8
+
+    # Prometheus: /metrics (под gunicorn нужен PROMETHEUS_MULTIPROC_DIR)
+    METRICS_ENABLED: bool = True
+    METRICS_PATH: str = "/metrics"
 
     # ES loader
     ES_WAIT_TIMEOUT: int = 60
@@ -0,0 +1,137 @@
+# src/db/balancer.py
+import asyncio
+import math
+import random
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Sequence
+
+from core.metrics import (
+    BACKEND_NODE_LATENCY,
+    BACKEND_NODE_REQUESTS,
+    BACKEND_POOL_CONNECTIONS,
+)
+
+
+class NodeStats:
+    __slots__ = ("ewma", "inflight", "stamp")
+
+    def __init__(self) -> None:
+        # 0 — узел ещё не опрашивали: первым делом пробуем его
+        self.ewma = 0.0
+        self.inflight = 0
+        self.stamp = time.monotonic()
+
+
+class LatencyBalancer:
+    """Выбор узла по задержке: peak EWMA + "power of two choices".
+
+    Рост задержки учитывается сразу (peak), спад — сглаженно (alpha). Оценка
+    узла — EWMA × (запросов в работе + 1), из двух случайных узлов берётся
+    лучший. Без новых замеров EWMA затухает (`decay` секунд), поэтому узел,
+    который когда-то тормозил, со временем снова получает пробный запрос.
+    Ошибка считается задержкой `error_penalty` секунд.
+    """
+
+    def __init__(
+        self,
+        backend: str,
+        alpha: float = 0.3,
+        error_penalty: float = 1.0,
+        decay: float = 10.0,
+    ):
+        self.backend = backend
+        self.alpha = alpha
+        self.error_penalty = error_penalty
+        self.decay = decay
+        self._nodes: Dict[str, NodeStats] = {}
+
+    def choose(self, names: Sequence[str]) -> str:
+        if len(names) == 1:
+            return names[0]
+        first, second = random.sample(list(names), 2)
+        return first if self.score(first) <= self.score(second) else second
+
+    def score(self, name: str) -> float:
+        stats = self._nodes.get(name)
+        if stats is None:
+            return 0.0
+        return self._decayed(stats, time.monotonic()) * (stats.inflight + 1)
+
+    @contextmanager
+    def track(self, name: str) -> Iterator[None]:
+        stats = self._nodes.setdefault(name, NodeStats())
+        stats.inflight += 1
+        started = time.perf_counter()
+        result = "ok"
+        try:
+            yield
+        except asyncio.CancelledError:
+            # отменили нас (проигравший хедж, дедлайн, разрыв клиента), а не узел:
+            # время до отмены ничего не говорит о его задержке
+            result = "cancelled"
+            raise
+        except BaseException:
+            result = "error"
+            raise
+        finally:
+            stats.inflight -= 1
+            if result != "cancelled":
+                elapsed = time.perf_counter() - started
+                if result == "error":
+                    elapsed = max(elapsed, self.error_penalty)
+                self.observe(name, elapsed)
+            BACKEND_NODE_REQUESTS.labels(self.backend, name, result).inc()
+
+    def observe(self, name: str, seconds: float) -> None:
+        stats = self._nodes.setdefault(name, NodeStats())
+        now = time.monotonic()
+        ewma = self._decayed(stats, now)
+        if seconds >= ewma:
+            stats.ewma = seconds
+        else:
+            stats.ewma = ewma + self.alpha * (seconds - ewma)
+        stats.stamp = now
+        BACKEND_NODE_LATENCY.labels(self.backend, name).set(stats.ewma)
+
+    def _decayed(self, stats: NodeStats, now: float) -> float:
+        return stats.ewma * math.exp(-(now - stats.stamp) / self.decay)
+
+    def inflight(self, name: str) -> int:
+        stats = self._nodes.get(name)
+        return stats.inflight if stats else 0
+
+
+def report_pools(
+    redis_clients: Dict[str, Any], es: Any, es_balancer: LatencyBalancer
+) -> None:
+    """Размеры пулов соединений Redis и ES в метрики (зовётся периодически)."""
+    for name, client in redis_clients.items():
+        pool = client.connection_pool
+        # счётчики пула redis-py: приватные поля, но стабильные в 5.x
+        in_use = len(getattr(pool, "_in_use_connections", ()))
+        idle = len(getattr(pool, "_available_connections", ()))
+        BACKEND_POOL_CONNECTIONS.labels("redis", name, "max").set(pool.max_connections)
+        BACKEND_POOL_CONNECTIONS.labels("redis", name, "in_use").set(in_use)
+        BACKEND_POOL_CONNECTIONS.labels("redis", name, "idle").set(idle)
+    if es is None:
+        return
+    for node in es.transport.node_pool.all():
+        name = f"{node.config.host}:{node.config.port}"
+        BACKEND_POOL_CONNECTIONS.labels("es", name, "max").set(
+            node.config.connections_per_node
+        )
+        BACKEND_POOL_CONNECTIONS.labels("es", name, "in_use").set(
+            es_balancer.inflight(name)
+        )
+
+
+async def run_pool_reporter(
+    redis_clients: Dict[str, Any],
+    es: Any,
+    es_balancer: LatencyBalancer,
+    interval: float,
+) -> None:
+    while True:
+        report_pools(redis_clients, es, es_balancer)
+        await asyncio.sleep(interval)
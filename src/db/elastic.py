@@ -1,10 +1,177 @@
-from typing import Optional
+import asyncio
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Optional,
+    Sequence,
+    Set,
+    TypeVar,
+)
 
+from elastic_transport import (
+    AiohttpHttpNode,
+    BaseNode,
+    NodeConfig,
+    NodeSelector,
+    TransportError,
+)
 from elasticsearch import AsyncElasticsearch
 
+from core import deadline
+from core.metrics import ES_HEDGES
+from core.settings import settings
+from db.balancer import LatencyBalancer
+
+T = TypeVar("T")
+
 es: Optional[AsyncElasticsearch] = None
+# задержки узлов ES по всем запросам воркера
+balancer = LatencyBalancer("es", alpha=settings.NODE_LATENCY_ALPHA)
+hedger: Optional["Hedger"] = None
+
+# узлы, уже занятые этим чтением: хедж уходит на другой узел
+_busy: ContextVar[Optional[Set[str]]] = ContextVar("es_busy_nodes", default=None)
+
+
+def node_name(config: NodeConfig) -> str:
+    return f"{config.host}:{config.port}"
+
+
+class TrackedNode(AiohttpHttpNode):
+    """Узел ES, который сообщает балансировщику задержку каждого запроса."""
+
+    async def perform_request(self, *args: Any, **kwargs: Any) -> Any:
+        with balancer.track(node_name(self.config)):
+            return await super().perform_request(*args, **kwargs)
+
+
+class LatencySelector(NodeSelector):
+    """Из живых узлов пула — самый быстрый по peak EWMA (узлы из sniffing тоже)."""
+
+    def select(self, nodes: Sequence[BaseNode]) -> BaseNode:
+        by_name = {node_name(node.config): node for node in nodes}
+        busy = _busy.get()
+        names = [name for name in by_name if not busy or name not in busy]
+        name = balancer.choose(names or list(by_name))
+        if busy is not None:
+            busy.add(name)
+        return by_name[name]
+
+
+class Hedger:
+    """Хедж чтений ES: нет ответа за квантиль задержки — второй запрос.
+
+    Задержка хеджа — `quantile` по последним `window` успешным ответам той же
+    операции (пока их меньше `min_samples`, хеджа нет): у get, mget и search
+    разные задержки, общий квантиль хеджировал бы быстрые операции слишком
+    поздно, а медленные — почти каждый раз. Второй запрос уходит на другой
+    узел, берётся первый ответ, опоздавший отменяется. Хедж получает не больше
+    `max_ratio` запросов: каждый вызов копит долю кредита (до `burst`), хедж
+    тратит единицу — при общей деградации ES нагрузка не удваивается.
+    """
+
+    def __init__(
+        self,
+        quantile: float = 0.95,
+        window: int = 1024,
+        min_delay: float = 0.005,
+        max_ratio: float = 0.1,
+        burst: float = 5.0,
+        min_samples: int = 50,
+    ):
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.max_ratio = max_ratio
+        self.burst = burst
+        self.min_samples = min_samples
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._delays: Dict[str, float] = {}
+        self._fresh: Dict[str, int] = {}
+        self._credit = 0.0
+
+    def observe(self, operation: str, seconds: float) -> None:
+        samples = self._samples.get(operation)
+        if samples is None:
+            samples = self._samples[operation] = deque(maxlen=self.window)
+        samples.append(seconds)
+        self._fresh[operation] = self._fresh.get(operation, 0) + 1
+
+    def delay(self, operation: str) -> Optional[float]:
+        samples = self._samples.get(operation)
+        if samples is None or len(samples) < self.min_samples:
+            return None
+        if operation not in self._delays or self._fresh[operation] >= self.min_samples:
+            # сортировка окна — раз в min_samples ответов, не на каждый вызов
+            ordered = sorted(samples)
+            index = int(self.quantile * (len(ordered) - 1))
+            self._delays[operation] = max(self.min_delay, ordered[index])
+            self._fresh[operation] = 0
+        return self._delays[operation]
+
+    async def call(self, operation: str, fn: Callable[[], Awaitable[T]]) -> T:
+        # кредит общий: max_ratio ограничивает нагрузку на ES в целом
+        self._credit = min(self._credit + self.max_ratio, self.burst)
+        delay = self.delay(operation)
+        if delay is None:
+            return await self._timed(operation, fn)
+        busy: Set[str] = set()
+        first = self._spawn(operation, fn, busy)
+        second: Optional["asyncio.Future[T]"] = None
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+            if done or deadline.expired():
+                return await first
+            if self._credit < 1:
+                ES_HEDGES.labels(operation, "throttled").inc()
+                return await first
+            self._credit -= 1
+            ES_HEDGES.labels(operation, "sent").inc()
+            second = self._spawn(operation, fn, busy)
+            pending = {first, second}
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    # ответ ES (в том числе 404) — ответ; сбой сети — ждём другой
+                    if not isinstance(task.exception(), TransportError):
+                        if task is second:
+                            ES_HEDGES.labels(operation, "won").inc()
+                        return task.result()
+            return first.result()
+        finally:
+            for task in (first, second):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def _spawn(
+        self, operation: str, fn: Callable[[], Awaitable[T]], busy: Set[str]
+    ) -> "asyncio.Future[T]":
+        # задача копирует контекст: обе попытки видят одно множество узлов
+        token = _busy.set(busy)
+        try:
+            return asyncio.ensure_future(self._timed(operation, fn))
+        finally:
+            _busy.reset(token)
+
+    async def _timed(self, operation: str, fn: Callable[[], Awaitable[T]]) -> T:
+        started = time.perf_counter()
+        result = await fn()
+        self.observe(operation, time.perf_counter() - started)
+        return result
 
 
 # Функция понадобится при внедрении зависимостей
 async def get_elastic() -> AsyncElasticsearch:
     return es
+
+
+async def get_hedger() -> Optional[Hedger]:
+    return hedger
@@ -1,10 +1,74 @@
-from typing import Optional
+import logging
+from typing import Any, List, Optional, Union
 
+import redis.exceptions as redis_exc
 from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+from db.balancer import LatencyBalancer
+
+logger = logging.getLogger(__name__)
 
 redis: Optional[Redis] = None
+# чтения кеша: реплики с выбором по задержке; None — всё идёт в primary
+reader: Optional["ReplicaReader"] = None
+
+
+def node_name(client: Redis) -> str:
+    kwargs = client.connection_pool.connection_kwargs
+    return f"{kwargs.get('host', 'localhost')}:{kwargs.get('port', 6379)}"
+
+
+class ReplicaReader:
+    """Команды чтения кеша — на самую быструю живую реплику.
+
+    Запись, локи и pub/sub остаются на primary. Если реплика ответила ошибкой,
+    команда повторяется на primary: реплика отстаёт на миллисекунды, для кеша
+    это не страшно, а вот лишний промах в ES — дорого.
+    """
+
+    def __init__(
+        self, primary: Redis, replicas: List[Redis], balancer: LatencyBalancer
+    ):
+        self.primary = primary
+        self.replicas = {node_name(client): client for client in replicas}
+        self.balancer = balancer
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._call("get", key)
+
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        return await self._call("mget", keys)
+
+    async def hmget(self, key: str, fields: List[Any]) -> List[Optional[bytes]]:
+        return await self._call("hmget", key, fields)
+
+    async def zrank(self, key: str, member: Any) -> Optional[int]:
+        return await self._call("zrank", key, member)
+
+    def pipeline(self, transaction: bool = True) -> Pipeline:
+        # пайплайн целиком уходит на одну реплику
+        name = self.balancer.choose(list(self.replicas))
+        return self.replicas[name].pipeline(transaction=transaction)
+
+    async def _call(self, command: str, *args: Any) -> Any:
+        name = self.balancer.choose(list(self.replicas))
+        try:
+            with self.balancer.track(name):
+                return await getattr(self.replicas[name], command)(*args)
+        except (redis_exc.RedisError, OSError):
+            logger.warning("redis replica %s failed, reading from primary", name)
+        return await getattr(self.primary, command)(*args)
+
+    async def aclose(self) -> None:
+        for client in self.replicas.values():
+            await client.aclose()
 
 
 # Функция понадобится при внедрении зависимостей
 async def get_redis() -> Redis:
     return redis
+
+
+async def get_redis_reader() -> Union[Redis, ReplicaReader]:
+    return reader or redis
@@ -1,32 +1,200 @@
 # src/main.py
+import asyncio
 from contextlib import asynccontextmanager
 from logging.config import dictConfig
 
 import redis.exceptions as redis_exc
 from elasticsearch import AsyncElasticsearch, TransportError
-from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from redis.asyncio import Redis
 from starlette.middleware.cors import CORSMiddleware
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 
 from api.v1 import films
+from core.compression import CompressionMiddleware
+from core.deadline import DeadlineExceeded
 from core.logger import LOGGING
+from core.metrics import DEADLINE_EXCEEDED, MetricsMiddleware, render_metrics
 from core.settings import settings
 from db import elastic, redis
+from db.balancer import LatencyBalancer, run_pool_reporter
+from services import (
+    cache_generation,
+    cache_invalidation,
+    circuit_breaker,
+    film,
+    hot_keys,
+    local_cache,
+    rank_views,
+    singleflight,
+    suggest,
+)
+
+
+def _film_service() -> film.FilmService:
+    # тот же сервис, что получают роуты через Depends, — для фоновых задач.
+    # get_film_service под lru_cache, а FastAPI передаёт зависимости именованными
+    # аргументами в порядке сигнатуры: иначе ключ кеша другой и сервис — второй
+    return film.get_film_service(
+        redis=redis.redis,
+        elastic=elastic.es,
+        local_cache=local_cache.local_cache,
+        invalidator=cache_invalidation.invalidator,
+        singleflight=singleflight.singleflight,
+        generation=cache_generation.generation,
+        breaker=circuit_breaker.es_breaker,
+        rank_views=rank_views.rank_views,
+        read_redis=redis.reader or redis.redis,
+        hedger=elastic.hedger,
+    )
+
+
+def _urls(raw: str) -> list:
+    return [url.strip() for url in raw.split(",") if url.strip()]
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # startup
     redis.redis = Redis.from_url(
-        settings.REDIS_URL, encoding="utf-8", decode_responses=False
+        settings.REDIS_URL,
+        encoding="utf-8",
+        decode_responses=False,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+    )
+    replicas = [
+        Redis.from_url(url, max_connections=settings.REDIS_MAX_CONNECTIONS)
+        for url in _urls(settings.REDIS_REPLICA_URLS)
+    ]
+    if replicas:
+        redis.reader = redis.ReplicaReader(
+            redis.redis,
+            replicas,
+            LatencyBalancer("redis", alpha=settings.NODE_LATENCY_ALPHA),
+        )
+    elastic.es = AsyncElasticsearch(
+        hosts=_urls(settings.ELASTIC_HOSTS) or [settings.ELASTIC_URL],
+        connections_per_node=settings.ES_CONNECTIONS_PER_NODE,
+        # каждый запрос — на самый быстрый живой узел, включая найденные sniffing
+        node_class=elastic.TrackedNode,
+        node_selector_class=elastic.LatencySelector,
+        sniff_on_start=settings.ES_SNIFF_ON_START,
+        sniff_on_node_failure=settings.ES_SNIFF_ON_NODE_FAILURE,
+        min_delay_between_sniffing=settings.ES_SNIFF_INTERVAL,
     )
-    elastic.es = AsyncElasticsearch(hosts=[settings.ELASTIC_URL])
+    if settings.ES_HEDGE_ENABLED:
+        elastic.hedger = elastic.Hedger(
+            quantile=settings.ES_HEDGE_QUANTILE,
+            window=settings.ES_HEDGE_WINDOW,
+            min_delay=settings.ES_HEDGE_MIN_DELAY,
+            max_ratio=settings.ES_HEDGE_MAX_RATIO,
+        )
+    if settings.ES_BREAKER_ENABLED:
+        circuit_breaker.es_breaker = circuit_breaker.CircuitBreaker(
+            window=settings.ES_BREAKER_WINDOW,
+            min_calls=settings.ES_BREAKER_MIN_CALLS,
+            failure_ratio=settings.ES_BREAKER_FAILURE_RATIO,
+            slow_call_seconds=settings.ES_BREAKER_SLOW_CALL_SECONDS,
+            slow_call_ratio=settings.ES_BREAKER_SLOW_CALL_RATIO,
+            open_seconds=settings.ES_BREAKER_OPEN_SECONDS,
+            half_open_calls=settings.ES_BREAKER_HALF_OPEN_CALLS,
+        )
+    cache_generation.generation = cache_generation.CacheGeneration(
+        redis.redis,
+        key=settings.CACHE_GENERATION_KEY,
+        refresh_interval=settings.CACHE_GENERATION_REFRESH,
+    )
+
+    if settings.RANK_VIEWS_ENABLED:
+        rank_views.rank_views = rank_views.RankViews(
+            redis.reader or redis.redis, prefix=settings.RANK_VIEWS_PREFIX
+        )
+
+    background = []
+    if settings.METRICS_ENABLED:
+        pools = {redis.node_name(client): client for client in [redis.redis] + replicas}
+        background.append(
+            asyncio.create_task(
+                run_pool_reporter(
+                    pools, elastic.es, elastic.balancer, settings.POOL_METRICS_INTERVAL
+                )
+            )
+        )
+    if settings.SUGGEST_ENABLED:
+        suggest.suggest_service = suggest.SuggestService(
+            elastic.es,
+            index=settings.ES_INDEX,
+            generation=cache_generation.generation,
+            breaker=circuit_breaker.es_breaker,
+            max_limit=settings.SUGGEST_LIMIT_MAX,
+            check_interval=settings.SUGGEST_CHECK_INTERVAL,
+            max_age=settings.SUGGEST_MAX_AGE,
+            slice_size=settings.EXPORT_SLICE_SIZE,
+        )
+        background.append(asyncio.create_task(suggest.suggest_service.run()))
+    if settings.L1_CACHE_ENABLED:
+        local_cache.local_cache = local_cache.LocalCache(
+            max_items=settings.L1_CACHE_MAX_ITEMS,
+            max_bytes=settings.L1_CACHE_MAX_BYTES,
+            ttl=settings.L1_CACHE_TTL,
+        )
+        local_cache.compressed_cache = (
+            local_cache.LocalCache(
+                max_items=settings.L1_CACHE_MAX_ITEMS,
+                max_bytes=settings.L1_COMPRESSED_MAX_BYTES,
+                ttl=settings.L1_CACHE_TTL,
+            )
+            if settings.L1_COMPRESSED_MAX_BYTES > 0
+            else None
+        )
+        cache_invalidation.invalidator = cache_invalidation.CacheInvalidator(
+            redis.redis,
+            local_cache.local_cache,
+            channel=settings.CACHE_INVALIDATION_CHANNEL,
+            keyspace_events=settings.CACHE_KEYSPACE_EVENTS,
+        )
+        background.append(asyncio.create_task(cache_invalidation.invalidator.run()))
+    if settings.HOT_KEYS_ENABLED:
+        hot_keys.hot_keys = hot_keys.HotKeyTracker(
+            redis.redis,
+            key=settings.HOT_KEYS_KEY,
+            k=settings.HOT_KEYS_TRACK,
+            window=settings.HOT_KEYS_WINDOW,
+            windows=settings.HOT_KEYS_WINDOWS,
+            flush_interval=settings.HOT_KEYS_FLUSH_INTERVAL,
+        )
+        background.append(asyncio.create_task(hot_keys.hot_keys.run()))
+        if settings.CACHE_PREWARM_ENABLED:
+            # L1 и поколение уже созданы: прогрев идёт через тот же сервис
+            prewarmer = hot_keys.CachePrewarmer(
+                hot_keys.hot_keys,
+                _film_service,
+                generation=cache_generation.generation,
+                limit=settings.CACHE_PREWARM_KEYS,
+                concurrency=settings.CACHE_PREWARM_CONCURRENCY,
+            )
+            if cache_invalidation.invalidator:
+                # инкрементальная загрузка чистит ключи без смены поколения
+                cache_invalidation.invalidator.reload_listeners.append(
+                    prewarmer.request
+                )
+            background.append(asyncio.create_task(prewarmer.run()))
     try:
         yield
     finally:
         # shutdown
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        if hot_keys.hot_keys:
+            # воркер перезапускается (max_requests) — счётчики не теряем
+            try:
+                await hot_keys.hot_keys.flush()
+            except (redis_exc.RedisError, OSError):
+                pass
+        if redis.reader:
+            await redis.reader.aclose()
         if redis.redis:
             await redis.redis.aclose()
         if elastic.es:
@@ -66,6 +234,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# сжатие по Accept-Encoding; тела из кеша приходят уже сжатыми
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MIN_BYTES,
+        thread_min_size=settings.COMPRESSION_THREAD_MIN_BYTES,
+    )
+
+# метрики — самым внешним слоем, чтобы латентность включала все middleware
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, skip_paths=(settings.METRICS_PATH,))
+
+    @app.get(settings.METRICS_PATH, include_in_schema=False)
+    async def metrics() -> Response:
+        body, content_type = render_metrics()
+        return Response(body, media_type=content_type)
+
+
+if settings.HOT_KEYS_ENABLED:
+
+    @app.get(settings.HOT_KEYS_PATH, include_in_schema=False)
+    async def hot_key_set(limit: int = Query(default=100, ge=1, le=1000)) -> Response:
+        # горячие запросы по всем воркерам за последние HOT_KEYS_WINDOWS окон
+        if not hot_keys.hot_keys:
+            return ORJSONResponse([])
+        hot = await hot_keys.hot_keys.hot(limit)
+        return ORJSONResponse(
+            [{"request": request, "count": count} for request, count in hot]
+        )
+
 
 @app.exception_handler(TransportError)
 async def es_transport_error_handler(_: Request, exc: TransportError):
@@ -75,6 +273,24 @@ async def es_transport_error_handler(_: Request, exc: TransportError):
     )
 
 
+@app.exception_handler(circuit_breaker.CircuitOpenError)
+async def es_circuit_open_handler(_: Request, exc: circuit_breaker.CircuitOpenError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Elasticsearch is unavailable", "reason": str(exc)},
+        headers={"Retry-After": str(int(settings.ES_BREAKER_OPEN_SECONDS) or 1)},
+    )
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(_: Request, exc: DeadlineExceeded):
+    DEADLINE_EXCEEDED.labels("timeout").inc()
+    return JSONResponse(
+        status_code=504,
+        content={"detail": "Deadline exceeded", "reason": str(exc)},
+    )
+
+
 @app.exception_handler(redis_exc.RedisError)
 async def redis_error_handler(_: Request, exc: redis_exc.RedisError):
     return JSONResponse(
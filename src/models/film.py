@@ -1,7 +1,10 @@
 from typing import List, Optional
+from uuid import UUID
 
 from pydantic import BaseModel, Field
 
+from core.settings import settings
+
 
 # модель бизнес-логики (как хранится в ES)
 class Film(BaseModel):
@@ -19,9 +22,43 @@ class FilmListItem(BaseModel):
     imdb_rating: Optional[float] = None
 
 
+class FilmPage(BaseModel):
+    items: List[FilmListItem]
+    # курсор следующей страницы (search_after); None — дальше пусто
+    next_cursor: Optional[str] = None
+
+
+class FilmTotal(BaseModel):
+    value: int
+    # "eq" — точное число, "gte" — не меньше (подсчёт остановлен на пороге)
+    relation: str = "eq"
+
+
+class GenreFacet(BaseModel):
+    uuid: str
+    count: int
+
+
+class FilmListEnvelope(BaseModel):
+    items: List[FilmListItem]
+    total: FilmTotal
+    # сколько найденных фильмов в каждом жанре, по убыванию
+    genres: List[GenreFacet] = []
+
+
 class FilmDetail(BaseModel):
     uuid: str
     title: str
     imdb_rating: Optional[float] = None
     description: Optional[str] = None
     genre: Optional[list] = None
+
+
+class FilmBatchRequest(BaseModel):
+    ids: List[UUID] = Field(min_length=1, max_length=settings.FILM_BATCH_MAX_IDS)
+
+
+class FilmBatch(BaseModel):
+    items: List[FilmDetail]
+    # id из запроса, которых нет в каталоге
+    missing: List[str] = []
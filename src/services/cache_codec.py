@@ -0,0 +1,185 @@
+# src/services/cache_codec.py
+import logging
+import zlib
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import orjson
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - зависит от окружения
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover
+    lz4_frame = None
+
+logger = logging.getLogger(__name__)
+
+# как упаковано тело ответа (байт формата в записи кеша)
+PAYLOAD_RAW = 0
+PAYLOAD_COLUMNAR = 1
+PAYLOAD_MSGPACK = 2
+PAYLOAD_MSGPACK_COLUMNAR = 3
+
+# чем сжато упакованное тело
+COMPRESS_NONE = 0
+COMPRESS_ZLIB = 1
+COMPRESS_ZSTD = 2
+COMPRESS_LZ4 = 3
+
+_PAYLOADS = {
+    "raw": PAYLOAD_RAW,
+    "columnar": PAYLOAD_COLUMNAR,
+    "msgpack": PAYLOAD_MSGPACK,
+}
+_COMPRESSIONS = {
+    "none": COMPRESS_NONE,
+    "zlib": COMPRESS_ZLIB,
+    "zstd": COMPRESS_ZSTD,
+    "lz4": COMPRESS_LZ4,
+}
+
+
+class CacheCodec:
+    """Компактное представление тела ответа в Redis.
+
+    Списки — колонками (имена полей один раз на страницу), в JSON или msgpack;
+    крупные значения дополнительно сжимаются. Декодирование всегда
+    восстанавливает исходные байты ответа, поэтому ETag не меняется.
+    """
+
+    def __init__(
+        self,
+        payload: str = "raw",
+        compression: str = "none",
+        min_size: int = 1024,
+        level: int = 3,
+    ):
+        if payload not in _PAYLOADS:
+            raise ValueError(f"unknown cache payload codec: {payload}")
+        if compression not in _COMPRESSIONS:
+            raise ValueError(f"unknown cache compression: {compression}")
+        if payload == "msgpack" and msgpack is None:
+            logger.warning("msgpack is not installed, using columnar cache codec")
+            payload = "columnar"
+        if (compression == "zstd" and zstandard is None) or (
+            compression == "lz4" and lz4_frame is None
+        ):
+            logger.warning("%s is not installed, using zlib for cache", compression)
+            compression = "zlib"
+        self.payload = _PAYLOADS[payload]
+        self.compression = _COMPRESSIONS[compression]
+        # мелкие значения не сжимаем: выигрыш меньше заголовка и CPU
+        self.min_size = min_size
+        self.level = level
+        self._zstd = (
+            zstandard.ZstdCompressor(level=level)
+            if self.compression == COMPRESS_ZSTD
+            else None
+        )
+
+    def pack(self, payload: bytes) -> Tuple[int, int, bytes]:
+        """(формат тела, сжатие, байты) для записи в Redis."""
+        kind, body = self._pack_payload(payload)
+        if self.compression == COMPRESS_NONE or len(body) < self.min_size:
+            return kind, COMPRESS_NONE, body
+        compressed = self._compress(body)
+        if len(compressed) >= len(body):
+            return kind, COMPRESS_NONE, body
+        return kind, self.compression, compressed
+
+    def _pack_payload(self, payload: bytes) -> Tuple[int, bytes]:
+        if self.payload == PAYLOAD_RAW:
+            return PAYLOAD_RAW, payload
+        data = orjson.loads(payload)
+        columns = _to_columns(data)
+        if self.payload == PAYLOAD_MSGPACK:
+            kind = PAYLOAD_MSGPACK if columns is None else PAYLOAD_MSGPACK_COLUMNAR
+            body = msgpack.packb(data if columns is None else columns)
+        elif columns is not None:
+            kind, body = PAYLOAD_COLUMNAR, orjson.dumps(columns)
+        else:
+            return PAYLOAD_RAW, payload
+        # тело ответа обязано восстанавливаться байт в байт (ETag, 304)
+        if unpack(kind, COMPRESS_NONE, body) != payload:
+            return PAYLOAD_RAW, payload
+        return kind, body
+
+    def _compress(self, body: bytes) -> bytes:
+        if self.compression == COMPRESS_ZLIB:
+            return zlib.compress(body, self.level)
+        if self.compression == COMPRESS_ZSTD:
+            return self._zstd.compress(body)
+        return lz4_frame.compress(body)
+
+
+def unpack(kind: int, compression: int, body: bytes) -> Optional[bytes]:
+    """Исходное тело ответа; None — формат неизвестен или запись битая (промах)."""
+    decompress = _DECOMPRESSORS.get(compression)
+    if decompress is None:
+        return None
+    try:
+        return _unpack_payload(kind, decompress(body))
+    except _DECODE_ERRORS:
+        return None
+
+
+def _unpack_payload(kind: int, body: bytes) -> Optional[bytes]:
+    if kind == PAYLOAD_RAW:
+        return body
+    if kind == PAYLOAD_COLUMNAR:
+        return orjson.dumps(_from_columns(orjson.loads(body)))
+    if msgpack is None:
+        return None
+    if kind == PAYLOAD_MSGPACK:
+        return orjson.dumps(msgpack.unpackb(body))
+    if kind == PAYLOAD_MSGPACK_COLUMNAR:
+        return orjson.dumps(_from_columns(msgpack.unpackb(body)))
+    return None
+
+
+def _to_columns(data: Any) -> Optional[list]:
+    # [{"uuid":..,"title":..}, ...] -> [["uuid","title"], [v1, v2], ...]
+    if not isinstance(data, list) or not data:
+        return None
+    if not all(isinstance(row, dict) for row in data):
+        return None
+    keys = list(data[0])
+    if any(list(row) != keys for row in data):
+        return None
+    return [keys] + [list(row.values()) for row in data]
+
+
+def _from_columns(columns: list) -> list:
+    keys = columns[0]
+    return [dict(zip(keys, row)) for row in columns[1:]]
+
+
+def _decompressors() -> Dict[int, Callable[[bytes], bytes]]:
+    found: Dict[int, Callable[[bytes], bytes]] = {
+        COMPRESS_NONE: lambda body: body,
+        COMPRESS_ZLIB: zlib.decompress,
+    }
+    if zstandard is not None:
+        found[COMPRESS_ZSTD] = zstandard.ZstdDecompressor().decompress
+    if lz4_frame is not None:
+        found[COMPRESS_LZ4] = lz4_frame.decompress
+    return found
+
+
+_DECOMPRESSORS = _decompressors()
+# orjson и msgpack бросают наследников ValueError, lz4 — RuntimeError
+_DECODE_ERRORS: Tuple[type, ...] = (
+    zlib.error,
+    ValueError,
+    RuntimeError,
+    IndexError,
+    TypeError,
+) + ((zstandard.ZstdError,) if zstandard is not None else ())
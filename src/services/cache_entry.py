@@ -0,0 +1,128 @@
+# src/services/cache_entry.py
+import hashlib
+import math
+import random
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+import orjson
+
+from services.cache_codec import CacheCodec, unpack
+
+# первый байт значения в Redis: версия формата записи
+ENTRY_V1 = b"\x01"
+# v2: за версией — байт формата тела и байт сжатия (services/cache_codec.py)
+ENTRY_V2 = b"\x02"
+# голый JSON-массив или объект — запись до версионирования (v0)
+LEGACY_PREFIXES = (b"{", b"[")
+_META_LEN = struct.Struct("!I")
+_V2_HEADER = struct.Struct("!BBI")
+
+
+@dataclass
+class CacheEntry:
+    """Запись кеша: готовое тело ответа + метаданные (SWR, курсор, ETag)."""
+
+    payload: bytes
+    # после soft_expires_at запись считается устаревшей, но ещё отдаётся
+    soft_expires_at: float = 0.0
+    # сколько секунд заняло вычисление значения (для XFetch)
+    delta: float = 0.0
+    # курсор следующей страницы для списков
+    next_cursor: Optional[str] = None
+    # можно ли отдавать ответ в общие кеши (nginx/CDN); в Redis не пишется
+    cacheable: bool = field(default=True, compare=False)
+    # отдана устаревшая копия, потому что бэкенд недоступен (stale-if-error)
+    degraded: bool = field(default=False, compare=False)
+    # ES не успел опросить все шарды за бюджет запроса — страница неполная
+    partial: bool = field(default=False, compare=False)
+    # (тело, его ETag): хеш считается один раз на тело. replace() и смена
+    # payload дают другое тело — ETag пересчитается, устаревшим он не станет
+    _etag: Optional[Tuple[bytes, str]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    @property
+    def etag(self) -> str:
+        """Сильный валидатор: всегда хеш текущего payload."""
+        memo = self._etag
+        if memo is None or memo[0] is not self.payload:
+            memo = self._etag = (self.payload, make_etag(self.payload))
+        return memo[1]
+
+    def is_stale(self, now: Optional[float] = None) -> bool:
+        return (time.time() if now is None else now) >= self.soft_expires_at
+
+    def should_refresh(self, beta: float, now: Optional[float] = None) -> bool:
+        """XFetch: чем ближе soft-expiry и дороже пересчёт, тем вероятнее refresh."""
+        now = time.time() if now is None else now
+        if now >= self.soft_expires_at:
+            return True
+        if beta <= 0 or self.delta <= 0:
+            return False
+        # 1 - random() лежит в (0, 1], логарифм определён
+        gap = -self.delta * beta * math.log(1.0 - random.random())
+        return now + gap >= self.soft_expires_at
+
+    def meta(self) -> Dict[str, Any]:
+        meta: Dict[str, Any] = {
+            "s": self.soft_expires_at,
+            "d": self.delta,
+            "e": self.etag,
+        }
+        if self.next_cursor:
+            meta["n"] = self.next_cursor
+        return meta
+
+    def encode(self, codec: Optional[CacheCodec] = None) -> bytes:
+        meta = orjson.dumps(self.meta())
+        if codec is None:
+            return ENTRY_V1 + _META_LEN.pack(len(meta)) + meta + self.payload
+        kind, compression, body = codec.pack(self.payload)
+        return ENTRY_V2 + _V2_HEADER.pack(kind, compression, len(meta)) + meta + body
+
+    @classmethod
+    def decode(
+        cls, raw: Optional[bytes], legacy: bool = True
+    ) -> Optional["CacheEntry"]:
+        if not raw:
+            return None
+        version = raw[:1]
+        if version in LEGACY_PREFIXES:
+            # запись старого формата (голый JSON): если её payload совпадает
+            # с телом ответа — отдаём как сразу устаревшую, иначе это промах
+            return cls(payload=raw) if legacy else None
+        if version not in (ENTRY_V1, ENTRY_V2):
+            # битая запись или формат из будущей версии — промах, не тело ответа
+            return None
+        try:
+            if version == ENTRY_V1:
+                (meta_len,) = _META_LEN.unpack_from(raw, 1)
+                start = 1 + _META_LEN.size
+                payload: Optional[bytes] = raw[start + meta_len :]
+            else:
+                kind, compression, meta_len = _V2_HEADER.unpack_from(raw, 1)
+                start = 1 + _V2_HEADER.size
+                payload = unpack(kind, compression, raw[start + meta_len :])
+            meta = orjson.loads(raw[start : start + meta_len])
+        except (struct.error, orjson.JSONDecodeError):
+            return None
+        if payload is None:
+            # чужой формат сжатия или битое тело — считаем промахом
+            return None
+        entry = cls(
+            payload=payload,
+            soft_expires_at=float(meta.get("s", 0.0)),
+            delta=float(meta.get("d", 0.0)),
+            next_cursor=meta.get("n"),
+        )
+        if meta.get("e"):
+            # хеш этого же тела, посчитанный при записи: не считаем заново
+            entry._etag = (payload, meta["e"])
+        return entry
+
+
+def make_etag(payload: bytes) -> str:
+    return '"' + hashlib.blake2b(payload, digest_size=16).hexdigest() + '"'
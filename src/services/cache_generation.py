@@ -0,0 +1,53 @@
+# src/services/cache_generation.py
+import time
+from typing import Optional
+
+import redis.exceptions as redis_exc
+from redis.asyncio import Redis
+
+
+class CacheGeneration:
+    """Поколение каталога: входит в каждый ключ кеша, INCR сбрасывает всё за O(1)."""
+
+    def __init__(self, redis: Redis, key: str, refresh_interval: float):
+        self.redis = redis
+        self.key = key
+        # как долго воркер верит своей копии номера, не спрашивая Redis
+        self.refresh_interval = refresh_interval
+        self._value = 0
+        self._checked_at: Optional[float] = None
+
+    async def current(self) -> int:
+        now = time.monotonic()
+        if (
+            self._checked_at is not None
+            and now - self._checked_at < self.refresh_interval
+        ):
+            return self._value
+        self._checked_at = now
+        if not self.redis:
+            return self._value
+        try:
+            raw = await self.redis.get(self.key)
+        except redis_exc.RedisError:
+            # Redis недоступен — кешем всё равно не воспользуемся
+            return self._value
+        self._value = int(raw or 0)
+        return self._value
+
+    async def bump(self) -> int:
+        """Новое поколение: ключи прошлого больше не читаются и дотухают по TTL."""
+        self._value = int(await self.redis.incr(self.key))
+        self._checked_at = time.monotonic()
+        return self._value
+
+    async def prefix(self) -> str:
+        return f"v{await self.current()}:"
+
+
+generation: Optional[CacheGeneration] = None
+
+
+# Функция понадобится при внедрении зависимостей
+async def get_cache_generation() -> Optional[CacheGeneration]:
+    return generation
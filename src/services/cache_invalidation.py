@@ -0,0 +1,109 @@
+# src/services/cache_invalidation.py
+import asyncio
+import logging
+import uuid
+from typing import Callable, Iterable, List, Optional
+
+import orjson
+import redis.exceptions as redis_exc
+from redis.asyncio import Redis
+
+from services.local_cache import LocalCache
+
+logger = logging.getLogger(__name__)
+
+# специальный ключ: сбросить L1 целиком
+FLUSH_ALL = "*"
+# отправитель сообщений scripts/es_load.py
+ES_LOAD_ORIGIN = "es_load"
+
+# события keyspace notifications, по которым ключ пропадает из Redis
+KEYSPACE_EVENTS = ("evicted", "expired", "del")
+
+
+class CacheInvalidator:
+    """Рассылает и принимает инвалидации L1-кеша через Redis pub/sub."""
+
+    def __init__(
+        self,
+        redis: Redis,
+        local_cache: LocalCache,
+        channel: str,
+        keyspace_events: bool = False,
+        reconnect_delay: float = 1.0,
+    ):
+        self.redis = redis
+        self.local_cache = local_cache
+        self.channel = channel
+        self.keyspace_events = keyspace_events
+        self.reconnect_delay = reconnect_delay
+        # id воркера: свои же сообщения не обрабатываем
+        self.origin = uuid.uuid4().hex
+        # вызываются, когда загрузчик вычистил ключи из Redis (прогрев кеша)
+        self.reload_listeners: List[Callable[[], None]] = []
+
+    async def publish(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        if not keys:
+            return
+        message = orjson.dumps({"o": self.origin, "k": keys})
+        try:
+            await self.redis.publish(self.channel, message)
+        except redis_exc.RedisError:
+            # инвалидация best-effort: L1 всё равно доживёт максимум до своего TTL
+            logger.warning("cache invalidation publish failed", exc_info=True)
+
+    def handle_message(self, channel: bytes, data: bytes) -> None:
+        if channel.decode("utf-8", "replace") != self.channel:
+            # keyspace notification: в data — имя ключа
+            self.local_cache.delete(data.decode("utf-8", "replace"))
+            return
+        try:
+            payload = orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return
+        if payload.get("o") == self.origin:
+            return
+        if payload.get("o") == ES_LOAD_ORIGIN and payload.get("k"):
+            for listener in self.reload_listeners:
+                listener()
+        for key in payload.get("k", []):
+            if key == FLUSH_ALL:
+                self.local_cache.clear()
+                return
+            self.local_cache.delete(key)
+        # ключи, которых нет в Redis (страницы представлений), — по префиксу
+        for prefix in payload.get("p", []):
+            self.local_cache.delete_prefix(prefix)
+
+    async def run(self) -> None:
+        # фоновый слушатель; при обрыве связи переподключаемся
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                if self.keyspace_events:
+                    await pubsub.psubscribe(
+                        *(f"__keyevent@*__:{event}" for event in KEYSPACE_EVENTS)
+                    )
+                async for message in pubsub.listen():
+                    if message["type"] not in ("message", "pmessage"):
+                        continue
+                    self.handle_message(message["channel"], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except (redis_exc.RedisError, OSError):
+                logger.warning("cache invalidation listener disconnected")
+                # пока не были подписаны, могли пропустить инвалидации
+                self.local_cache.clear()
+                await asyncio.sleep(self.reconnect_delay)
+            finally:
+                await pubsub.aclose()
+
+
+invalidator: Optional[CacheInvalidator] = None
+
+
+# Функция понадобится при внедрении зависимостей
+async def get_invalidator() -> Optional[CacheInvalidator]:
+    return invalidator
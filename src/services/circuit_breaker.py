@@ -0,0 +1,153 @@
+# src/services/circuit_breaker.py
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, Tuple, TypeVar
+
+from elasticsearch import ApiError, TransportError
+
+from core.metrics import (
+    CIRCUIT_BREAKER_REJECTED,
+    CIRCUIT_BREAKER_STATE,
+    CIRCUIT_BREAKER_TRANSITIONS,
+)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Бэкенд считается недоступным: вызов отклонён без сетевого запроса."""
+
+
+def is_backend_failure(exc: BaseException) -> bool:
+    # 404/400 — нормальный ответ ES; сбой — сеть, таймаут, 429 и 5xx
+    if isinstance(exc, TransportError):
+        return True
+    if isinstance(exc, ApiError):
+        return exc.meta.status == 429 or exc.meta.status >= 500
+    return False
+
+
+class CircuitBreaker:
+    """Размыкатель по доле ошибок и медленных вызовов в скользящем окне.
+
+    closed -> open: в последних `window` вызовах (не меньше `min_calls`) доля
+    ошибок или медленных вызовов превысила порог. open -> half_open: через
+    `open_seconds`. В half_open пропускается не больше `half_open_calls` пробных
+    вызовов: все успешны — closed, любая ошибка — снова open. Состояние и
+    переходы видны в метриках circuit_breaker_* с меткой `name`.
+    """
+
+    def __init__(
+        self,
+        name: str = "es",
+        window: int = 20,
+        min_calls: int = 10,
+        failure_ratio: float = 0.5,
+        slow_call_seconds: float = 1.0,
+        slow_call_ratio: float = 0.8,
+        open_seconds: float = 5.0,
+        half_open_calls: int = 3,
+    ):
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_ratio = slow_call_ratio
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.name = name
+        # (ошибка, медленный) по последним вызовам
+        self._calls: Deque[Tuple[bool, bool]] = deque(maxlen=window)
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._trials = 0
+        self._trial_successes = 0
+        self.rejected = 0
+        self.opened = 0
+        self._export()
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        if not self._allow():
+            self.rejected += 1
+            CIRCUIT_BREAKER_REJECTED.labels(self.name).inc()
+            raise CircuitOpenError("circuit is open")
+        started = time.monotonic()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # о бэкенде отмена ничего не говорит — освобождаем пробный слот
+            if self.state == HALF_OPEN:
+                self._trials -= 1
+            raise
+        except Exception as exc:
+            # ответ ES вроде 404 — бэкенд жив, это успешный вызов
+            self._record(is_backend_failure(exc), time.monotonic() - started)
+            raise
+        self._record(failed=False, elapsed=time.monotonic() - started)
+        return result
+
+    def _allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                return False
+            self._transition(HALF_OPEN)
+            self._trials = 0
+            self._trial_successes = 0
+        # half_open: ограниченное число пробных запросов
+        if self._trials >= self.half_open_calls:
+            return False
+        self._trials += 1
+        return True
+
+    def _record(self, failed: bool, elapsed: float) -> None:
+        slow = elapsed >= self.slow_call_seconds
+        if self.state == HALF_OPEN:
+            if failed or slow:
+                self._open()
+                return
+            self._trial_successes += 1
+            if self._trial_successes >= self.half_open_calls:
+                self._transition(CLOSED)
+                self._calls.clear()
+            return
+        if self.state == OPEN:
+            # ответ на вызов, начатый до размыкания
+            return
+        self._calls.append((failed, slow))
+        if len(self._calls) < self.min_calls:
+            return
+        failures = sum(f for f, _ in self._calls) / len(self._calls)
+        slow_calls = sum(s for _, s in self._calls) / len(self._calls)
+        if failures >= self.failure_ratio or slow_calls >= self.slow_call_ratio:
+            self._open()
+
+    def _open(self) -> None:
+        self._transition(OPEN)
+        self._opened_at = time.monotonic()
+        self.opened += 1
+        self._calls.clear()
+
+    def _transition(self, state: str) -> None:
+        self.state = state
+        CIRCUIT_BREAKER_TRANSITIONS.labels(self.name, state).inc()
+        self._export()
+
+    def _export(self) -> None:
+        for state in (CLOSED, OPEN, HALF_OPEN):
+            CIRCUIT_BREAKER_STATE.labels(self.name, state).set(
+                1 if state == self.state else 0
+            )
+
+
+es_breaker: Optional[CircuitBreaker] = None
+
+
+# Функция понадобится при внедрении зависимостей
+async def get_es_breaker() -> Optional[CircuitBreaker]:
+    return es_breaker
@@ -1,50 +1,229 @@
 # src/services/film.py
-import json
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import replace
 from functools import lru_cache
-from typing import Any, Dict, List, Optional, Tuple
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
+import orjson
 import redis.exceptions as redis_exc
-from elasticsearch import AsyncElasticsearch, NotFoundError, TransportError
+from elasticsearch import (
+    AsyncElasticsearch,
+    ConnectionTimeout,
+    NotFoundError,
+    TransportError,
+)
 from fastapi import Depends, HTTPException
 from redis.asyncio import Redis
 
+from core import deadline
+from core.deadline import DeadlineExceeded
+from core.metrics import (
+    CACHE_CODEC_BYTES,
+    CACHE_PAYLOAD_SIZE,
+    DEADLINE_EXCEEDED,
+    cache_event,
+    track,
+)
+from core.pagination import decode_cursor, encode_cursor
+from core.query import STOP_WORDS, normalize_query
 from core.settings import settings
-from db.elastic import get_elastic
-from db.redis import get_redis
-from models.film import Film, FilmListItem
+from db.elastic import Hedger, get_elastic, get_hedger
+from db.redis import ReplicaReader, get_redis, get_redis_reader
+from models.film import Film, FilmListItem, FilmPage
+from services.cache_codec import CacheCodec
+from services.cache_entry import CacheEntry
+from services.cache_generation import CacheGeneration, get_cache_generation
+from services.cache_invalidation import CacheInvalidator, get_invalidator
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError, get_es_breaker
+from services.local_cache import LocalCache, get_local_cache
+from services.rank_views import RANK_SORT, RankViews, es_sort_value, get_rank_views
+from services.singleflight import FillLock, SingleFlight, get_singleflight
+from services.ttl_policy import DETAIL, LIST, SEARCH, TtlPolicy, from_settings
 
-FILM_CACHE_EXPIRE_IN_SECONDS = settings.FILM_CACHE_TTL
+FILM_CACHE_STALE_SECONDS = settings.FILM_CACHE_STALE_TTL
+FILM_CACHE_STALE_IF_ERROR_SECONDS = settings.FILM_CACHE_STALE_IF_ERROR_TTL
+CACHE_XFETCH_BETA = settings.CACHE_XFETCH_BETA
 INDEX = settings.ES_INDEX
+CURSOR_PIT_KEEP_ALIVE = settings.CURSOR_PIT_KEEP_ALIVE
+EXPORT_PIT_KEEP_ALIVE = settings.EXPORT_PIT_KEEP_ALIVE
+EXPORT_SLICE_SIZE = settings.EXPORT_SLICE_SIZE
+DEADLINE_ES_TIMEOUT_SHARE = settings.DEADLINE_ES_TIMEOUT_SHARE
+# total в конверте: точный (True) или "не меньше N" — ES перестаёт считать на N
+ENVELOPE_TOTAL_HITS = settings.FACETS_TOTAL_HITS_LIMIT or True
+TIEBREAKER_SORT = {"id": {"order": "asc"}}
+# поля ответа, которые в документе ES называются иначе
+SOURCE_FIELDS = {"uuid": "id"}
+EMPTY_LIST = b"[]"
+EMPTY_ENVELOPE = b'{"items":[],"total":{"value":0,"relation":"eq"},"genres":[]}'
+# ES не ответил или размыкатель не пустил запрос
+ES_UNAVAILABLE = (TransportError, CircuitOpenError)
+# ... или не успел за бюджет запроса
+ES_NO_ANSWER = ES_UNAVAILABLE + (DeadlineExceeded,)
+CACHE_CODEC = CacheCodec(
+    payload=settings.CACHE_CODEC,
+    compression=settings.CACHE_COMPRESSION,
+    min_size=settings.CACHE_COMPRESS_MIN_BYTES,
+    level=settings.CACHE_COMPRESSION_LEVEL,
+)
 
+# TTL записей: по эндпоинту и популярности ключа (общая на воркер)
+TTL_POLICY = from_settings(settings)
 
-def _cache_key(prefix: str, params: Dict[str, Any]) -> str:
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def _cache_key(prefix: str, params: Dict[str, Any], hashed: bool = False) -> str:
     items = sorted((k, str(v)) for k, v in params.items() if v is not None)
-    return prefix + ":" + "|".join(f"{k}={v}" for k, v in items)
+    body = "|".join(f"{k}={v}" for k, v in items)
+    if hashed:
+        # пользовательский ввод в ключ не попадает: длина ключа фиксирована
+        body = hashlib.blake2b(body.encode("utf-8"), digest_size=16).hexdigest()
+    return prefix + ":" + body
+
+
+def _project(payload: bytes, fields: Optional[List[str]]) -> bytes:
+    """Только поля `fields` из готового тела: объекта или массива объектов."""
+    if not fields:
+        return payload
+    data = orjson.loads(payload)
+    if isinstance(data, list):
+        return orjson.dumps([{f: row.get(f) for f in fields} for row in data])
+    return orjson.dumps({f: data.get(f) for f in fields})
+
+
+def _page_offset(page_number: int, page_size: int) -> int:
+    """from_ страницы; глубже окна ES (ES_MAX_RESULT_WINDOW) — 400."""
+    from_ = (page_number - 1) * page_size
+    if from_ + page_size > settings.ES_MAX_RESULT_WINDOW:
+        raise HTTPException(
+            status_code=400,
+            detail="page is too deep, use cursor pagination",
+        )
+    return from_
+
+
+def _envelope_payload(items: bytes, resp: Dict[str, Any]) -> bytes:
+    """Тело FilmListEnvelope: строки страницы + total и жанры из того же ответа ES."""
+    total = resp.get("hits", {}).get("total") or {}
+    buckets = resp.get("aggregations", {}).get("genres", {}).get("buckets", [])
+    extra = orjson.dumps(
+        {
+            "total": {
+                "value": total.get("value", 0),
+                "relation": total.get("relation", "eq"),
+            },
+            "genres": [{"uuid": b["key"], "count": b["doc_count"]} for b in buckets],
+        }
+    )
+    return b'{"items":' + items + b"," + extra[1:]
+
+
+def _page_from_entry(entry: CacheEntry) -> FilmPage:
+    return FilmPage(
+        items=[FilmListItem(**item) for item in orjson.loads(entry.payload)],
+        next_cursor=entry.next_cursor,
+    )
+
+
+async def _empty_stream() -> AsyncIterator[bytes]:
+    return
+    yield
 
 
 class FilmService:
-    def __init__(self, redis: Redis, elastic: AsyncElasticsearch):
+    def __init__(
+        self,
+        redis: Redis,
+        elastic: AsyncElasticsearch,
+        local_cache: Optional[LocalCache] = None,
+        invalidator: Optional[CacheInvalidator] = None,
+        singleflight: Optional[SingleFlight] = None,
+        generation: Optional[CacheGeneration] = None,
+        codec: Optional[CacheCodec] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        rank_views: Optional[RankViews] = None,
+        ttl_policy: Optional[TtlPolicy] = None,
+        read_redis: Optional[Union[Redis, ReplicaReader]] = None,
+        hedger: Optional[Hedger] = None,
+    ):
         self.redis = redis
+        # чтения кеша — с реплик (если настроены), запись — в primary
+        self.read_redis = read_redis or redis
         self.elastic = elastic
+        # L1: горячие ключи отдаём из памяти воркера, минуя Redis и парсинг
+        self.local_cache = local_cache
+        self.invalidator = invalidator
+        # защита ES от "стада" одинаковых промахов после истечения TTL
+        self.singleflight = singleflight or SingleFlight()
+        # поколение каталога в ключах: перезаливка сбрасывает весь кеш разом
+        self.generation = generation
+        # компактный формат значений в Redis (колонки + сжатие)
+        self.codec = codec or CACHE_CODEC
+        # при деградации ES не ждём таймаутов, а отдаём последнюю копию из кеша
+        self.breaker = breaker
+        # списки по рейтингу — постранично из ZSET, без ES и ключа на страницу
+        self.rank_views = rank_views
+        # сколько жить записи: свежая часть + SWR + запас на случай отказа ES
+        self.ttl_policy = ttl_policy or TTL_POLICY
+        # хвост задержки ES: медленное чтение дублируется на другой узел
+        self.hedger = hedger
+        self.fill_lock = FillLock(
+            redis,
+            ttl_ms=settings.CACHE_FILL_LOCK_TTL_MS,
+            wait=settings.CACHE_FILL_LOCK_WAIT,
+            poll_interval=settings.CACHE_FILL_LOCK_POLL,
+        )
+        # фоновые обновления устаревших записей (держим ссылки до завершения)
+        self._background: Set["asyncio.Task[Any]"] = set()
 
     # ---------- public ----------
     async def get_by_id(self, film_id: str) -> Optional[Film]:
-        film = await self._film_from_cache(film_id)
-        if film:
-            return film
+        entry = await self.get_film_raw(film_id)
+        if entry is None:
+            return None
+        data = orjson.loads(entry.payload)
+        return Film(id=data.pop("uuid"), **data)
 
-        # Если документ не найден в ES — возвращаем None (роутер отдаст 404).
-        try:
-            film = await self._get_film_from_elastic(film_id)
-        except TransportError as exc:
-            # ES недоступен — 503
-            raise HTTPException(
-                status_code=503, detail="Elasticsearch is unavailable"
-            ) from exc
+    async def get_film_raw(
+        self, film_id: str, fields: Optional[List[str]] = None
+    ) -> Optional[CacheEntry]:
+        """Карточка фильма как готовое тело ответа (FilmDetail в JSON).
+
+        В кеше всегда полная карточка (её ключ сбрасывает загрузчик по id),
+        `fields` вырезаются из неё при ответе.
+        """
+        key = await self._key_prefix() + film_id
+
+        async def load() -> Optional[CacheEntry]:
+            # Если документ не найден в ES — возвращаем None (роутер отдаст 404).
+            entry = await self._get_film_from_elastic(film_id)
+            if entry is not None:
+                await self._write_entry(key, entry, DETAIL)
+            return entry
 
-        if film:
-            await self._put_film_to_cache(film)
-        return film
+        # карточку после мягкого истечения не отдаём — только если ES недоступен
+        entry = await self._cached(key, load, DETAIL, legacy=False, swr=False)
+        if entry is None or not fields:
+            return entry
+        # ETag — от урезанного тела: иначе 304 на тело, которого клиент не видел
+        return replace(entry, payload=_project(entry.payload, fields))
 
     async def list_films(
         self,
@@ -52,69 +231,77 @@ class FilmService:
         page_number: int,
         page_size: int,
         genre: Optional[str] = None,
-    ) -> List[FilmListItem]:
-        params = {
-            "sort": sort,
-            "page_number": page_number,
-            "page_size": page_size,
-            "genre": genre,
-        }
-        key = _cache_key("films:list", params)
-
-        # читаем кеш безопасно
-        rows = await self._read_list_from_cache(key)
-        if rows is not None:
-            return rows
-
-        query, es_sort = self._build_list_query(sort=sort, genre=genre)
-        from_ = (page_number - 1) * page_size
-
-        try:
-            resp = await self.elastic.search(
-                index=INDEX,
-                query=query,
-                sort=es_sort,
-                from_=from_,
-                size=page_size,
-                _source=["id", "title", "imdb_rating"],
-            )
-        except NotFoundError:
-            # индекса нет — трактуем как "ничего не найдено"
-            return []
-        except TransportError as exc:
-            # ES недоступен — 503
-            raise HTTPException(
-                status_code=503, detail="Elasticsearch is unavailable"
-            ) from exc
+        cursor: Optional[str] = None,
+        pit: bool = False,
+    ) -> FilmPage:
+        entry = await self.list_films_raw(
+            sort, page_number, page_size, genre=genre, cursor=cursor, pit=pit
+        )
+        return _page_from_entry(entry)
 
-        rows: List[FilmListItem] = []
-        for hit in resp.get("hits", {}).get("hits", []):
-            src = hit.get("_source", {})
-            rows.append(
-                FilmListItem(
-                    uuid=src.get("id") or hit.get("_id", ""),
-                    title=src.get("title", ""),
-                    imdb_rating=src.get("imdb_rating"),
-                )
+    async def list_films_raw(
+        self,
+        sort: Optional[str],
+        page_number: int,
+        page_size: int,
+        genre: Optional[str] = None,
+        cursor: Optional[str] = None,
+        pit: bool = False,
+        envelope: bool = False,
+        fields: Optional[List[str]] = None,
+    ) -> CacheEntry:
+        if (
+            self.rank_views is not None
+            and not pit
+            and not envelope
+            and (sort or RANK_SORT) == RANK_SORT
+        ):
+            entry = await self._list_from_views(
+                sort, page_number, page_size, genre, cursor, fields
             )
-
-        await self._write_list_to_cache(key, rows)
-        return rows
+            if entry is not None:
+                return entry
+        query, es_sort = self._build_list_query(sort=sort, genre=genre)
+        return await self._search_page(
+            "films:list",
+            {"sort": sort, "genre": genre},
+            query=query,
+            es_sort=es_sort,
+            page_number=page_number,
+            page_size=page_size,
+            cursor=cursor,
+            pit=pit,
+            envelope=envelope,
+            fields=fields,
+        )
 
     async def search_films(
         self,
         query_str: str,
         page_number: int,
         page_size: int,
-    ) -> List[FilmListItem]:
-        params = {"q": query_str, "page_number": page_number, "page_size": page_size}
-        key = _cache_key("films:search", params)
+        cursor: Optional[str] = None,
+        pit: bool = False,
+    ) -> FilmPage:
+        entry = await self.search_films_raw(
+            query_str, page_number, page_size, cursor=cursor, pit=pit
+        )
+        return _page_from_entry(entry)
 
-        rows = await self._read_list_from_cache(key)
-        if rows is not None:
-            return rows
-
-        from_ = (page_number - 1) * page_size
+    async def search_films_raw(
+        self,
+        query_str: str,
+        page_number: int,
+        page_size: int,
+        cursor: Optional[str] = None,
+        pit: bool = False,
+        envelope: bool = False,
+        fields: Optional[List[str]] = None,
+    ) -> CacheEntry:
+        # один ключ кеша и один запрос к ES на все написания запроса
+        query_str = normalize_query(query_str, STOP_WORDS)
+        if not query_str:
+            return CacheEntry(payload=EMPTY_ENVELOPE if envelope else EMPTY_LIST)
         query = {
             "multi_match": {
                 "query": query_str,
@@ -122,69 +309,550 @@ class FilmService:
                 "fuzziness": "AUTO",
             }
         }
+        return await self._search_page(
+            "films:search",
+            {"q": query_str},
+            query=query,
+            es_sort=[
+                {"imdb_rating": {"order": "desc", "missing": "_last"}},
+                TIEBREAKER_SORT,
+            ],
+            page_number=page_number,
+            page_size=page_size,
+            cursor=cursor,
+            pit=pit,
+            hash_key=True,
+            envelope=envelope,
+            fields=fields,
+        )
 
+    async def get_many(self, film_ids: List[str]) -> Tuple[List[Film], List[str]]:
+        """Фильмы по списку id в порядке запроса + id, которых нет в каталоге."""
+        entry = await self.get_many_raw(film_ids)
+        data = orjson.loads(entry.payload)
+        films = [Film(id=item.pop("uuid"), **item) for item in data["items"]]
+        return films, data["missing"]
+
+    async def get_many_raw(
+        self, film_ids: List[str], fields: Optional[List[str]] = None
+    ) -> CacheEntry:
+        """Тело ответа FilmBatch, склеенное из закешированных карточек."""
+        ids = list(dict.fromkeys(film_ids))
+        prefix = await self._key_prefix()
+        keys = [prefix + film_id for film_id in ids]
+        cached = await self._read_entries(keys)
+        found: Dict[str, CacheEntry] = {}
+        stale: Dict[str, CacheEntry] = {}
+        for key, entry in cached.items():
+            target = found if self._usable(entry, swr=False) else stale
+            target[key[len(prefix) :]] = entry
+        for key in keys:
+            self.ttl_policy.observe_read(DETAIL, key, key[len(prefix) :] in found)
+
+        degraded = False
+        misses = [film_id for film_id in ids if film_id not in found]
+        if misses:
+            try:
+                loaded = await self._get_films_from_elastic(misses)
+            except ES_NO_ANSWER as exc:
+                # ES недоступен: выручают устаревшие копии, но только если они
+                # есть для всех промахов — иначе "missing" было бы неправдой
+                if any(film_id not in stale for film_id in misses):
+                    if isinstance(exc, DeadlineExceeded):
+                        raise
+                    raise HTTPException(
+                        status_code=503, detail="Elasticsearch is unavailable"
+                    ) from exc
+                cache_event("get_many_raw", "redis", "stale_fallback", len(misses))
+                if isinstance(exc, DeadlineExceeded):
+                    DEADLINE_EXCEEDED.labels("stale").inc()
+                loaded, degraded = {x: stale[x] for x in misses}, True
+            else:
+                if loaded:
+                    await self._write_entries(
+                        {prefix + x: entry for x, entry in loaded.items()}, DETAIL
+                    )
+            found.update(loaded)
+
+        items = b",".join(_project(found[x].payload, fields) for x in ids if x in found)
+        missing = orjson.dumps([x for x in ids if x not in found])
+        entry = CacheEntry(
+            payload=b'{"items":[' + items + b'],"missing":' + missing + b"}"
+        )
+        if degraded:
+            entry.cacheable = False
+            entry.degraded = True
+        return entry
+
+    async def export_films(
+        self, fields: Optional[List[str]] = None, genre: Optional[str] = None
+    ) -> AsyncIterator[bytes]:
+        """Весь каталог как NDJSON-чанки (по срезу из EXPORT_SLICE_SIZE документов).
+
+        PIT открывается сразу, чтобы недоступность ES стала 503 до начала ответа.
+        """
+        pit_id = await self._open_pit(EXPORT_PIT_KEEP_ALIVE)
+        if pit_id is None:
+            return _empty_stream()
+        return self._export_slices(pit_id, fields, genre)
+
+    # ---------- internals ----------
+    async def _export_slices(
+        self, pit_id: str, fields: Optional[List[str]], genre: Optional[str]
+    ) -> AsyncIterator[bytes]:
+        query: Dict[str, Any] = (
+            {"bool": {"filter": [{"terms": {"genre": [genre]}}]}}
+            if genre
+            else {"match_all": {}}
+        )
+        search_after: Optional[List[Any]] = None
         try:
-            resp = await self.elastic.search(
-                index=INDEX,
-                query=query,
-                sort=[{"imdb_rating": {"order": "desc", "missing": "_last"}}],
-                from_=from_,
-                size=page_size,
-                _source=["id", "title", "imdb_rating"],
+            while True:
+                search: Dict[str, Any] = {
+                    "pit": {"id": pit_id, "keep_alive": EXPORT_PIT_KEEP_ALIVE},
+                    "query": query,
+                    # _shard_doc — самый дешёвый порядок для обхода PIT
+                    "sort": [{"_shard_doc": "asc"}],
+                    "size": EXPORT_SLICE_SIZE,
+                    "_source": fields if fields else True,
+                    "track_total_hits": False,
+                }
+                if search_after is not None:
+                    search["search_after"] = search_after
+                resp = await self._es("export", lambda es: es.search(**search))
+                pit_id = resp.get("pit_id") or pit_id
+                hits = resp.get("hits", {}).get("hits", [])
+                if not hits:
+                    return
+                # в памяти держим только текущий срез
+                yield b"".join(
+                    orjson.dumps(hit.get("_source", {})) + b"\n" for hit in hits
+                )
+                if len(hits) < EXPORT_SLICE_SIZE:
+                    return
+                search_after = hits[-1]["sort"]
+        finally:
+            await self._close_pit(pit_id)
+
+    async def _search_page(
+        self,
+        prefix: str,
+        filters: Dict[str, Any],
+        query: Dict[str, Any],
+        es_sort: List[Dict[str, Any]],
+        page_number: int,
+        page_size: int,
+        cursor: Optional[str],
+        pit: bool,
+        hash_key: bool = False,
+        envelope: bool = False,
+        fields: Optional[List[str]] = None,
+    ) -> CacheEntry:
+        # курсор годится только для того же запроса, что его выдал
+        scope = _cache_key(prefix, filters)
+        search_after: Optional[List[Any]] = None
+        pit_id: Optional[str] = None
+        if cursor:
+            try:
+                search_after, pit_id = decode_cursor(cursor, scope)
+            except ValueError as exc:
+                raise HTTPException(status_code=400, detail="invalid cursor") from exc
+            from_ = 0
+        else:
+            from_ = _page_offset(page_number, page_size)
+        use_pit = pit or pit_id is not None
+
+        params = dict(filters, page_size=page_size)
+        if cursor:
+            params["cursor"] = cursor
+        else:
+            params["page_number"] = page_number
+        if envelope:
+            # та же страница в конверте — отдельная запись, но одна на ответ
+            params["envelope"] = 1
+        if fields:
+            params["fields"] = ",".join(fields)
+        key = await self._key_prefix() + _cache_key(prefix, params, hashed=hash_key)
+        endpoint = SEARCH if prefix == "films:search" else LIST
+
+        async def load() -> CacheEntry:
+            search: Dict[str, Any] = {
+                "query": query,
+                "sort": es_sort,
+                "from_": from_,
+                "size": page_size,
+                "_source": [
+                    SOURCE_FIELDS.get(f, f)
+                    for f in fields or ["uuid", "title", "imdb_rating"]
+                ],
+                # голый массив счётчик не показывает — не считаем совпадения зря
+                "track_total_hits": False,
+            }
+            if envelope:
+                # total и жанры — в том же запросе, что и страница
+                search["track_total_hits"] = ENVELOPE_TOTAL_HITS
+                search["aggs"] = {
+                    "genres": {
+                        "terms": {"field": "genre", "size": settings.FACETS_GENRES_SIZE}
+                    }
+                }
+            if search_after is not None:
+                search["search_after"] = search_after
+            if use_pit:
+                # PIT задаёт снапшот; индекс в запросе не указывается
+                search["pit"] = {"id": pit_id, "keep_alive": CURSOR_PIT_KEEP_ALIVE}
+            else:
+                search["index"] = INDEX
+            left = deadline.remaining()
+            if left is not None:
+                # шарды, не успевшие за бюджет, ES пропустит: неполная страница
+                # вовремя лучше 504
+                timeout_ms = max(1, int(left * DEADLINE_ES_TIMEOUT_SHARE * 1000))
+                search["timeout"] = f"{timeout_ms}ms"
+
+            started = time.monotonic()
+            try:
+                resp = await self._es(
+                    "search", lambda es: es.search(**search), hedge=True
+                )
+            except NotFoundError as exc:
+                if use_pit:
+                    # истёк keep_alive снапшота
+                    raise HTTPException(
+                        status_code=410, detail="cursor expired"
+                    ) from exc
+                # индекса нет — трактуем как "ничего не найдено"
+                return CacheEntry(payload=EMPTY_ENVELOPE if envelope else EMPTY_LIST)
+
+            entry = self._entry_from_hits(
+                resp, page_size, scope, resp.get("pit_id") if use_pit else None, fields
             )
-        except NotFoundError:
-            # индекса нет — пустой результат
-            return []
-        except TransportError as exc:
+            if envelope:
+                entry.payload = _envelope_payload(entry.payload, resp)
+            if resp.get("timed_out"):
+                # неполную страницу не кешируем: следующий запрос спросит ES снова
+                entry.partial = True
+                entry.cacheable = False
+            if use_pit:
+                # снапшот принадлежит одному клиенту — общим кешам не отдаём
+                entry.cacheable = False
+                if entry.next_cursor is None:
+                    await self._close_pit(resp.get("pit_id") or pit_id)
+            elif not entry.partial:
+                entry.delta = time.monotonic() - started
+                # жёсткий TTL длиннее мягкого: устаревшую запись ещё можно отдать
+                await self._write_entry(key, entry, endpoint)
+            return entry
+
+        if not use_pit:
+            # читаем кеш безопасно
+            return await self._cached(key, load, endpoint)
+
+        # снапшоты не кешируем: курсор с PIT уникален для клиента
+        if pit_id is None:
+            pit_id = await self._open_pit()
+            if pit_id is None:
+                return CacheEntry(payload=EMPTY_ENVELOPE if envelope else EMPTY_LIST)
+        try:
+            return await load()
+        except ES_UNAVAILABLE as exc:
             raise HTTPException(
                 status_code=503, detail="Elasticsearch is unavailable"
             ) from exc
 
-        rows: List[FilmListItem] = []
-        for hit in resp.get("hits", {}).get("hits", []):
-            src = hit.get("_source", {})
-            rows.append(
-                FilmListItem(
-                    uuid=src.get("id") or hit.get("_id", ""),
-                    title=src.get("title", ""),
-                    imdb_rating=src.get("imdb_rating"),
+    async def _list_from_views(
+        self,
+        sort: Optional[str],
+        page_number: int,
+        page_size: int,
+        genre: Optional[str],
+        cursor: Optional[str],
+        fields: Optional[List[str]] = None,
+    ) -> Optional[CacheEntry]:
+        """Страница из представлений в Redis; None — идти в ES."""
+        # курсоры взаимозаменяемы с ES: та же метка запроса и sort-значения
+        scope = _cache_key("films:list", {"sort": sort, "genre": genre})
+        # тот же предел глубины, что у ES: контракт API не зависит от представлений
+        start = 0 if cursor else _page_offset(page_number, page_size)
+        try:
+            if cursor:
+                try:
+                    search_after, pit_id = decode_cursor(cursor, scope)
+                except ValueError as exc:
+                    raise HTTPException(
+                        status_code=400, detail="invalid cursor"
+                    ) from exc
+                if pit_id is not None or not search_after:
+                    return None
+                # последнее sort-значение курсора — id (tiebreaker)
+                rank = await deadline.bounded(
+                    lambda: self.rank_views.rank(genre, str(search_after[-1]))
                 )
+                if rank is None:
+                    return None
+                start = rank + 1
+            # горячие страницы — из L1 воркера; в Redis ключей на страницу нет.
+            # Новое поколение каталога их отрезает, а после правки представлений
+            # scripts/es_load.py сбрасывает их по префиксу
+            prefix = await self._key_prefix()
+            local_key = f"{prefix}{self.rank_views.key(genre)}:{start}:{page_size}"
+            if fields:
+                local_key += ":" + ",".join(fields)
+            if self.local_cache:
+                entry = self.local_cache.get(local_key)
+                if entry is not None:
+                    cache_event("list_views", "l1", "hit")
+                    return entry
+            rows = await deadline.bounded(
+                lambda: self.rank_views.page(genre, start, page_size)
             )
+        except (redis_exc.RedisError, DeadlineExceeded):
+            cache_event("list_views", "redis", "error")
+            return None
+        if rows is None:
+            cache_event("list_views", "redis", "miss")
+            return None
+        cache_event("list_views", "redis", "hit")
 
-        await self._write_list_to_cache(key, rows)
-        return rows
+        next_cursor = None
+        if len(rows) == page_size:
+            last = orjson.loads(rows[-1])
+            next_cursor = encode_cursor(
+                [es_sort_value(last["imdb_rating"]), last["uuid"]], scope
+            )
+        entry = CacheEntry(
+            payload=_project(b"[" + b",".join(rows) + b"]", fields),
+            next_cursor=next_cursor,
+        )
+        if self.local_cache:
+            self.local_cache.set(local_key, entry, len(entry.payload))
+        return entry
 
-    # ---------- internals ----------
-    async def _get_film_from_elastic(self, film_id: str) -> Optional[Film]:
+    async def _open_pit(self, keep_alive: str = CURSOR_PIT_KEEP_ALIVE) -> Optional[str]:
         try:
-            doc = await self.elastic.get(index=INDEX, id=film_id)
+            resp = await self._es(
+                "open_pit",
+                lambda es: es.open_point_in_time(index=INDEX, keep_alive=keep_alive),
+            )
         except NotFoundError:
             return None
-        src = doc.get("_source", {})
-        src.setdefault("id", doc.get("_id"))
-        return Film(**src)
+        except ES_UNAVAILABLE as exc:
+            raise HTTPException(
+                status_code=503, detail="Elasticsearch is unavailable"
+            ) from exc
+        return resp["id"]
 
-    async def _film_from_cache(self, film_id: str) -> Optional[Film]:
-        if not self.redis:
-            return None
+    async def _close_pit(self, pit_id: Optional[str]) -> None:
+        if not pit_id:
+            return
         try:
-            data = await self.redis.get(film_id)
-        except redis_exc.RedisError:
-            return None
-        if not data:
-            return None
+            await self._es("close_pit", lambda es: es.close_point_in_time(id=pit_id))
+        except (NotFoundError,) + ES_NO_ANSWER:
+            # PIT всё равно умрёт по keep_alive
+            pass
+
+    async def _cached(
+        self,
+        key: str,
+        load: Callable[[], Awaitable[Optional[CacheEntry]]],
+        endpoint: str,
+        legacy: bool = True,
+        swr: bool = True,
+    ) -> Optional[CacheEntry]:
+        entry = await self._read_entry(key, legacy)
+        usable = entry is not None and self._usable(entry, swr)
+        self.ttl_policy.observe_read(endpoint, key, usable)
+        if usable:
+            # stale-while-revalidate: отдаём что есть, обновляем в фоне
+            if entry.should_refresh(CACHE_XFETCH_BETA):
+                self._revalidate(key, load)
+            return entry
+
+        async def read() -> Optional[CacheEntry]:
+            fresh = await self._read_entry(key, legacy)
+            return fresh if fresh is not None and self._usable(fresh, swr) else None
+
         try:
-            return Film.parse_raw(data)
-        except Exception:
-            return None
+            return await self._fill(key, load, read)
+        except ES_NO_ANSWER as exc:
+            if entry is None:
+                if isinstance(exc, DeadlineExceeded):
+                    raise
+                raise HTTPException(
+                    status_code=503, detail="Elasticsearch is unavailable"
+                ) from exc
+            # ES лежит, размыкатель открыт или бюджет запроса вышел — отдаём
+            # последнюю известную копию
+            cache_event("cached", "redis", "stale_fallback")
+            if isinstance(exc, DeadlineExceeded):
+                DEADLINE_EXCEEDED.labels("stale").inc()
+            return replace(entry, cacheable=False, degraded=True)
 
-    async def _put_film_to_cache(self, film: Film):
-        if not self.redis:
+    @staticmethod
+    def _usable(entry: CacheEntry, swr: bool) -> bool:
+        """Запись можно отдать без похода в ES (свежая или в окне SWR)."""
+        window = FILM_CACHE_STALE_SECONDS if swr else 0
+        return time.time() < entry.soft_expires_at + window
+
+    async def _es(
+        self,
+        operation: str,
+        fn: Callable[[AsyncElasticsearch], Awaitable[T]],
+        hedge: bool = False,
+    ) -> T:
+        # бюджет вышел — в ES не ходим (и размыкатель этот вызов не считает)
+        deadline.remaining()
+
+        def attempt() -> Awaitable[T]:
+            # таймаут клиента — остаток бюджета в момент отправки попытки
+            left = deadline.remaining()
+            if left is None:
+                return fn(self.elastic)
+            return fn(self.elastic.options(request_timeout=left))
+
+        async def timed() -> T:
+            with track("es", operation):
+                if hedge and self.hedger is not None:
+                    return await self.hedger.call(operation, attempt)
+                return await attempt()
+
+        try:
+            if self.breaker is None:
+                return await timed()
+            return await self.breaker.call(timed)
+        except ConnectionTimeout as exc:
+            if deadline.expired():
+                raise DeadlineExceeded("deadline exceeded") from exc
+            raise
+
+    def _revalidate(self, key: str, load: Callable[[], Awaitable[Any]]) -> None:
+        async def refresh() -> None:
+            token = await self.fill_lock.acquire(key)
+            if token is None:
+                # ключ уже обновляет другой воркер
+                return
+            try:
+                # фоновое обновление не ограничено дедлайном запроса-инициатора
+                with deadline.budget(None):
+                    await load()
+            finally:
+                await self.fill_lock.release(key, token)
+
+        task = asyncio.ensure_future(self.singleflight.do("refresh:" + key, refresh))
+        self._background.add(task)
+        task.add_done_callback(self._background_done)
+
+    def _background_done(self, task: "asyncio.Task[Any]") -> None:
+        self._background.discard(task)
+        if task.cancelled() or task.exception() is None:
+            return
+        if isinstance(task.exception(), ES_UNAVAILABLE):
+            # пока ES недоступен, это ожидаемо — не засоряем лог
+            logger.debug("background cache refresh skipped: %r", task.exception())
             return
+        logger.warning("background cache refresh failed: %r", task.exception())
+
+    async def _fill(
+        self,
+        key: str,
+        load: Callable[[], Awaitable[T]],
+        read: Callable[[], Awaitable[Optional[T]]],
+    ) -> T:
+        # в воркере — один загрузчик на ключ, остальные ждут его результат;
+        # каждый не дольше своего бюджета (загрузка при этом не отменяется)
+        return await deadline.bounded(
+            lambda: self.singleflight.do(
+                key, lambda: self._fill_locked(key, load, read)
+            )
+        )
+
+    async def _fill_locked(
+        self,
+        key: str,
+        load: Callable[[], Awaitable[T]],
+        read: Callable[[], Awaitable[Optional[T]]],
+    ) -> T:
+        # между воркерами и подами — короткий Redis-лок на заполнение ключа
+        token = await self.fill_lock.acquire(key)
+        if token is None:
+            value = await self.fill_lock.wait_for(read)
+            if value is not None:
+                self.singleflight.remote_done(coalesced=True)
+                return value
+            # держатель лока не успел — грузим сами, чтобы не висеть дольше
+            self.singleflight.remote_done(coalesced=False)
+            return await load()
         try:
-            await self.redis.set(film.id, film.json(), FILM_CACHE_EXPIRE_IN_SECONDS)
-        except redis_exc.RedisError:
-            pass
+            return await load()
+        finally:
+            await self.fill_lock.release(key, token)
+
+    @staticmethod
+    def _entry_from_hits(
+        resp: Dict[str, Any],
+        page_size: int,
+        scope: str,
+        pit_id: Optional[str],
+        fields: Optional[List[str]] = None,
+    ) -> CacheEntry:
+        hits = resp.get("hits", {}).get("hits", [])
+        # сразу тело ответа (List[FilmListItem]) без pydantic-моделей
+        rows = []
+        for hit in hits:
+            src = hit.get("_source", {})
+            row = {
+                "uuid": src.get("id") or hit.get("_id", ""),
+                "title": src.get("title", ""),
+                "imdb_rating": src.get("imdb_rating"),
+            }
+            rows.append({f: row[f] for f in fields} if fields else row)
+        next_cursor = None
+        # неполная страница — дальше ничего нет
+        if hits and len(hits) == page_size and hits[-1].get("sort") is not None:
+            next_cursor = encode_cursor(hits[-1]["sort"], scope, pit_id)
+        return CacheEntry(payload=orjson.dumps(rows), next_cursor=next_cursor)
+
+    @staticmethod
+    def _detail_entry(doc: Dict[str, Any]) -> CacheEntry:
+        # тело ответа FilmDetail
+        src = doc.get("_source", {})
+        payload = orjson.dumps(
+            {
+                "uuid": src.get("id") or doc.get("_id"),
+                "title": src.get("title", ""),
+                "imdb_rating": src.get("imdb_rating"),
+                "description": src.get("description"),
+                "genre": src.get("genre"),
+            }
+        )
+        return CacheEntry(payload=payload)
+
+    async def _get_film_from_elastic(self, film_id: str) -> Optional[CacheEntry]:
+        try:
+            doc = await self._es(
+                "get", lambda es: es.get(index=INDEX, id=film_id), hedge=True
+            )
+        except NotFoundError:
+            return None
+        return self._detail_entry(doc)
+
+    async def _get_films_from_elastic(
+        self, film_ids: List[str]
+    ) -> Dict[str, CacheEntry]:
+        try:
+            resp = await self._es(
+                "mget",
+                lambda es: es.mget(index=INDEX, ids=film_ids),
+                hedge=True,
+            )
+        except NotFoundError:
+            # индекса нет — ничего не найдено
+            return {}
+        return {
+            doc["_id"]: self._detail_entry(doc)
+            for doc in resp.get("docs", [])
+            if doc.get("found")
+        }
 
     def _build_list_query(
         self, sort: Optional[str], genre: Optional[str]
@@ -200,39 +868,162 @@ class FilmService:
             must.append({"terms": {"genre": [genre]}})
 
         query: Dict[str, Any] = {"bool": {"must": must}} if must else {"match_all": {}}
-        return query, es_sort or [
-            {"imdb_rating": {"order": "desc", "missing": "_last"}}
-        ]
+        es_sort = es_sort or [{"imdb_rating": {"order": "desc", "missing": "_last"}}]
+        # tiebreaker: стабильный порядок и однозначный search_after
+        return query, es_sort + [TIEBREAKER_SORT]
+
+    # -------- cache helpers --------
+    async def _key_prefix(self) -> str:
+        if self.generation is None:
+            return ""
+        prefix = await self.generation.prefix()
+        # частые перезаливки каталога ограничивают потолок TTL
+        self.ttl_policy.observe_generation(prefix)
+        return prefix
 
-    # -------- cache helpers for lists --------
-    async def _read_list_from_cache(self, key: str) -> Optional[List[FilmListItem]]:
+    async def _read_entry(self, key: str, legacy: bool = True) -> Optional[CacheEntry]:
+        if self.local_cache:
+            entry = self.local_cache.get(key)
+            if entry is not None:
+                cache_event("read_entry", "l1", "hit")
+                return entry
         if not self.redis:
             return None
         try:
-            cached = await self.redis.get(key)
-        except redis_exc.RedisError:
-            return None
-        if not cached:
+            with track("redis", "get"):
+                cached = await deadline.bounded(lambda: self.read_redis.get(key))
+        except (redis_exc.RedisError, DeadlineExceeded):
+            cache_event("read_entry", "redis", "error")
             return None
+        entry = self._decode_entry(key, cached, legacy)
+        cache_event("read_entry", "redis", "miss" if entry is None else "hit")
+        return entry
+
+    async def _read_entries(self, keys: List[str]) -> Dict[str, CacheEntry]:
+        found: Dict[str, CacheEntry] = {}
+        if self.local_cache:
+            for key in keys:
+                entry = self.local_cache.get(key)
+                if entry is not None:
+                    found[key] = entry
+            if found:
+                cache_event("read_entries", "l1", "hit", len(found))
+        rest = [key for key in keys if key not in found]
+        if not rest or not self.redis:
+            return found
+        # один MGET вместо GET на каждый ключ
         try:
-            raw = json.loads(cached.decode("utf-8"))
-            return [FilmListItem(**item) for item in raw]
-        except Exception:
-            return None
+            with track("redis", "mget"):
+                values = await deadline.bounded(lambda: self.read_redis.mget(rest))
+        except (redis_exc.RedisError, DeadlineExceeded):
+            cache_event("read_entries", "redis", "error", len(rest))
+            return found
+        hits = 0
+        for key, cached in zip(rest, values):
+            entry = self._decode_entry(key, cached, legacy=False)
+            if entry is not None:
+                found[key] = entry
+                hits += 1
+        if hits:
+            cache_event("read_entries", "redis", "hit", hits)
+        if len(rest) > hits:
+            cache_event("read_entries", "redis", "miss", len(rest) - hits)
+        return found
 
-    async def _write_list_to_cache(self, key: str, rows: List[FilmListItem]) -> None:
+    def _decode_entry(
+        self, key: str, cached: Optional[bytes], legacy: bool
+    ) -> Optional[CacheEntry]:
+        entry = CacheEntry.decode(cached, legacy=legacy)
+        if entry is not None and self.local_cache:
+            # в L1 лежит уже распакованное тело
+            self.local_cache.set(key, entry, len(entry.payload))
+        return entry
+
+    async def _write_entry(self, key: str, entry: CacheEntry, endpoint: str) -> None:
+        ttl = self.ttl_policy.ttl(endpoint, key)
+        entry.soft_expires_at = time.time() + ttl.soft
         if not self.redis:
             return
+        data = entry.encode(self.codec)
+        self._observe_encoded("write_entry", entry, data)
+        self.ttl_policy.observe_write(endpoint, ttl, len(data))
         try:
-            payload = json.dumps([r.dict() for r in rows]).encode("utf-8")
-            await self.redis.set(key, payload, FILM_CACHE_EXPIRE_IN_SECONDS)
+            with track("redis", "set"):
+                await self.redis.set(key, data, ttl.hard)
         except redis_exc.RedisError:
-            pass
+            cache_event("write_entry", "redis", "error")
+            return
+        cache_event("write_entry", "redis", "stored")
+        await self._remember_locally(key, entry, len(entry.payload))
+
+    async def _write_entries(
+        self, entries: Dict[str, CacheEntry], endpoint: str
+    ) -> None:
+        ttls = {key: self.ttl_policy.ttl(endpoint, key) for key in entries}
+        now = time.time()
+        for key, entry in entries.items():
+            entry.soft_expires_at = now + ttls[key].soft
+        if not self.redis:
+            return
+        encoded = {key: entry.encode(self.codec) for key, entry in entries.items()}
+        for key, data in encoded.items():
+            self._observe_encoded("write_entries", entries[key], data)
+            self.ttl_policy.observe_write(endpoint, ttls[key], len(data))
+        try:
+            # все записи — одним pipeline, без транзакции
+            with track("redis", "pipeline_set"):
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for key, data in encoded.items():
+                        pipe.set(key, data, ttls[key].hard)
+                    await pipe.execute()
+        except redis_exc.RedisError:
+            cache_event("write_entries", "redis", "error", len(encoded))
+            return
+        cache_event("write_entries", "redis", "stored", len(encoded))
+        if self.local_cache:
+            for key, entry in entries.items():
+                self.local_cache.set(key, entry, len(entry.payload))
+        if self.invalidator:
+            await self.invalidator.publish(list(encoded))
+
+    @staticmethod
+    def _observe_encoded(helper: str, entry: CacheEntry, data: bytes) -> None:
+        # отношение stored/raw — степень сжатия кодека
+        CACHE_PAYLOAD_SIZE.labels(helper).observe(len(data))
+        CACHE_CODEC_BYTES.labels(helper, "raw").inc(len(entry.payload))
+        CACHE_CODEC_BYTES.labels(helper, "stored").inc(len(data))
+
+    async def _remember_locally(self, key: str, value: Any, size: int) -> None:
+        # значение в Redis обновилось: кладём его в свой L1,
+        # а остальные воркеры сбрасывают старую копию
+        if self.local_cache:
+            self.local_cache.set(key, value, size)
+        if self.invalidator:
+            await self.invalidator.publish([key])
 
 
 @lru_cache()
 def get_film_service(
     redis: Redis = Depends(get_redis),
     elastic: AsyncElasticsearch = Depends(get_elastic),
+    local_cache: Optional[LocalCache] = Depends(get_local_cache),
+    invalidator: Optional[CacheInvalidator] = Depends(get_invalidator),
+    singleflight: SingleFlight = Depends(get_singleflight),
+    generation: Optional[CacheGeneration] = Depends(get_cache_generation),
+    breaker: Optional[CircuitBreaker] = Depends(get_es_breaker),
+    rank_views: Optional[RankViews] = Depends(get_rank_views),
+    read_redis: Union[Redis, ReplicaReader] = Depends(get_redis_reader),
+    hedger: Optional[Hedger] = Depends(get_hedger),
 ) -> FilmService:
-    return FilmService(redis, elastic)
+    return FilmService(
+        redis,
+        elastic,
+        local_cache,
+        invalidator,
+        singleflight,
+        generation,
+        breaker=breaker,
+        rank_views=rank_views,
+        read_redis=read_redis,
+        hedger=hedger,
+    )
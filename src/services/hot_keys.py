@@ -0,0 +1,205 @@
+# src/services/hot_keys.py
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import orjson
+import redis.exceptions as redis_exc
+from fastapi import HTTPException
+from redis.asyncio import Redis
+
+from services.cache_generation import CacheGeneration
+from services.film import ES_UNAVAILABLE, FilmService
+from services.sketch import TopK
+
+logger = logging.getLogger(__name__)
+
+
+class HotKeyTracker:
+    """Горячие запросы API: локальный top-K воркера, общий счёт — в Redis.
+
+    Раз в `flush_interval` воркер добавляет свои счётчики в ZSET текущего окна
+    (<key>:<номер окна>, окно — `window` секунд). Горячий набор — сумма последних
+    `windows` окон, поэтому старые запросы выпадают из него сами.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        key: str = "films:hot",
+        k: int = 200,
+        window: int = 300,
+        windows: int = 12,
+        keep: int = 1000,
+        flush_interval: float = 30.0,
+    ):
+        self.redis = redis
+        self.key = key
+        self.window = window
+        self.windows = windows
+        # сколько ключей хранить в одном окне Redis
+        self.keep = keep
+        self.flush_interval = flush_interval
+        self._top = TopK(k)
+
+    def record(self, op: str, **params: Any) -> None:
+        # ключ — сам запрос: по нему же прогрев повторит вызов FilmService
+        params = {k: v for k, v in params.items() if v is not None}
+        item = orjson.dumps(dict(params, op=op), option=orjson.OPT_SORT_KEYS)
+        self._top.add(item.decode("utf-8"))
+
+    async def flush(self) -> int:
+        items = self._top.items()
+        self._top.clear()
+        if not items:
+            return 0
+        window_key = f"{self.key}:{int(time.time() // self.window)}"
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for item, count in items:
+                pipe.zincrby(window_key, count, item)
+            pipe.zremrangebyrank(window_key, 0, -self.keep - 1)
+            pipe.expire(window_key, self.window * (self.windows + 1))
+            await pipe.execute()
+        return len(items)
+
+    async def hot(self, limit: int) -> List[Tuple[Dict[str, Any], float]]:
+        """Горячие запросы по всем воркерам, самые частые первыми."""
+        current = int(time.time() // self.window)
+        keys = [f"{self.key}:{current - i}" for i in range(self.windows)]
+        pairs = await self.redis.zunion(keys, withscores=True)
+        # ZUNION отдаёт по возрастанию score
+        return [(orjson.loads(item), score) for item, score in pairs[::-1][:limit]]
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except (redis_exc.RedisError, OSError):
+                # счётчики интервала теряются — горячий набор приблизительный
+                logger.warning("hot keys flush failed")
+
+
+class CachePrewarmer:
+    """Прогрев кеша горячими запросами: при старте воркера и после перезаливки.
+
+    Полная загрузка меняет поколение каталога — его видно по CacheGeneration.
+    Инкрементальная поколение не трогает, а чистит ключи: о ней сообщает
+    CacheInvalidator через `request()`.
+
+    Запросы идут через обычный FilmService: попадание в Redis заполняет L1
+    воркера, промах — Redis (с single-flight и fill-lock между воркерами).
+    """
+
+    def __init__(
+        self,
+        tracker: HotKeyTracker,
+        service_factory: Callable[[], FilmService],
+        generation: Optional[CacheGeneration] = None,
+        limit: int = 200,
+        concurrency: int = 8,
+        check_interval: float = 5.0,
+    ):
+        self.tracker = tracker
+        self.service_factory = service_factory
+        self.generation = generation
+        self.limit = limit
+        self.concurrency = concurrency
+        self.check_interval = check_interval
+        self._requested = asyncio.Event()
+
+    def request(self) -> None:
+        """Прогреть на ближайшей проверке, не дожидаясь нового поколения."""
+        self._requested.set()
+
+    async def prewarm(self) -> int:
+        hot = await self.tracker.hot(self.limit)
+        service = self.service_factory()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        warmed = 0
+
+        async def warm(request: Dict[str, Any]) -> None:
+            nonlocal warmed
+            async with semaphore:
+                try:
+                    await _replay(service, request)
+                except HTTPException as exc:
+                    if exc.status_code == 503:
+                        raise
+                    # запрос устарел (например, страница теперь слишком глубокая)
+                    return
+                warmed += 1
+
+        tasks = [asyncio.ensure_future(warm(request)) for request, _ in hot]
+        try:
+            await asyncio.gather(*tasks)
+        except ES_UNAVAILABLE + (HTTPException,):
+            # ES недоступен — остальное догреет обычный трафик
+            logger.warning(
+                "cache prewarm stopped after %d of %d keys", warmed, len(hot)
+            )
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return warmed
+
+    async def run(self) -> None:
+        # первый прогрев при старте, дальше — на каждое новое поколение каталога
+        # и после точечной чистки кеша загрузчиком
+        seen: Optional[int] = None
+        while True:
+            requested = self._requested.is_set()
+            self._requested.clear()
+            try:
+                current = await self.generation.current() if self.generation else 0
+                if current != seen or requested:
+                    started = time.perf_counter()
+                    warmed = await self.prewarm()
+                    seen = current
+                    logger.info(
+                        "cache prewarmed: %d keys in %.2fs",
+                        warmed,
+                        time.perf_counter() - started,
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # прогрев — оптимизация: при сбое просто ждём следующей проверки
+                logger.warning("cache prewarm failed", exc_info=True)
+            try:
+                await asyncio.wait_for(self._requested.wait(), self.check_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def _replay(service: FilmService, request: Dict[str, Any]) -> None:
+    op = request.get("op")
+    if op == "detail":
+        await service.get_film_raw(request["film_id"])
+    elif op == "list":
+        await service.list_films_raw(
+            request.get("sort"),
+            request["page_number"],
+            request["page_size"],
+            genre=request.get("genre"),
+            envelope=request.get("envelope", False),
+            fields=request.get("fields"),
+        )
+    elif op == "search":
+        await service.search_films_raw(
+            request["query"],
+            request["page_number"],
+            request["page_size"],
+            envelope=request.get("envelope", False),
+            fields=request.get("fields"),
+        )
+
+
+hot_keys: Optional[HotKeyTracker] = None
+
+
+# Функция понадобится при внедрении зависимостей
+async def get_hot_keys() -> Optional[HotKeyTracker]:
+    return hot_keys
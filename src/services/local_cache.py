@@ -0,0 +1,89 @@
+# src/services/local_cache.py
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class LocalCache:
+    """In-process кеш воркера (L1): TTL + LRU с лимитом по числу и объёму."""
+
+    def __init__(self, max_items: int, max_bytes: int, ttl: float):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # key -> (expires_at, size, value); порядок = порядок использования
+        self._data: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expires_at, _, value = item
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, size: int, ttl: Optional[float] = None) -> None:
+        # слишком крупные значения в L1 не кладём — они вытеснят всё остальное
+        if size > self.max_bytes:
+            self._remove(key)
+            return
+        self._remove(key)
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires_at, size, value)
+        self._bytes += size
+        while len(self._data) > self.max_items or self._bytes > self.max_bytes:
+            _, (_, old_size, _) = self._data.popitem(last=False)
+            self._bytes -= old_size
+            self.evictions += 1
+
+    def delete(self, key: str) -> bool:
+        return self._remove(key)
+
+    def delete_prefix(self, prefix: str) -> int:
+        # редкая операция (перестройка представлений): полный проход допустим
+        keys = [key for key in self._data if key.startswith(prefix)]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "items": len(self._data),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    def _remove(self, key: str) -> bool:
+        item = self._data.pop(key, None)
+        if item is None:
+            return False
+        self._bytes -= item[1]
+        return True
+
+
+local_cache: Optional[LocalCache] = None
+# сжатые тела ответов по (кодировка, ETag): свой лимит, чтобы не раздувать L1
+compressed_cache: Optional[LocalCache] = None
+
+
+# Функция понадобится при внедрении зависимостей
+async def get_local_cache() -> Optional[LocalCache]:
+    return local_cache
@@ -0,0 +1,73 @@
+# src/services/rank_views.py
+import struct
+from typing import Any, List, Optional
+
+from redis.asyncio import Redis
+
+from core.metrics import track
+
+# сортировка списка, которую обслуживают представления
+RANK_SORT = "-imdb_rating"
+
+
+def es_sort_value(rating: Optional[float]) -> float:
+    """Значение сортировки, которое вернул бы ES для поля float.
+
+    Курсор со страницы из Redis должен продолжаться и через ES: там рейтинг
+    хранится во float32 и отдаётся расширенным до double (9.2 -> 9.1999998...).
+    """
+    if rating is None:
+        # missing: _last при сортировке по убыванию
+        return float("-inf")
+    return struct.unpack("f", struct.pack("f", rating))[0]
+
+
+class RankViews:
+    """Материализованные списки "по рейтингу" в Redis, их ведёт scripts/es_load.py.
+
+    <prefix>:all и <prefix>:genre:<uuid> — ZSET id фильмов со score -рейтинг
+    (без рейтинга — +inf): ZRANGE отдаёт порядок "-imdb_rating", а равные
+    рейтинги — по id, как tiebreaker в ES. <prefix>:rows — HASH id -> готовый
+    FilmListItem в JSON. Одна структура обслуживает любые страницы и размеры.
+    """
+
+    def __init__(self, redis: Redis, prefix: str = "films:rank"):
+        self.redis = redis
+        self.prefix = prefix
+        self.all_key = f"{prefix}:all"
+        self.rows_key = f"{prefix}:rows"
+
+    def key(self, genre: Optional[str]) -> str:
+        return f"{self.prefix}:genre:{genre}" if genre else self.all_key
+
+    async def page(
+        self, genre: Optional[str], start: int, count: int
+    ) -> Optional[List[bytes]]:
+        """Строки страницы; None — представления не построены или неполны."""
+        with track("redis", "rank_page"):
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.zrange(self.key(genre), start, start + count - 1)
+                # пустой жанр и непостроенные представления различаем по :all
+                pipe.exists(self.all_key)
+                ids, ready = await pipe.execute()
+            if not ready:
+                return None
+            if not ids:
+                return []
+            rows = await self.redis.hmget(self.rows_key, ids)
+        if any(row is None for row in rows):
+            # представления перестраиваются прямо сейчас
+            return None
+        return rows
+
+    async def rank(self, genre: Optional[str], film_id: Any) -> Optional[int]:
+        with track("redis", "rank_zrank"):
+            return await self.redis.zrank(self.key(genre), film_id)
+
+
+rank_views: Optional[RankViews] = None
+
+
+# Функция понадобится при внедрении зависимостей
+async def get_rank_views() -> Optional[RankViews]:
+    return rank_views
@@ -0,0 +1,115 @@
+# src/services/singleflight.py
+import asyncio
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+import redis.exceptions as redis_exc
+from redis.asyncio import Redis
+
+from core.metrics import CACHE_COALESCED
+
+T = TypeVar("T")
+
+# снимаем лок, только если он всё ещё наш
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """Склеивает одновременные промахи по одному ключу в один вызов бэкенда."""
+
+    def __init__(self):
+        self._inflight: Dict[str, "asyncio.Future[Any]"] = {}
+        # реальные загрузки и запросы, дождавшиеся чужой загрузки в воркере
+        self.calls = 0
+        self.coalesced = 0
+        # промахи, которые закрыл другой воркер/под (через Redis-лок)
+        self.remote_coalesced = 0
+        self.remote_timeouts = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            CACHE_COALESCED.labels("local", "leader").inc()
+            # отдельная задача: отмена первого запроса не роняет остальных
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.coalesced += 1
+            CACHE_COALESCED.labels("local", "follower").inc()
+        return await asyncio.shield(task)
+
+    def remote_done(self, coalesced: bool) -> None:
+        """Исход ожидания чужого Redis-лока: значение дождались или грузим сами."""
+        if coalesced:
+            self.remote_coalesced += 1
+            CACHE_COALESCED.labels("remote", "follower").inc()
+        else:
+            self.remote_timeouts += 1
+            CACHE_COALESCED.labels("remote", "timeout").inc()
+
+    def _done(self, key: str, task: "asyncio.Future[Any]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # помечаем исключение полученным, даже если ждать было некому
+            task.exception()
+
+
+class FillLock:
+    """Короткий Redis-лок: кеш по ключу заполняет один воркер на весь кластер."""
+
+    def __init__(self, redis: Redis, ttl_ms: int, wait: float, poll_interval: float):
+        self.redis = redis
+        self.ttl_ms = ttl_ms
+        self.wait = wait
+        self.poll_interval = poll_interval
+
+    async def acquire(self, key: str) -> Optional[str]:
+        """Возвращает токен, если лок взят, и None, если его держит кто-то ещё."""
+        if not self.redis:
+            return ""
+        token = uuid.uuid4().hex
+        try:
+            ok = await self.redis.set(_lock_key(key), token, px=self.ttl_ms, nx=True)
+        except redis_exc.RedisError:
+            # без Redis координировать нечем — грузим сами
+            return ""
+        return token if ok else None
+
+    async def release(self, key: str, token: str) -> None:
+        if not self.redis or not token:
+            return
+        try:
+            await self.redis.eval(_RELEASE_SCRIPT, 1, _lock_key(key), token)
+        except redis_exc.RedisError:
+            pass
+
+    async def wait_for(self, read: Callable[[], Awaitable[Optional[T]]]) -> Optional[T]:
+        """Ждёт, пока держатель лока положит значение в кеш."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait
+        while loop.time() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            value = await read()
+            if value is not None:
+                return value
+        return None
+
+
+def _lock_key(key: str) -> str:
+    return "lock:" + key
+
+
+singleflight = SingleFlight()
+
+
+# Функция понадобится при внедрении зависимостей
+async def get_singleflight() -> SingleFlight:
+    return singleflight
@@ -0,0 +1,83 @@
+# src/services/sketch.py
+import heapq
+import random
+from typing import Dict, List, Tuple
+
+# простое Мерсенна для универсального хеширования (a*h + b) mod p
+_PRIME = (1 << 61) - 1
+
+
+class CountMinSketch:
+    """Частоты в фиксированной памяти: оценка сверху, без хранения самих ключей."""
+
+    def __init__(self, width: int = 2048, depth: int = 4):
+        self.width = width
+        self._rows = [[0] * width for _ in range(depth)]
+        # у каждой строки своя хеш-функция: иначе строки коллизят одинаково
+        rnd = random.Random(depth * 7919 + width)
+        self._seeds = [
+            (rnd.randrange(1, _PRIME), rnd.randrange(_PRIME)) for _ in range(depth)
+        ]
+
+    def add(self, item: str, count: int = 1) -> int:
+        estimate = None
+        for row, i in zip(self._rows, self._indexes(item)):
+            row[i] += count
+            estimate = row[i] if estimate is None else min(estimate, row[i])
+        return estimate or 0
+
+    def estimate(self, item: str) -> int:
+        return min(row[i] for row, i in zip(self._rows, self._indexes(item)))
+
+    def halve(self) -> None:
+        # старение: прошлые обращения весят вдвое меньше новых
+        for row in self._rows:
+            row[:] = [count >> 1 for count in row]
+
+    def clear(self) -> None:
+        for row in self._rows:
+            row[:] = [0] * self.width
+
+    def _indexes(self, item: str) -> List[int]:
+        h = hash(item)
+        return [(a * h + b) % _PRIME % self.width for a, b in self._seeds]
+
+
+class TopK:
+    """Самые частые ключи потока: count-min sketch + min-куча из k кандидатов."""
+
+    def __init__(self, k: int = 200, width: int = 2048, depth: int = 4):
+        self.k = k
+        self.sketch = CountMinSketch(width, depth)
+        self._counts: Dict[str, int] = {}
+        # ленивая куча: запись (оценка, ключ) актуальна, пока совпадает с _counts
+        self._heap: List[Tuple[int, str]] = []
+
+    def add(self, item: str) -> None:
+        estimate = self.sketch.add(item)
+        if item not in self._counts:
+            if len(self._counts) >= self.k:
+                smallest = self._smallest()
+                if estimate <= smallest[0]:
+                    return
+                heapq.heappop(self._heap)
+                del self._counts[smallest[1]]
+        self._counts[item] = estimate
+        heapq.heappush(self._heap, (estimate, item))
+        if len(self._heap) > 4 * self.k:
+            # выбрасываем устаревшие записи, чтобы куча не росла
+            self._heap = [(c, i) for i, c in self._counts.items()]
+            heapq.heapify(self._heap)
+
+    def items(self) -> List[Tuple[str, int]]:
+        return sorted(self._counts.items(), key=lambda x: -x[1])
+
+    def clear(self) -> None:
+        self.sketch.clear()
+        self._counts.clear()
+        self._heap.clear()
+
+    def _smallest(self) -> Tuple[int, str]:
+        while self._counts.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0]
@@ -0,0 +1,247 @@
+# src/services/suggest.py
+import asyncio
+import bisect
+import heapq
+import logging
+import re
+import time
+import unicodedata
+from array import array
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, TypeVar
+
+import orjson
+from elasticsearch import AsyncElasticsearch, NotFoundError
+
+from core.metrics import track
+from services.cache_generation import CacheGeneration
+from services.circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_WORD = re.compile(r"\w+")
+# верхняя граница диапазона ключей с общим префиксом
+_MAX_CHAR = "\U0010ffff"
+# префиксы, под которые попадает больше ключей, ранжируются при сборке:
+# перебирать такой диапазон на каждый запрос слишком дорого
+PRECOMPUTED_RANGE = 256
+SUGGEST_SOURCE = ["id", "title", "imdb_rating"]
+
+
+def normalize_title(text: str) -> str:
+    """Регистр, диакритика и пунктуация не важны: "Amélie" находится по "ame"."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(_WORD.findall(text))
+
+
+def _title_keys(title: str) -> Iterable[str]:
+    # название целиком и с каждого следующего слова: "star" находит "Silver Star"
+    words = normalize_title(title).split()
+    return {" ".join(words[i:]) for i in range(len(words))}
+
+
+def _rank(doc: Dict[str, Any]) -> tuple:
+    rating = doc.get("imdb_rating")
+    # по убыванию рейтинга, без рейтинга — в конце
+    return rating is None, -(rating or 0), doc.get("title") or ""
+
+
+class SuggestIndex:
+    """Неизменяемый индекс подсказок: отсортированные ключи + bisect.
+
+    Фильмы пронумерованы в порядке рейтинга, поэтому лучшие подсказки по
+    префиксу — это наименьшие номера в диапазоне ключей. Строки ответа
+    сериализуются один раз при сборке.
+    """
+
+    def __init__(self, docs: Iterable[Dict[str, Any]], max_limit: int = 10):
+        films = sorted((d for d in docs if d.get("id") and d.get("title")), key=_rank)
+        self.max_limit = max_limit
+        self._rows: List[bytes] = [
+            orjson.dumps(
+                {
+                    "uuid": d["id"],
+                    "title": d["title"],
+                    "imdb_rating": d.get("imdb_rating"),
+                }
+            )
+            for d in films
+        ]
+        pairs = sorted(
+            (key, n) for n, d in enumerate(films) for key in _title_keys(d["title"])
+        )
+        self._keys: List[str] = [key for key, _ in pairs]
+        self._films = array("I", (n for _, n in pairs))
+        self._top = self._precompute()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def lookup(self, prefix: str, limit: int) -> List[int]:
+        """Номера фильмов для подсказки, лучшие первыми."""
+        key = normalize_title(prefix)
+        if not key:
+            return []
+        limit = min(limit, self.max_limit)
+        top = self._top.get(key)
+        if top is not None:
+            return top[:limit]
+        lo = bisect.bisect_left(self._keys, key)
+        hi = bisect.bisect_left(self._keys, key + _MAX_CHAR, lo)
+        return heapq.nsmallest(limit, set(self._films[lo:hi]))
+
+    def payload(self, prefix: str, limit: int) -> bytes:
+        return (
+            b"[" + b",".join(self._rows[n] for n in self.lookup(prefix, limit)) + b"]"
+        )
+
+    def _precompute(self) -> Dict[str, List[int]]:
+        # обход префиксов в глубину; спускаемся только в широкие диапазоны
+        top: Dict[str, List[int]] = {}
+        stack = [("", 0, len(self._keys))]
+        while stack:
+            prefix, lo, hi = stack.pop()
+            if prefix:
+                top[prefix] = heapq.nsmallest(self.max_limit, set(self._films[lo:hi]))
+            depth = len(prefix)
+            i = lo
+            while i < hi:
+                if len(self._keys[i]) <= depth:
+                    i += 1
+                    continue
+                child = self._keys[i][: depth + 1]
+                j = bisect.bisect_left(self._keys, child + _MAX_CHAR, i, hi)
+                if j - i > PRECOMPUTED_RANGE:
+                    stack.append((child, i, j))
+                i = j
+        return top
+
+
+class SuggestService:
+    """Индекс подсказок воркера: строится из ES и перестраивается в фоне.
+
+    Пересборка — при смене поколения каталога (полная загрузка, bump) и не
+    реже раза в `max_age` секунд (инкрементальная загрузка поколение не меняет).
+    """
+
+    def __init__(
+        self,
+        elastic: AsyncElasticsearch,
+        index: str,
+        generation: Optional[CacheGeneration] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        max_limit: int = 10,
+        check_interval: float = 5.0,
+        max_age: float = 300.0,
+        slice_size: int = 1000,
+        keep_alive: str = "1m",
+    ):
+        self.elastic = elastic
+        self.es_index = index
+        self.generation = generation
+        self.breaker = breaker
+        self.max_limit = max_limit
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self.slice_size = slice_size
+        self.keep_alive = keep_alive
+        self.index: Optional[SuggestIndex] = None
+        self._built_generation: Optional[int] = None
+        self._built_at = 0.0
+
+    async def rebuild(self) -> None:
+        generation = await self.generation.current() if self.generation else None
+        started = time.perf_counter()
+        docs = await self._load_titles()
+        # сборка занимает CPU: не держим event loop воркера
+        self.index = await asyncio.to_thread(SuggestIndex, docs, self.max_limit)
+        self._built_generation = generation
+        self._built_at = time.monotonic()
+        logger.info(
+            "suggest index built: %d films in %.2fs",
+            len(self.index),
+            time.perf_counter() - started,
+        )
+
+    async def stale(self) -> bool:
+        if self.index is None:
+            return True
+        if time.monotonic() - self._built_at >= self.max_age:
+            return True
+        if self.generation is None:
+            return False
+        return await self.generation.current() != self._built_generation
+
+    async def run(self) -> None:
+        # фоновая задача: первая сборка при старте, дальше — по изменениям каталога
+        while True:
+            try:
+                if await self.stale():
+                    await self.rebuild()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # остаёмся на прошлом индексе (или без него) и пробуем позже
+                logger.warning("suggest index rebuild failed", exc_info=True)
+            await asyncio.sleep(self.check_interval)
+
+    async def _load_titles(self) -> List[Dict[str, Any]]:
+        try:
+            resp = await self._es(
+                "open_pit",
+                lambda: self.elastic.open_point_in_time(
+                    index=self.es_index, keep_alive=self.keep_alive
+                ),
+            )
+        except NotFoundError:
+            # индекса ещё нет — пустой каталог
+            return []
+        pit_id = resp["id"]
+        docs: List[Dict[str, Any]] = []
+        search_after: Optional[List[Any]] = None
+        try:
+            while True:
+                search: Dict[str, Any] = {
+                    "pit": {"id": pit_id, "keep_alive": self.keep_alive},
+                    "query": {"match_all": {}},
+                    "sort": [{"_shard_doc": "asc"}],
+                    "size": self.slice_size,
+                    "_source": SUGGEST_SOURCE,
+                    "track_total_hits": False,
+                }
+                if search_after is not None:
+                    search["search_after"] = search_after
+                resp = await self._es(
+                    "suggest_load", lambda: self.elastic.search(**search)
+                )
+                pit_id = resp.get("pit_id") or pit_id
+                hits = resp.get("hits", {}).get("hits", [])
+                docs.extend(hit.get("_source", {}) for hit in hits)
+                if len(hits) < self.slice_size:
+                    return docs
+                search_after = hits[-1]["sort"]
+        finally:
+            try:
+                await self.elastic.close_point_in_time(id=pit_id)
+            except Exception:
+                # PIT всё равно умрёт по keep_alive
+                pass
+
+    async def _es(self, operation: str, fn: Callable[[], Awaitable[T]]) -> T:
+        async def timed() -> T:
+            with track("es", operation):
+                return await fn()
+
+        if self.breaker is None:
+            return await timed()
+        return await self.breaker.call(timed)
+
+
+suggest_service: Optional[SuggestService] = None
+
+
+# Функция понадобится при внедрении зависимостей
+async def get_suggest_service() -> Optional[SuggestService]:
+    return suggest_service
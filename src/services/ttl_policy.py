@@ -0,0 +1,156 @@
+# src/services/ttl_policy.py
+import math
+import random
+import time
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from core.metrics import CACHE_LOOKUPS, CACHE_TTL_BYTE_SECONDS, CACHE_TTL_SECONDS
+from services.sketch import CountMinSketch
+
+DETAIL = "detail"
+LIST = "list"
+SEARCH = "search"
+
+
+class Ttl(NamedTuple):
+    # после soft запись устаревшая (SWR), после hard Redis её удаляет
+    soft: int
+    hard: int
+
+
+class TtlPolicy:
+    """TTL записи кеша по эндпоинту, популярности ключа и частоте смены каталога.
+
+    Воркер считает чтения каждого ключа в count-min sketch (счётчики вдвое
+    стареют раз в `window` секунд). Ключ, который спросили один раз, живёт
+    минимальный TTL эндпоинта и без хвоста stale-if-error. TTL популярного
+    ключа удваивается с каждым удвоением числа чтений, до потолка. Потолок не
+    больше половины среднего интервала между сменами поколения каталога.
+    К итоговому TTL добавляется джиттер, чтобы ключи не истекали разом.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, Tuple[int, int, int]],
+        stale: int,
+        stale_if_error: int,
+        fixed_ttl: int,
+        adaptive: bool = True,
+        jitter: float = 0.1,
+        window: float = 300.0,
+        width: int = 4096,
+    ):
+        # эндпоинт -> (база, минимум, потолок)
+        self.limits = limits
+        self.stale = stale
+        self.stale_if_error = stale_if_error
+        # прежняя единая политика — для отчёта об экономии памяти
+        self.fixed_hard = fixed_ttl + max(stale, stale_if_error)
+        self.adaptive = adaptive
+        self.jitter = jitter
+        self.window = window
+        self._reads = CountMinSketch(width=width)
+        self._aged_at = time.monotonic()
+        self._generation: Optional[str] = None
+        self._generation_at = 0.0
+        self._change_interval: Optional[float] = None
+        self._rnd = random.Random()
+        self._lookups: Dict[Tuple[str, bool], int] = {}
+        self._byte_seconds = {"adaptive": 0, "fixed": 0}
+
+    def observe_read(self, endpoint: str, key: str, hit: bool) -> None:
+        now = time.monotonic()
+        if now - self._aged_at >= self.window:
+            self._reads.halve()
+            self._aged_at = now
+        self._reads.add(key)
+        CACHE_LOOKUPS.labels(endpoint, "hit" if hit else "miss").inc()
+        self._lookups[endpoint, hit] = self._lookups.get((endpoint, hit), 0) + 1
+
+    def observe_generation(self, generation: str) -> None:
+        now = time.monotonic()
+        if self._generation is not None and generation != self._generation:
+            interval = now - self._generation_at
+            # EWMA интервала между перезаливками каталога
+            self._change_interval = (
+                interval
+                if self._change_interval is None
+                else 0.7 * self._change_interval + 0.3 * interval
+            )
+        if generation != self._generation:
+            self._generation = generation
+            self._generation_at = now
+
+    def ttl(self, endpoint: str, key: str) -> Ttl:
+        base, low, high = self.limits[endpoint]
+        if not self.adaptive:
+            return Ttl(base, base + max(self.stale, self.stale_if_error))
+        reads = self._reads.estimate(key)
+        if reads <= 1:
+            # одноразовый ключ: короткий TTL и только окно SWR сверху
+            soft, tail = low, self.stale
+        else:
+            doublings = int(math.log2(reads)) - 1
+            soft = min(self._ceiling(base, high), base << min(doublings, 16))
+            tail = max(self.stale, self.stale_if_error)
+        soft = max(1, round(soft * (1 + self._rnd.uniform(-self.jitter, self.jitter))))
+        return Ttl(soft, soft + tail)
+
+    def observe_write(self, endpoint: str, ttl: Ttl, size: int) -> None:
+        # байт-секунды ~ средний объём памяти, который занимают записи
+        CACHE_TTL_SECONDS.labels(endpoint).observe(ttl.soft)
+        CACHE_TTL_BYTE_SECONDS.labels(endpoint, "adaptive").inc(size * ttl.hard)
+        CACHE_TTL_BYTE_SECONDS.labels(endpoint, "fixed").inc(size * self.fixed_hard)
+        self._byte_seconds["adaptive"] += size * ttl.hard
+        self._byte_seconds["fixed"] += size * self.fixed_hard
+
+    def stats(self) -> Dict[str, Any]:
+        hits = sum(n for (_, hit), n in self._lookups.items() if hit)
+        total = sum(self._lookups.values())
+        fixed = self._byte_seconds["fixed"]
+        return {
+            "hit_ratio": round(hits / total, 4) if total else None,
+            "memory_saved": (
+                round(1 - self._byte_seconds["adaptive"] / fixed, 4) if fixed else None
+            ),
+        }
+
+    def _ceiling(self, base: int, high: int) -> int:
+        if self._change_interval is None:
+            return high
+        # каталог меняется часто — долгие TTL только держали бы лишние записи
+        return max(base, min(high, int(self._change_interval / 2)))
+
+
+def from_settings(settings: Any) -> TtlPolicy:
+    base = settings.FILM_CACHE_TTL
+
+    def limits(ttl: Optional[int], low: int, high: int) -> Tuple[int, int, int]:
+        ttl = base if ttl is None else ttl
+        return ttl, min(low, ttl), max(high, ttl)
+
+    return TtlPolicy(
+        limits={
+            DETAIL: limits(
+                settings.CACHE_TTL_DETAIL,
+                settings.CACHE_TTL_DETAIL_MIN,
+                settings.CACHE_TTL_DETAIL_MAX,
+            ),
+            LIST: limits(
+                settings.CACHE_TTL_LIST,
+                settings.CACHE_TTL_LIST_MIN,
+                settings.CACHE_TTL_LIST_MAX,
+            ),
+            SEARCH: limits(
+                settings.CACHE_TTL_SEARCH,
+                settings.CACHE_TTL_SEARCH_MIN,
+                settings.CACHE_TTL_SEARCH_MAX,
+            ),
+        },
+        stale=settings.FILM_CACHE_STALE_TTL,
+        stale_if_error=settings.FILM_CACHE_STALE_IF_ERROR_TTL,
+        fixed_ttl=base,
+        adaptive=settings.CACHE_TTL_ADAPTIVE,
+        jitter=settings.CACHE_TTL_JITTER,
+        window=settings.CACHE_TTL_WINDOW,
+    )
@@ -1,12 +1,19 @@
+import asyncio
 import copy
 import typing as t
 
+import orjson
 import pytest
+from elastic_transport import ApiResponseMeta, HttpHeaders
+from elasticsearch import NotFoundError
 from fastapi.testclient import TestClient
 
+from core.pagination import decode_cursor, encode_cursor
+from services.cache_entry import CacheEntry
 from services.film import get_film_service as get_film_service_pkg
+from services.suggest import SuggestIndex, SuggestService, get_suggest_service
 from src.main import app
-from src.models.film import Film, FilmListItem
+from src.models.film import Film, FilmDetail, FilmListItem, FilmPage
 from src.services.film import get_film_service as get_film_service_src
 
 
@@ -60,6 +67,8 @@ class InMemoryFilmService:
 
     def __init__(self, films: t.List[dict]):
         self._films: t.List[Film] = [Film(**copy.deepcopy(x)) for x in films]
+        # найденные последним list/search — для total и фасетов конверта
+        self._matched: t.List[Film] = []
 
     async def get_by_id(self, film_id: str) -> t.Optional[Film]:
         for f in self._films:
@@ -67,13 +76,107 @@ class InMemoryFilmService:
                 return f
         return None
 
+    # ---------- "сырые" методы: готовое тело ответа, как у FilmService ----------
+    async def get_film_raw(
+        self, film_id: str, fields: t.Optional[t.List[str]] = None
+    ) -> t.Optional[CacheEntry]:
+        film = await self.get_by_id(film_id)
+        if film is None:
+            return None
+        detail = self._detail(film).dict(include=set(fields) if fields else None)
+        return CacheEntry(payload=orjson.dumps(detail))
+
+    async def get_many_raw(
+        self, film_ids: t.List[str], fields: t.Optional[t.List[str]] = None
+    ) -> CacheEntry:
+        films, missing = await self.get_many(film_ids)
+        include = set(fields) if fields else None
+        body = {
+            "items": [self._detail(f).dict(include=include) for f in films],
+            "missing": missing,
+        }
+        return CacheEntry(payload=orjson.dumps(body))
+
+    async def list_films_raw(
+        self, *args, envelope=False, fields=None, **kwargs
+    ) -> CacheEntry:
+        page = await self.list_films(*args, **kwargs)
+        return self._raw_page(page, self._matched if envelope else None, fields)
+
+    async def search_films_raw(
+        self, *args, envelope=False, fields=None, **kwargs
+    ) -> CacheEntry:
+        page = await self.search_films(*args, **kwargs)
+        return self._raw_page(page, self._matched if envelope else None, fields)
+
+    async def export_films(
+        self, fields: t.Optional[t.List[str]] = None, genre: t.Optional[str] = None
+    ) -> t.AsyncIterator[bytes]:
+        films = [f for f in self._films if not genre or genre in (f.genre or [])]
+
+        async def chunks():
+            # по два документа в чанке — как срезы search_after
+            for i in range(0, len(films), 2):
+                docs = [
+                    f.dict(include=set(fields) if fields else None)
+                    for f in films[i : i + 2]
+                ]
+                yield b"".join(orjson.dumps(d) + b"\n" for d in docs)
+
+        return chunks()
+
+    @staticmethod
+    def _detail(film: Film) -> FilmDetail:
+        return FilmDetail(
+            uuid=film.id,
+            title=film.title,
+            imdb_rating=film.imdb_rating,
+            description=film.description,
+            genre=film.genre,
+        )
+
+    @staticmethod
+    def _raw_page(
+        page: FilmPage,
+        matched: t.Optional[t.List[Film]] = None,
+        fields: t.Optional[t.List[str]] = None,
+    ) -> CacheEntry:
+        include = set(fields) if fields else None
+        body: t.Any = [x.dict(include=include) for x in page.items]
+        if matched is not None:
+            # конверт: total и фасеты по всем найденным, как aggs в ES
+            counts: t.Dict[str, int] = {}
+            for f in matched:
+                for genre in f.genre or []:
+                    counts[genre] = counts.get(genre, 0) + 1
+            body = {
+                "items": body,
+                "total": {"value": len(matched), "relation": "eq"},
+                "genres": [
+                    {"uuid": g, "count": c}
+                    for g, c in sorted(counts.items(), key=lambda x: (-x[1], x[0]))
+                ],
+            }
+        return CacheEntry(payload=orjson.dumps(body), next_cursor=page.next_cursor)
+
+    async def get_many(
+        self, film_ids: t.List[str]
+    ) -> t.Tuple[t.List[Film], t.List[str]]:
+        by_id = {f.id: f for f in self._films}
+        ids = list(dict.fromkeys(film_ids))
+        films = [by_id[x] for x in ids if x in by_id]
+        missing = [x for x in ids if x not in by_id]
+        return films, missing
+
     async def list_films(
         self,
         sort: t.Optional[str],
         page_number: int,
         page_size: int,
         genre: t.Optional[str] = None,
-    ) -> t.List[FilmListItem]:
+        cursor: t.Optional[str] = None,
+        pit: bool = False,
+    ) -> FilmPage:
         items = self._films
 
         # фильтр по жанру
@@ -97,24 +200,18 @@ class InMemoryFilmService:
 
         key_fn = key_fn_desc if order == "desc" else key_fn_asc
         items = sorted(items, key=key_fn)
+        self._matched = items
 
-        # пагинация
-        start = (page_number - 1) * page_size
-        end = start + page_size
-        items = items[start:end]
-
-        # возвращаем то, что ожидает API: FilmListItem
-        return [
-            FilmListItem(uuid=f.id, title=f.title, imdb_rating=f.imdb_rating)
-            for f in items
-        ]
+        return self._page(items, page_number, page_size, cursor, f"list:{sort}:{genre}")
 
     async def search_films(
         self,
         query_str: str,
         page_number: int,
         page_size: int,
-    ) -> t.List[FilmListItem]:
+        cursor: t.Optional[str] = None,
+        pit: bool = False,
+    ) -> FilmPage:
         q = (query_str or "").lower()
 
         def match(f: Film):
@@ -126,15 +223,34 @@ class InMemoryFilmService:
         items = sorted(
             items, key=lambda f: (f.imdb_rating is None, -(f.imdb_rating or 0))
         )
+        self._matched = items
 
-        start = (page_number - 1) * page_size
+        return self._page(items, page_number, page_size, cursor, f"search:{q}")
+
+    @staticmethod
+    def _page(
+        items: t.List[Film],
+        page_number: int,
+        page_size: int,
+        cursor: t.Optional[str],
+        scope: str,
+    ) -> FilmPage:
+        # пагинация: курсор здесь хранит просто смещение
+        if cursor:
+            (start,), _ = decode_cursor(cursor, scope)
+        else:
+            start = (page_number - 1) * page_size
         end = start + page_size
-        items = items[start:end]
+        chunk = items[start:end]
 
-        return [
-            FilmListItem(uuid=f.id, title=f.title, imdb_rating=f.imdb_rating)
-            for f in items
-        ]
+        # возвращаем то, что ожидает API: FilmListItem
+        return FilmPage(
+            items=[
+                FilmListItem(uuid=f.id, title=f.title, imdb_rating=f.imdb_rating)
+                for f in chunk
+            ],
+            next_cursor=encode_cursor([end], scope) if end < len(items) else None,
+        )
 
 
 # ---------- ПОДМЕНА ЗАВИСИМОСТЕЙ ----------
@@ -146,6 +262,11 @@ def override_service(sample_movies):
     # подменяем обе ссылки на зависимость (и с префиксом src, и без него)
     app.dependency_overrides[get_film_service_src] = factory
     app.dependency_overrides[get_film_service_pkg] = factory
+
+    # индекс подсказок строится из тех же фильмов, без ES
+    suggest_service = SuggestService(elastic=None, index="movies")
+    suggest_service.index = SuggestIndex(sample_movies)
+    app.dependency_overrides[get_suggest_service] = lambda: suggest_service
     yield
     app.dependency_overrides.clear()
 
@@ -155,3 +276,164 @@ def override_service(sample_movies):
 def client():
     with TestClient(app) as c:
         yield c
+
+
+# ---------- ФЕЙКИ REDIS И ES ДЛЯ НАСТОЯЩЕГО FilmService ----------
+class FakePipeline:
+    def __init__(self, redis: "FakeRedis"):
+        self.redis = redis
+        self.commands: t.List[t.Tuple[str, bytes, t.Optional[int]]] = []
+
+    async def __aenter__(self) -> "FakePipeline":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        pass
+
+    def set(self, key: str, value: bytes, ttl: t.Optional[int] = None) -> None:
+        self.commands.append((key, value, ttl))
+
+    async def execute(self) -> t.List[bool]:
+        for key, value, ttl in self.commands:
+            await self.redis.set(key, value, ttl)
+        return [True] * len(self.commands)
+
+
+class FakeRedis:
+    """Строки с TTL, MGET, pipeline и fill-лок, который всегда свободен."""
+
+    def __init__(self):
+        self.data: t.Dict[str, bytes] = {}
+        self.ttls: t.Dict[str, t.Optional[int]] = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    async def set(self, key, value, ttl=None, **lock):
+        if lock:
+            # SET NX PX — fill-лок
+            return True
+        self.data[key] = value
+        self.ttls[key] = ttl
+        return True
+
+    async def eval(self, *args):
+        return 1
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+# документ по умолчанию: хватает и для списков, и для карточки
+FAKE_DOC = {"id": "a", "title": "Alpha", "imdb_rating": 9.0, "description": "Long text"}
+
+
+class FakeElastic:
+    """ES для FilmService: документы уже в порядке сортировки, вызовы — в `calls`.
+
+    Понимает from_/size, search_after (последнее sort-значение — id), PIT и
+    `_source`-список; `delay`, `timed_out`, `total` и `aggregations`
+    настраиваются атрибутами.
+    """
+
+    def __init__(self, docs: t.Optional[t.List[dict]] = None):
+        self.docs = docs if docs is not None else [dict(FAKE_DOC)]
+        self.calls: t.List[t.Tuple[str, dict]] = []
+        self.delay = 0.0
+        self.timed_out = False
+        self.total: t.Optional[dict] = None
+        self.aggregations: t.Optional[dict] = None
+        # request_timeout каждого options(): остаток дедлайна запроса
+        self.timeouts: t.List[t.Optional[float]] = []
+        self.open_pits: t.Set[str] = set()
+        self._pits = 0
+
+    @property
+    def searches(self) -> t.List[dict]:
+        return [kwargs for method, kwargs in self.calls if method == "search"]
+
+    def options(self, **options) -> "FakeElastic":
+        self.timeouts.append(options.get("request_timeout"))
+        return self
+
+    async def _call(self, method: str, kwargs: dict) -> None:
+        self.calls.append((method, kwargs))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+    async def search(self, **search):
+        await self._call("search", search)
+        docs = self.docs
+        if search.get("search_after"):
+            ids = [doc["id"] for doc in docs]
+            docs = docs[ids.index(search["search_after"][-1]) + 1 :]
+        start = search.get("from_", 0)
+        docs = docs[start : start + search.get("size", 10)]
+        fields = search.get("_source")
+        hits = [
+            {
+                "_id": doc["id"],
+                "_source": {
+                    k: v
+                    for k, v in doc.items()
+                    if not isinstance(fields, list) or k in fields
+                },
+                "sort": [doc.get("imdb_rating"), doc["id"]],
+            }
+            for doc in docs
+        ]
+        resp: t.Dict[str, t.Any] = {"timed_out": self.timed_out, "hits": {"hits": hits}}
+        if self.total is not None:
+            resp["hits"]["total"] = self.total
+        if self.aggregations is not None:
+            resp["aggregations"] = self.aggregations
+        if "pit" in search:
+            resp["pit_id"] = search["pit"]["id"]
+        return resp
+
+    async def get(self, index, id):
+        await self._call("get", {"index": index, "id": id})
+        for doc in self.docs:
+            if doc["id"] == id:
+                return {"_id": id, "found": True, "_source": dict(doc)}
+        meta = ApiResponseMeta(404, "1.1", HttpHeaders(), 0.0, None)
+        raise NotFoundError("not found", meta, {"found": False})
+
+    async def mget(self, index, ids):
+        await self._call("mget", {"index": index, "ids": ids})
+        by_id = {doc["id"]: doc for doc in self.docs}
+        return {
+            "docs": [
+                (
+                    {"_id": x, "found": True, "_source": dict(by_id[x])}
+                    if x in by_id
+                    else {"_id": x, "found": False}
+                )
+                for x in ids
+            ]
+        }
+
+    async def open_point_in_time(self, index, keep_alive):
+        await self._call("open_pit", {"index": index, "keep_alive": keep_alive})
+        self._pits += 1
+        pit_id = f"pit-{self._pits}"
+        self.open_pits.add(pit_id)
+        return {"id": pit_id}
+
+    async def close_point_in_time(self, id):
+        await self._call("close_pit", {"id": id})
+        self.open_pits.discard(id)
+        return {"succeeded": True}
+
+
+@pytest.fixture()
+def fake_redis() -> FakeRedis:
+    return FakeRedis()
+
+
+@pytest.fixture()
+def fake_es() -> FakeElastic:
+    return FakeElastic()
@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import pytest
+import redis.exceptions as redis_exc
+from elastic_transport import NodeConfig
+from prometheus_client import REGISTRY
+
+from db import elastic
+from db.balancer import LatencyBalancer
+from db.redis import ReplicaReader
+
+
+def test_balancer_prefers_faster_node_and_explores_new_ones():
+    balancer = LatencyBalancer("test")
+    balancer.observe("slow", 0.5)
+    balancer.observe("fast", 0.01)
+    assert {balancer.choose(["slow", "fast"]) for _ in range(20)} == {"fast"}
+    # о новом узле ничего не известно — пробуем его первым
+    assert balancer.choose(["fast", "new"]) == "new"
+
+
+def test_balancer_peak_and_decay():
+    balancer = LatencyBalancer("test", alpha=0.5, decay=0.05)
+    balancer.observe("a", 0.1)
+    balancer.observe("a", 1.0)
+    assert balancer.score("a") == pytest.approx(1.0, rel=0.01)
+    balancer.observe("a", 0.0)
+    assert balancer.score("a") < 0.6
+    # без замеров оценка затухает: тормозивший узел снова получит запрос
+    balancer.observe("b", 5.0)
+    time.sleep(0.3)
+    assert balancer.score("b") < 0.05
+
+
+def test_balancer_penalizes_errors_and_counts_inflight():
+    balancer = LatencyBalancer("test", error_penalty=2.0)
+    with pytest.raises(RuntimeError):
+        with balancer.track("a"):
+            assert balancer.inflight("a") == 1
+            raise RuntimeError
+    assert balancer.inflight("a") == 0
+    assert balancer.score("a") == pytest.approx(2.0, rel=0.01)
+
+
+def test_balancer_ignores_cancelled_requests():
+    balancer = LatencyBalancer("cancel-test", error_penalty=2.0)
+
+    async def stuck():
+        with balancer.track("a"):
+            await asyncio.sleep(1)
+
+    async def run():
+        task = asyncio.create_task(stuck())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert balancer.inflight("a") == 0
+    # ни замера, ни штрафа: узел по-прежнему новый
+    assert balancer.score("a") == 0.0
+    labels = {"backend": "cancel-test", "node": "a"}
+    assert (
+        REGISTRY.get_sample_value(
+            "backend_node_requests_total", {**labels, "result": "cancelled"}
+        )
+        == 1
+    )
+    assert (
+        REGISTRY.get_sample_value(
+            "backend_node_requests_total", {**labels, "result": "error"}
+        )
+        is None
+    )
+
+
+class FakeClient:
+    def __init__(self, host, fail=False):
+        self.connection_pool = type(
+            "Pool", (), {"connection_kwargs": {"host": host, "port": 6379}}
+        )()
+        self.fail = fail
+        self.calls = 0
+
+    async def get(self, key):
+        self.calls += 1
+        if self.fail:
+            raise redis_exc.ConnectionError("down")
+        return self.connection_pool.connection_kwargs["host"].encode()
+
+
+def test_replica_reader_falls_back_to_primary():
+    primary = FakeClient("primary")
+    replica = FakeClient("replica", fail=True)
+    reader = ReplicaReader(primary, [replica], LatencyBalancer("test"))
+    assert asyncio.run(reader.get("k")) == b"primary"
+    assert replica.calls == 1
+
+    healthy = ReplicaReader(primary, [FakeClient("r2")], LatencyBalancer("test"))
+    assert asyncio.run(healthy.get("k")) == b"r2"
+
+
+def test_latency_selector_picks_faster_es_node(monkeypatch):
+    balancer = LatencyBalancer("es")
+    monkeypatch.setattr(elastic, "balancer", balancer)
+    nodes = [
+        elastic.TrackedNode(NodeConfig("http", host, 9200)) for host in ("es1", "es2")
+    ]
+    balancer.observe("es1:9200", 0.2)
+    balancer.observe("es2:9200", 0.02)
+    selector = elastic.LatencySelector(nodes)
+    assert {selector.select(nodes).config.host for _ in range(10)} == {"es2"}
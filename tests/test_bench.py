@@ -0,0 +1,28 @@
+import os
+import sys
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "scripts")
+sys.path.insert(0, SCRIPTS)
+
+import bench  # noqa: E402
+
+
+def _report(requests, errors, rps=100.0, p=10.0):
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": rps,
+        "latency_ms": {"p50": p, "p95": p, "p99": p},
+    }
+
+
+def test_error_rate_rise_is_a_regression():
+    clean = _report(1000, 0)
+    assert bench.compare(_report(1000, 0), clean, 0.15) == []
+    # быстрые отказы не прячутся за хорошей латентностью
+    problems = bench.compare(_report(1000, 5, rps=200.0, p=1.0), clean, 0.15)
+    assert problems == ["error rate 0.50% > baseline 0.00%"]
+
+    noisy = _report(1000, 10)
+    assert bench.compare(_report(1000, 11), noisy, 0.15) == []
+    assert bench.compare(_report(1000, 20), noisy, 0.15)
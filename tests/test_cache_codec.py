@@ -0,0 +1,58 @@
+import orjson
+import pytest
+
+from services.cache_codec import COMPRESS_NONE, PAYLOAD_COLUMNAR, CacheCodec
+from services.cache_entry import ENTRY_V2, CacheEntry
+
+
+def _page(rows: int) -> bytes:
+    return orjson.dumps(
+        [
+            {
+                "uuid": f"00000000-0000-0000-0000-{n:012d}",
+                "title": f"Film number {n}",
+                "imdb_rating": None if n % 10 == 0 else round(n % 97 / 10, 1),
+            }
+            for n in range(rows)
+        ]
+    )
+
+
+@pytest.mark.parametrize("payload", ["raw", "columnar", "msgpack"])
+@pytest.mark.parametrize("compression", ["none", "zlib", "zstd", "lz4"])
+def test_codec_roundtrip_keeps_exact_body(payload, compression):
+    codec = CacheCodec(payload=payload, compression=compression, min_size=64)
+    for body in (_page(1000), _page(1), b"[]", b'{"uuid":"1","genre":null}'):
+        entry = CacheEntry(payload=body, soft_expires_at=10.0, next_cursor="c")
+        decoded = CacheEntry.decode(entry.encode(codec), legacy=False)
+        assert decoded == entry
+        assert decoded.etag == entry.etag
+
+
+def test_codec_shrinks_large_pages():
+    body = _page(1000)
+    data = CacheEntry(payload=body).encode(CacheCodec("columnar", "zlib"))
+    assert data[:1] == ENTRY_V2
+    assert len(data) * 4 < len(body)
+
+
+def test_codec_small_values_are_not_compressed():
+    codec = CacheCodec("columnar", "zlib", min_size=1024)
+    kind, compression, _ = codec.pack(_page(2))
+    assert (kind, compression) == (PAYLOAD_COLUMNAR, COMPRESS_NONE)
+
+
+def test_unknown_format_is_a_miss_and_v1_still_reads():
+    data = bytearray(CacheEntry(payload=_page(50)).encode(CacheCodec("raw", "zlib")))
+    data[2] = 99  # сжатие, которого этот воркер не знает
+    assert CacheEntry.decode(bytes(data)) is None
+
+    v1 = CacheEntry(payload=b"[]", soft_expires_at=5.0)
+    assert CacheEntry.decode(v1.encode()) == v1
+
+
+def test_codec_rejects_unknown_names():
+    with pytest.raises(ValueError):
+        CacheCodec(payload="xml")
+    with pytest.raises(ValueError):
+        CacheCodec(compression="brotli")
@@ -0,0 +1,30 @@
+from services.cache_entry import CacheEntry
+
+
+def test_cache_entry_roundtrip():
+    entry = CacheEntry(payload=b'[{"uuid":"1"}]', soft_expires_at=100.0, delta=0.2)
+    decoded = CacheEntry.decode(entry.encode())
+    assert decoded == entry
+
+
+def test_cache_entry_legacy_json_is_stale():
+    entry = CacheEntry.decode(b'[{"uuid":"1","title":"x","imdb_rating":null}]')
+    assert entry.payload.startswith(b"[")
+    assert entry.is_stale(now=0.0)
+
+
+def test_cache_entry_unknown_format_is_a_miss():
+    # битое значение или формат из будущей версии клиенту не отдаём
+    assert CacheEntry.decode(b"\x07" + b'{"s":1}') is None
+    assert CacheEntry.decode(b"garbage") is None
+    assert CacheEntry.decode(b'{"uuid":"1"}').payload == b'{"uuid":"1"}'
+
+
+def test_cache_entry_xfetch():
+    entry = CacheEntry(payload=b"[]", soft_expires_at=1000.0, delta=0.1)
+    # после мягкого истечения — обновляем всегда
+    assert entry.should_refresh(beta=1.0, now=1000.0)
+    # задолго до истечения дешёвый пересчёт практически не запускается
+    assert not any(entry.should_refresh(beta=1.0, now=900.0) for _ in range(100))
+    # beta=0 отключает ранний пересчёт
+    assert not entry.should_refresh(beta=0.0, now=999.99)
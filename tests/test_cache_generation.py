@@ -0,0 +1,46 @@
+import asyncio
+
+from services.cache_generation import CacheGeneration
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.gets = 0
+
+    async def get(self, key):
+        self.gets += 1
+        return self.data.get(key)
+
+    async def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+
+def test_generation_is_cached_between_refreshes():
+    redis = FakeRedis()
+    generation = CacheGeneration(redis, key="films:generation", refresh_interval=60)
+
+    async def run():
+        first = [await generation.prefix() for _ in range(5)]
+        # другой процесс (загрузчик) поднял поколение — воркер пока верит своей копии
+        redis.data["films:generation"] = 3
+        return first, await generation.current()
+
+    first, current = asyncio.run(run())
+
+    assert first == ["v0:"] * 5
+    assert current == 0
+    assert redis.gets == 1
+
+
+def test_generation_bump_and_refresh():
+    redis = FakeRedis()
+    generation = CacheGeneration(redis, key="films:generation", refresh_interval=0)
+
+    async def run():
+        bumped = await generation.bump()
+        redis.data["films:generation"] = 7
+        return bumped, await generation.prefix()
+
+    assert asyncio.run(run()) == (1, "v7:")
@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+import pytest
+from elastic_transport import ConnectionError as EsConnectionError
+from fastapi import HTTPException
+from prometheus_client import REGISTRY
+
+from services.cache_entry import CacheEntry
+from services.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+)
+from services.film import FilmService
+from services.local_cache import LocalCache
+
+
+async def _ok():
+    return "ok"
+
+
+async def _fail():
+    raise EsConnectionError("connection refused")
+
+
+def test_breaker_opens_on_errors_and_closes_after_probes():
+    breaker = CircuitBreaker(
+        window=4, min_calls=4, failure_ratio=0.5, open_seconds=0.05, half_open_calls=2
+    )
+
+    async def run():
+        for _ in range(2):
+            assert await breaker.call(_ok) == "ok"
+        for _ in range(2):
+            with pytest.raises(EsConnectionError):
+                await breaker.call(_fail)
+        assert breaker.state == OPEN
+        # пока разомкнут — вызов даже не начинается
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(_ok)
+
+        await asyncio.sleep(0.06)
+        assert await breaker.call(_ok) == "ok"
+        assert breaker.state == HALF_OPEN
+        assert await breaker.call(_ok) == "ok"
+        assert breaker.state == CLOSED
+
+    asyncio.run(run())
+
+
+def test_breaker_reopens_when_probe_fails():
+    breaker = CircuitBreaker(window=2, min_calls=2, open_seconds=0.0)
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(EsConnectionError):
+                await breaker.call(_fail)
+        assert breaker.state == OPEN
+        with pytest.raises(EsConnectionError):
+            await breaker.call(_fail)
+        assert breaker.state == OPEN
+        assert breaker.opened == 2
+
+    asyncio.run(run())
+
+
+class DownElastic:
+    async def get(self, **kwargs):
+        raise EsConnectionError("connection refused")
+
+
+def test_film_detail_falls_back_to_stale_copy():
+    cache = LocalCache(max_items=10, max_bytes=1 << 20, ttl=60)
+    stale = CacheEntry(payload=b'{"uuid":"1"}', soft_expires_at=time.time() - 3600)
+    cache.set("1", stale, len(stale.payload))
+    service = FilmService(None, DownElastic(), local_cache=cache)
+
+    entry = asyncio.run(service.get_film_raw("1"))
+    assert entry.payload == stale.payload
+    assert entry.degraded and not entry.cacheable
+
+    # копии нет — честный 503
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(service.get_film_raw("2"))
+    assert exc.value.status_code == 503
+
+
+def test_breaker_state_and_transitions_are_exported():
+    breaker = CircuitBreaker(
+        name="metrics-test", window=2, min_calls=2, open_seconds=60
+    )
+
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, {"breaker": "metrics-test", **labels})
+
+    assert sample("circuit_breaker_state", state=CLOSED) == 1
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(EsConnectionError):
+                await breaker.call(_fail)
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(_ok)
+
+    asyncio.run(run())
+    assert sample("circuit_breaker_state", state=OPEN) == 1
+    assert sample("circuit_breaker_state", state=CLOSED) == 0
+    assert sample("circuit_breaker_transitions_total", state=OPEN) == 1
+    assert sample("circuit_breaker_rejected_total") == 1
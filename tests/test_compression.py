@@ -0,0 +1,117 @@
+import asyncio
+import gzip
+
+import zstandard
+from fastapi import FastAPI
+from fastapi.responses import Response, StreamingResponse
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from api.v1.films import _cached_response
+from core.compression import CompressionMiddleware, negotiate
+from services import local_cache
+from services.cache_entry import CacheEntry
+from services.local_cache import LocalCache
+
+BODY = b'[{"uuid":"1","title":"Star"}' + b',{"uuid":"1","title":"Star"}' * 100 + b"]"
+
+
+def test_negotiate_respects_q_and_server_order():
+    encodings = ("zstd", "br", "gzip")
+    assert negotiate("gzip, zstd", encodings) == "zstd"
+    assert negotiate("gzip;q=1, zstd;q=0.5", encodings) == "gzip"
+    assert negotiate("zstd;q=0, *", encodings) == "br"
+    assert negotiate("identity", encodings) is None
+    assert negotiate(None, encodings) is None
+
+
+def _app():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, encodings=("zstd", "gzip"))
+
+    @app.get("/big")
+    async def big():
+        return Response(BODY, media_type="application/json", headers={"ETag": '"x"'})
+
+    @app.get("/small")
+    async def small():
+        return Response(b"[]", media_type="application/json")
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            yield BODY
+            yield BODY
+
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    return TestClient(app)
+
+
+def test_middleware_compresses_only_large_buffered_bodies():
+    client = _app()
+    headers = {"Accept-Encoding": "gzip"}
+
+    big = client.get("/big", headers=headers)
+    assert big.headers["content-encoding"] == "gzip"
+    assert big.headers["etag"] == 'W/"x"'
+    assert "Accept-Encoding" in big.headers["vary"]
+    assert big.content == BODY
+
+    assert "content-encoding" not in client.get("/small", headers=headers).headers
+    assert "content-encoding" not in client.get("/stream", headers=headers).headers
+    plain = client.get("/big", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+
+
+def test_cached_body_is_compressed_once(monkeypatch):
+    cache = LocalCache(max_items=10, max_bytes=len(BODY), ttl=60)
+    monkeypatch.setattr(local_cache, "compressed_cache", cache)
+    entry = CacheEntry(payload=BODY)
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(b"accept-encoding", b"zstd, gzip")],
+    }
+
+    async def run():
+        first = await _cached_response(entry, Request(scope), "public")
+        second = await _cached_response(entry, Request(scope), "public")
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first.headers["content-encoding"] == "zstd"
+    assert first.body is second.body is cache.get(f"zstd:{entry.etag}")
+    assert zstandard.ZstdDecompressor().decompress(first.body) == BODY
+    # сжатые байты считаются в лимите своего LRU
+    assert cache.stats()["bytes"] == len(first.body)
+    assert cache.get(f"gzip:{entry.etag}") is None
+
+
+def test_compressed_body_follows_the_payload(monkeypatch):
+    cache = LocalCache(max_items=10, max_bytes=100_000, ttl=60)
+    monkeypatch.setattr(local_cache, "compressed_cache", cache)
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(b"accept-encoding", b"gzip")],
+    }
+    plain = CacheEntry(payload=BODY)
+    wrapped = CacheEntry(payload=BODY)
+    etag = wrapped.etag
+    # те же строки в другом теле: ETag и сжатое тело — свои
+    wrapped.payload = b'{"items":' + BODY + b"}"
+
+    async def run():
+        first = await _cached_response(plain, Request(scope), "public")
+        second = await _cached_response(wrapped, Request(scope), "public")
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert wrapped.etag != etag == plain.etag
+    assert gzip.decompress(first.body) == BODY
+    assert gzip.decompress(second.body) == wrapped.payload
@@ -0,0 +1,155 @@
+import asyncio
+import time
+
+import pytest
+from elastic_transport import ConnectionError as EsConnectionError, NodeConfig
+
+from core import deadline
+from core.deadline import DeadlineExceeded
+from core.settings import settings
+from db import elastic
+from db.balancer import LatencyBalancer
+from services.cache_entry import CacheEntry
+from services.film import FilmService, get_film_service as get_film_service_pkg
+from services.local_cache import LocalCache
+from src.main import app
+from src.services.film import get_film_service as get_film_service_src
+
+
+def test_budget_nests_without_extending_outer_deadline():
+    assert deadline.remaining() is None
+    with deadline.budget(0.05):
+        with deadline.budget(10):
+            assert deadline.remaining() <= 0.05
+        with deadline.budget(None):
+            # фоновая задача живёт без дедлайна
+            assert deadline.remaining() is None
+        time.sleep(0.06)
+        assert deadline.expired()
+        with pytest.raises(DeadlineExceeded):
+            deadline.remaining()
+    assert deadline.remaining() is None
+
+
+def test_bounded_raises_when_budget_runs_out():
+    async def run():
+        with deadline.budget(0.02):
+            await deadline.bounded(lambda: asyncio.sleep(1))
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(run())
+
+
+def test_slow_es_gives_deadline_or_stale_copy(fake_es):
+    fake_es.delay = 1.0
+    local = LocalCache(max_items=10, max_bytes=10_000, ttl=60)
+    service = FilmService(None, fake_es, local_cache=local)
+
+    async def detail():
+        with deadline.budget(0.05):
+            return await service.get_film_raw("f1")
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(detail())
+    assert time.monotonic() - started < 0.5
+    # таймаут клиента ES — остаток бюджета
+    assert 0 < fake_es.timeouts[0] <= 0.05
+
+    # есть устаревшая копия — отдаём её вместо 504
+    local.set("f1", CacheEntry(payload=b'{"uuid":"f1"}'), 13)
+    entry = asyncio.run(detail())
+    assert entry.degraded and entry.payload == b'{"uuid":"f1"}'
+
+
+def test_partial_search_is_flagged_and_not_cached(fake_redis, fake_es):
+    fake_es.timed_out = True
+    service = FilmService(fake_redis, fake_es)
+
+    async def run():
+        with deadline.budget(1.0):
+            return await service.search_films_raw("alpha", 1, 10)
+
+    entry = asyncio.run(run())
+    assert entry.partial and not entry.cacheable
+    assert fake_redis.data == {}
+    timeout = fake_es.searches[0]["timeout"]
+    assert timeout.endswith("ms") and 0 < int(timeout[:-2]) <= 800
+
+
+def _hedger(delay):
+    hedger = elastic.Hedger(min_samples=1, min_delay=0.0, max_ratio=1.0)
+    hedger.observe("get", delay)
+    return hedger
+
+
+def test_hedge_goes_to_another_node_and_first_answer_wins(monkeypatch):
+    balancer = LatencyBalancer("es")
+    monkeypatch.setattr(elastic, "balancer", balancer)
+    nodes = [elastic.TrackedNode(NodeConfig("http", h, 9200)) for h in ("a", "b")]
+    selector = elastic.LatencySelector(nodes)
+    picked = []
+
+    async def attempt():
+        node = selector.select(nodes).config.host
+        picked.append(node)
+        # первая попытка "застряла" на медленном шарде
+        await asyncio.sleep(1.0 if len(picked) == 1 else 0.01)
+        return node
+
+    started = time.monotonic()
+    winner = asyncio.run(_hedger(0.02).call("get", attempt))
+    assert time.monotonic() - started < 0.5
+    assert sorted(picked) == ["a", "b"]
+    assert winner == picked[1]
+
+
+def test_hedge_is_throttled_and_waits_out_network_errors():
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        if len(calls) == 1:
+            await asyncio.sleep(0.05)
+            raise EsConnectionError("node down")
+        await asyncio.sleep(0.1)
+        return "ok"
+
+    # сбой первой попытки не побеждает: ждём ответ хеджа
+    assert asyncio.run(_hedger(0.01).call("get", attempt)) == "ok"
+
+    throttled = elastic.Hedger(min_samples=1, min_delay=0.0, max_ratio=0.0)
+    throttled.observe("get", 0.01)
+    calls.clear()
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "slow"
+
+    assert asyncio.run(throttled.call("get", slow)) == "slow"
+    assert len(calls) == 1
+
+
+def test_hedge_delay_is_kept_per_operation():
+    hedger = elastic.Hedger(min_samples=2, min_delay=0.0)
+    for seconds in (0.002, 0.003):
+        hedger.observe("get", seconds)
+    for seconds in (0.2, 0.3):
+        hedger.observe("search", seconds)
+    # медленный поиск не сдвигает порог хеджа для get
+    assert hedger.delay("get") == 0.002
+    assert hedger.delay("search") == 0.2
+    assert hedger.delay("mget") is None
+
+
+def test_deadline_exceeded_is_504(client, monkeypatch):
+    class Stuck:
+        async def get_film_raw(self, film_id, fields=None):
+            return await deadline.bounded(lambda: asyncio.sleep(1))
+
+    monkeypatch.setattr(settings, "DEADLINE_DETAIL", 0.02)
+    app.dependency_overrides[get_film_service_src] = Stuck
+    app.dependency_overrides[get_film_service_pkg] = Stuck
+    response = client.get("/api/v1/films/b31592e5-673d-46dc-a561-9446438aea0f")
+    assert response.status_code == 504
@@ -0,0 +1,80 @@
+import asyncio
+import gzip
+
+import orjson
+from starlette.requests import Request
+
+from api.v1.films import _cached_response
+from core.settings import settings
+from services import local_cache
+from services.cache_entry import CacheEntry
+from services.film import FilmService
+from services.local_cache import LocalCache
+
+
+def test_envelope_comes_from_the_same_search(fake_es):
+    fake_es.total = {"value": 10000, "relation": "gte"}
+    fake_es.aggregations = {"genres": {"buckets": [{"key": "g1", "doc_count": 7}]}}
+    service = FilmService(None, fake_es)
+
+    async def run():
+        envelope = await service.list_films_raw("title", 1, 1, envelope=True)
+        plain = await service.list_films_raw("title", 1, 1)
+        return envelope, plain
+
+    envelope, plain = asyncio.run(run())
+
+    assert orjson.loads(envelope.payload) == {
+        "items": [{"uuid": "a", "title": "Alpha", "imdb_rating": 9}],
+        "total": {"value": 10000, "relation": "gte"},
+        "genres": [{"uuid": "g1", "count": 7}],
+    }
+    with_envelope, bare = fake_es.searches
+    assert with_envelope["track_total_hits"] == 10000
+    assert with_envelope["aggs"]["genres"]["terms"]["field"] == "genre"
+    # голая страница не просит ES считать совпадения и агрегации
+    assert bare["track_total_hits"] is False
+    assert "aggs" not in bare
+    assert orjson.loads(plain.payload) == [
+        {"uuid": "a", "title": "Alpha", "imdb_rating": 9}
+    ]
+
+
+def test_empty_search_envelope(fake_es):
+    service = FilmService(None, fake_es)
+    entry = asyncio.run(service.search_films_raw("  ", 1, 10, envelope=True))
+    assert orjson.loads(entry.payload)["total"] == {"value": 0, "relation": "eq"}
+
+
+def test_envelope_has_its_own_etag_and_compressed_body(
+    fake_redis, fake_es, monkeypatch
+):
+    monkeypatch.setattr(
+        local_cache,
+        "compressed_cache",
+        LocalCache(max_items=10, max_bytes=100_000, ttl=60),
+    )
+    monkeypatch.setattr(settings, "COMPRESSION_MIN_BYTES", 1)
+    service = FilmService(fake_redis, fake_es)
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(b"accept-encoding", b"gzip")],
+    }
+
+    async def run():
+        plain = await service.list_films_raw("title", 1, 1)
+        envelope = await service.list_films_raw("title", 1, 1, envelope=True)
+        await _cached_response(plain, Request(scope), "public")
+        response = await _cached_response(envelope, Request(scope), "public")
+        return plain, envelope, response
+
+    plain, envelope, response = asyncio.run(run())
+
+    assert envelope.etag != plain.etag
+    assert envelope.etag == CacheEntry(payload=envelope.payload).etag
+    # в Redis уходит тот же ETag, что в ответе
+    stored = [CacheEntry.decode(raw) for raw in fake_redis.data.values()]
+    assert envelope.etag in {entry.etag for entry in stored}
+    assert "items" in orjson.loads(gzip.decompress(response.body))
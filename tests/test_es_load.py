@@ -0,0 +1,307 @@
+import asyncio
+import fnmatch
+import json
+
+import pytest
+from elastic_transport import ApiResponseMeta, HttpHeaders
+from elasticsearch import ApiError
+
+from scripts import es_load
+
+
+def _bad_request() -> ApiError:
+    meta = ApiResponseMeta(400, "1.1", HttpHeaders(), 0.0, None)
+    return ApiError("mapper_parsing_exception", meta, {})
+
+
+class Indices:
+    def __init__(self, existing=()):
+        self.existing = list(existing)
+        self.created = []
+        self.deleted = []
+        self.alias_actions = []
+        # индексы за alias
+        self.aliases = {}
+
+    async def create(self, index, **kwargs):
+        self.created.append(index)
+
+    async def get(self, index, **kwargs):
+        return {name: {} for name in self.existing}
+
+    async def delete(self, index):
+        self.deleted.append(index)
+
+    async def get_alias(self, name):
+        return self.aliases
+
+    async def exists(self, index):
+        return False
+
+    async def put_settings(self, **kwargs):
+        pass
+
+    async def refresh(self, index):
+        pass
+
+    async def update_aliases(self, actions):
+        self.alias_actions.append(actions)
+
+
+class BulkClient:
+    """_bulk, который неповторяемо падает на чанках с заданными номерами."""
+
+    def __init__(self, fail_on=(), existing=()):
+        self.fail_on = set(fail_on)
+        self.requests = 0
+        self.indices = Indices(existing)
+
+    async def bulk(self, index, operations, **kwargs):
+        number = self.requests
+        self.requests += 1
+        await asyncio.sleep(0)
+        if number in self.fail_on:
+            raise _bad_request()
+        return {"errors": False}
+
+
+def _items(count):
+    return [(b'{"index":{}}\n', b'{"id":"%d"}\n' % i) for i in range(count)]
+
+
+def test_failed_chunk_is_counted_not_lost(monkeypatch):
+    monkeypatch.setattr(es_load, "BULK_CHUNK_DOCS", 1)
+    client = BulkClient(fail_on={0})
+
+    stats = asyncio.run(es_load.bulk_load(client, "movies_1", _items(50)))
+
+    # первый чанк упал раньше, чем дочитан файл, — ошибка всё равно в отчёте
+    assert stats.failed_chunks == 1
+    assert stats.failed == 1
+    assert stats.indexed == 49
+    assert "mapper_parsing_exception" in stats.errors[0]["chunk"]
+
+
+def test_full_load_aborts_before_swap_and_manifest(tmp_path, monkeypatch):
+    monkeypatch.setattr(es_load, "BULK_CHUNK_DOCS", 1)
+    mapping = tmp_path / "mapping.json"
+    mapping.write_text(json.dumps({"mappings": {}}))
+    bulk = tmp_path / "bulk.ndjson"
+    bulk.write_text(
+        "".join(
+            '{"index": {"_id": "%d"}}\n{"id": "%d", "genre": []}\n' % (i, i)
+            for i in range(5)
+        )
+    )
+    manifest = tmp_path / "manifest.json"
+    client = BulkClient(fail_on={3})
+
+    with pytest.raises(RuntimeError, match="alias not switched"):
+        asyncio.run(es_load.load_full(client, str(mapping), str(bulk), str(manifest)))
+
+    assert client.indices.alias_actions == []
+    assert client.indices.deleted == []
+    assert not manifest.exists()
+
+
+def test_cleanup_drops_only_old_generations(monkeypatch):
+    monkeypatch.setattr(es_load, "ES_KEEP_INDICES", 1)
+    client = BulkClient(
+        existing=[
+            "movies_20240101000000",
+            "movies_20240102000000",
+            "movies_20240103000000",
+            "movies_archive",
+            "movies_20240101_backup",
+        ]
+    )
+
+    asyncio.run(es_load.drop_old_generations(client, keep="movies_20240103000000"))
+
+    # одно прошлое поколение — для отката; чужие индексы с префиксом живут
+    assert client.indices.deleted == ["movies_20240101000000"]
+
+
+class ViewsRedis:
+    """Redis загрузчика: построенные представления, запись команд пайплайна."""
+
+    def __init__(self):
+        self.ops = []
+        self.published = []
+
+    async def exists(self, key):
+        return 1
+
+    async def get(self, key):
+        return b"3"
+
+    async def publish(self, channel, message):
+        self.published.append(json.loads(message))
+
+    def pipeline(self, transaction=True):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return None
+
+    def __getattr__(self, name):
+        # hset/zadd/zrem/hdel/sadd пайплайна
+        return lambda *args: self.ops.append((name,) + args)
+
+    async def execute(self):
+        self.ops.append(("execute",))
+
+    async def close(self):
+        pass
+
+
+def test_no_purge_still_updates_rank_views(monkeypatch):
+    redis = ViewsRedis()
+    monkeypatch.setattr(es_load.Redis, "from_url", lambda url: redis)
+    doc = es_load.Doc("f1", b"", b'{"title": "T", "imdb_rating": 7.5}', ["g1"])
+    delta = es_load.Delta([doc], [], {})
+
+    asyncio.run(es_load.update_cache(delta, "unused.ndjson", purge=False))
+
+    assert ("zadd", "films:rank:all", {"f1": -7.5}) in redis.ops
+    # кеш API не тронут (ни SCAN, ни INCR поколения), а страницы
+    # представлений в L1 воркеров сброшены
+    assert {op[0] for op in redis.ops} == {"hset", "zadd", "sadd", "execute"}
+    assert redis.published == [{"o": "es_load", "k": [], "p": ["v3:films:rank:"]}]
+
+
+def _doc(doc_id, source, genres=()):
+    return es_load.Doc(doc_id, b"", source, list(genres))
+
+
+def test_diff_manifest_ignores_formatting():
+    known = {
+        "a": es_load.manifest_entry(_doc("a", b'{"id": "a", "title": "A"}')),
+        "b": es_load.manifest_entry(_doc("b", b'{"id": "b", "title": "B"}')),
+        "c": es_load.manifest_entry(_doc("c", b'{"id": "c"}')),
+    }
+    docs = [
+        # те же данные: другие пробелы и порядок ключей
+        _doc("a", b'{"title":"A",   "id":"a"}'),
+        _doc("b", b'{"id": "b", "title": "B2"}'),
+        _doc("d", b'{"id": "d"}'),
+    ]
+
+    changed, deleted, current = es_load.diff_manifest(docs, known)
+
+    assert [doc.id for doc in changed] == ["b", "d"]
+    assert deleted == ["c"]
+    assert sorted(current) == ["a", "b", "d"]
+
+
+def test_delta_genres_include_the_genres_a_film_left():
+    known = {
+        "a": {"h": "x", "g": ["drama", "comedy"]},
+        "gone": {"h": "y", "g": ["war"]},
+    }
+    delta = es_load.Delta(
+        [_doc("a", b'{"id": "a"}', ["drama", "horror"])], ["gone"], known
+    )
+
+    assert delta.ids == {"a", "gone"}
+    assert delta.genres == {"drama", "comedy", "horror", "war"}
+    assert delta.old_genres == {"a": ["drama", "comedy"]}
+
+
+class PurgeRedis:
+    def __init__(self, keys):
+        self.keys = set(keys)
+        self.unlinked = []
+        self.published = []
+
+    async def get(self, key):
+        return b"3"
+
+    async def scan_iter(self, match, count):
+        for key in sorted(self.keys):
+            if fnmatch.fnmatchcase(key, match):
+                yield key.encode()
+
+    async def unlink(self, *keys):
+        self.unlinked.extend(keys)
+
+    async def publish(self, channel, message):
+        self.published.append((channel, json.loads(message)))
+
+
+def test_purge_cache_selects_keys_of_current_generation():
+    redis = PurgeRedis(
+        [
+            "v3:films:list:page_number=1|page_size=50|sort=-imdb_rating",
+            "v3:films:list:genre=g1|page_number=1|page_size=50",
+            "v3:films:list:genre=g2|page_number=1|page_size=50",
+            "v3:films:search:0123456789abcdef",
+            "v3:f1",
+            "v2:films:list:page_number=1|page_size=50",
+            "v2:films:search:fedcba9876543210",
+        ]
+    )
+
+    purged = asyncio.run(es_load.purge_cache(redis, {"f1", "f2"}, {"g1"}))
+
+    expected = [
+        "v3:f1",
+        "v3:f2",
+        # общие списки — всегда, жанровые — только затронутых жанров
+        "v3:films:list:genre=g1|page_number=1|page_size=50",
+        "v3:films:list:page_number=1|page_size=50|sort=-imdb_rating",
+        # поиск — весь
+        "v3:films:search:0123456789abcdef",
+    ]
+    assert purged == len(expected)
+    assert sorted(redis.unlinked) == expected
+    assert redis.published == [
+        (es_load.CACHE_INVALIDATION_CHANNEL, {"o": "es_load", "k": redis.unlinked})
+    ]
+
+
+def _incremental_files(tmp_path, manifest_index):
+    mapping = tmp_path / "mapping.json"
+    mapping.write_text(json.dumps({"mappings": {}}))
+    bulk = tmp_path / "bulk.ndjson"
+    bulk.write_text(
+        '{"index": {"_id": "a"}}\n{"id": "a", "genre": ["g1"]}\n'
+        '{"index": {"_id": "b"}}\n{"id": "b", "genre": []}\n'
+    )
+    manifest = tmp_path / "manifest.json"
+    doc = next(es_load.read_bulk_file(str(bulk)))
+    es_load.save_manifest(
+        str(manifest), manifest_index, {"a": es_load.manifest_entry(doc)}
+    )
+    return str(mapping), str(bulk), str(manifest)
+
+
+def test_incremental_falls_back_to_full_when_alias_moved(tmp_path, monkeypatch):
+    files = _incremental_files(tmp_path, "movies_20240101000000")
+    client = BulkClient()
+    client.indices.aliases = {"movies_20240102000000": {}}
+    full = []
+
+    async def load_full(client, *args):
+        full.append(args)
+
+    monkeypatch.setattr(es_load, "load_full", load_full)
+
+    assert asyncio.run(es_load.load_incremental(client, *files)) is None
+    assert full == [files]
+    assert client.requests == 0
+
+
+def test_incremental_sends_only_the_delta(tmp_path):
+    files = _incremental_files(tmp_path, "movies_20240101000000")
+    client = BulkClient()
+    client.indices.aliases = {"movies_20240101000000": {}}
+
+    delta = asyncio.run(es_load.load_incremental(client, *files))
+
+    assert [doc.id for doc in delta.changed] == ["b"]
+    assert client.requests == 1
+    assert sorted(es_load.load_manifest(files[2])["docs"]) == ["a", "b"]
@@ -0,0 +1,44 @@
+import asyncio
+
+import orjson
+
+from services.cache_entry import CacheEntry
+from services.film import FilmService
+
+
+def test_list_fields_narrow_source_and_cache_key(fake_redis, fake_es):
+    service = FilmService(fake_redis, fake_es)
+
+    async def run():
+        narrow = await service.list_films_raw("title", 1, 1, fields=["uuid"])
+        await service.list_films_raw("title", 1, 1)
+        return narrow
+
+    narrow = asyncio.run(run())
+
+    assert orjson.loads(narrow.payload) == [{"uuid": "a"}]
+    assert fake_es.searches[0]["_source"] == ["id"]
+    assert fake_es.searches[1]["_source"] == ["id", "title", "imdb_rating"]
+    assert sorted(key.split("|")[0] for key in fake_redis.data) == [
+        "films:list:fields=uuid",
+        "films:list:page_number=1",
+    ]
+
+
+def test_detail_fields_are_projected_from_cached_card(fake_redis, fake_es):
+    service = FilmService(fake_redis, fake_es)
+
+    async def run():
+        short = await service.get_film_raw("a", fields=["uuid", "title"])
+        full = await service.get_film_raw("a")
+        return short, full
+
+    short, full = asyncio.run(run())
+
+    assert orjson.loads(short.payload) == {"uuid": "a", "title": "Alpha"}
+    assert orjson.loads(full.payload)["description"] == "Long text"
+    assert short.etag != full.etag
+    assert short.etag == CacheEntry(payload=short.payload).etag
+    # одна полная карточка в кеше и один поход в ES на оба ответа
+    assert list(fake_redis.data) == ["a"]
+    assert len(fake_es.calls) == 1
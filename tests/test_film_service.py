@@ -0,0 +1,147 @@
+import asyncio
+from typing import List
+
+import orjson
+from pydantic import TypeAdapter
+
+from core.pagination import decode_cursor
+from core.settings import settings
+from models.film import FilmDetail, FilmListItem
+from services.film import FilmService, _cache_key
+
+# метка запроса в курсоре списка по умолчанию
+SCOPE = _cache_key("films:list", {"sort": "-imdb_rating", "genre": None})
+# уже в порядке сортировки по умолчанию (-imdb_rating, id)
+DOCS = [
+    {"id": "a", "title": "Alpha", "imdb_rating": 9.0, "description": "A"},
+    {"id": "b", "title": "Beta", "imdb_rating": 8.0, "description": "B"},
+    {"id": "c", "title": "Gamma", "imdb_rating": 7.0, "description": "C"},
+]
+
+
+def test_batch_uses_one_mget_and_caches_cards(fake_redis, fake_es):
+    fake_es.docs = DOCS
+    service = FilmService(fake_redis, fake_es)
+
+    async def run():
+        first = await service.get_many_raw(["b", "x", "b", "a"])
+        second = await service.get_many_raw(["a", "c"])
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    body = orjson.loads(first.payload)
+    assert [item["uuid"] for item in body["items"]] == ["b", "a"]
+    assert body["missing"] == ["x"]
+    assert body["items"][0]["description"] == "B"
+    # повторы схлопнуты; закешированные карточки в ES не запрашиваются
+    assert [kwargs["ids"] for method, kwargs in fake_es.calls] == [
+        ["b", "x", "a"],
+        ["c"],
+    ]
+    assert [x["uuid"] for x in orjson.loads(second.payload)["items"]] == ["a", "c"]
+    assert sorted(fake_redis.data) == ["a", "b", "c"]
+
+
+def test_cursor_pages_use_search_after(fake_redis, fake_es):
+    fake_es.docs = DOCS
+    service = FilmService(fake_redis, fake_es)
+
+    async def run():
+        first = await service.list_films_raw("-imdb_rating", 1, 2)
+        second = await service.list_films_raw(
+            "-imdb_rating", 1, 2, cursor=first.next_cursor
+        )
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert decode_cursor(first.next_cursor, SCOPE) == ([8.0, "b"], None)
+    assert [x["uuid"] for x in orjson.loads(second.payload)] == ["c"]
+    # неполная страница — последняя
+    assert second.next_cursor is None
+    page, after = fake_es.searches
+    assert page["from_"] == 0 and "search_after" not in page
+    assert after["search_after"] == [8.0, "b"] and after["from_"] == 0
+    assert after["sort"][-1] == {"id": {"order": "asc"}}
+
+
+def test_pit_cursor_keeps_snapshot_and_closes_it(fake_redis, fake_es):
+    fake_es.docs = DOCS
+    service = FilmService(fake_redis, fake_es)
+
+    async def run():
+        first = await service.list_films_raw("-imdb_rating", 1, 2, pit=True)
+        second = await service.list_films_raw(
+            "-imdb_rating", 1, 2, cursor=first.next_cursor
+        )
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert decode_cursor(first.next_cursor, SCOPE) == ([8.0, "b"], "pit-1")
+    methods = [method for method, _ in fake_es.calls]
+    assert methods == ["open_pit", "search", "search", "close_pit"]
+    assert fake_es.calls[0][1]["keep_alive"] == settings.CURSOR_PIT_KEEP_ALIVE
+    for search in fake_es.searches:
+        # снапшот задаёт индекс сам
+        assert search["pit"] == {
+            "id": "pit-1",
+            "keep_alive": settings.CURSOR_PIT_KEEP_ALIVE,
+        }
+        assert "index" not in search
+    # последняя страница закрыла PIT; страницы снапшота не кешируются
+    assert not fake_es.open_pits
+    assert not first.cacheable and not second.cacheable
+    assert fake_redis.data == {}
+
+
+def test_raw_bodies_match_response_models(fake_redis, fake_es):
+    fake_es.docs = DOCS
+    service = FilmService(fake_redis, fake_es)
+
+    async def run():
+        page = await service.list_films_raw("-imdb_rating", 1, 3)
+        card = await service.get_film_raw("a")
+        cached = await service.get_film_raw("a")
+        return page, card, cached
+
+    page, card, cached = asyncio.run(run())
+
+    # байты тела — ровно то, что дала бы сериализация response_model
+    items = TypeAdapter(List[FilmListItem]).validate_json(page.payload)
+    assert orjson.loads(page.payload) == [item.model_dump() for item in items]
+    detail = FilmDetail.model_validate_json(card.payload)
+    assert orjson.loads(card.payload) == detail.model_dump()
+    # повторная карточка — те же байты из кеша, без второго get в ES
+    assert cached.payload == card.payload
+    assert [method for method, _ in fake_es.calls] == ["search", "get"]
+
+
+def test_export_streams_pit_slices_and_closes_snapshot(
+    fake_redis, fake_es, monkeypatch
+):
+    monkeypatch.setattr("services.film.EXPORT_SLICE_SIZE", 2)
+    fake_es.docs = DOCS
+    service = FilmService(fake_redis, fake_es)
+
+    async def run():
+        chunks = await service.export_films(fields=["id", "title"], genre="g1")
+        return [chunk async for chunk in chunks]
+
+    chunks = asyncio.run(run())
+
+    assert [len(chunk.splitlines()) for chunk in chunks] == [2, 1]
+    lines = b"".join(chunks).splitlines()
+    assert [orjson.loads(line) for line in lines] == [
+        {"id": "a", "title": "Alpha"},
+        {"id": "b", "title": "Beta"},
+        {"id": "c", "title": "Gamma"},
+    ]
+    first, second = fake_es.searches
+    assert first["pit"] == {"id": "pit-1", "keep_alive": settings.EXPORT_PIT_KEEP_ALIVE}
+    assert first["sort"] == [{"_shard_doc": "asc"}]
+    assert first["query"] == {"bool": {"filter": [{"terms": {"genre": ["g1"]}}]}}
+    assert second["search_after"] == [8.0, "b"]
+    assert fake_es.calls[0][1]["keep_alive"] == settings.EXPORT_PIT_KEEP_ALIVE
+    assert not fake_es.open_pits
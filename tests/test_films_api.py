@@ -1,5 +1,7 @@
 from http import HTTPStatus
 
+import orjson
+
 
 def test_film_detail_ok(client):
     film_id = "b31592e5-673d-46dc-a561-9446438aea0f"
@@ -11,6 +13,38 @@ def test_film_detail_ok(client):
     assert body["imdb_rating"] == 9.2
 
 
+def test_film_detail_etag_and_304(client):
+    url = "/api/v1/films/b31592e5-673d-46dc-a561-9446438aea0f"
+    resp = client.get(url)
+    etag = resp.headers["ETag"]
+    assert etag.startswith('"')
+    assert "max-age" in resp.headers["Cache-Control"]
+    assert resp.headers["Vary"] == "Accept-Encoding"
+
+    resp = client.get(url, headers={"If-None-Match": etag})
+    assert resp.status_code == HTTPStatus.NOT_MODIFIED
+    assert resp.content == b""
+    assert resp.headers["ETag"] == etag
+
+    resp = client.get(url, headers={"If-None-Match": '"stale", W/' + etag})
+    assert resp.status_code == HTTPStatus.NOT_MODIFIED
+
+    resp = client.get(url, headers={"If-None-Match": '"stale"'})
+    assert resp.status_code == HTTPStatus.OK
+
+
+def test_films_list_etag_depends_on_page(client):
+    first = client.get("/api/v1/films/?page_size=2&page_number=1")
+    second = client.get("/api/v1/films/?page_size=2&page_number=2")
+    assert first.headers["ETag"] != second.headers["ETag"]
+
+    resp = client.get(
+        "/api/v1/films/?page_size=2&page_number=1",
+        headers={"If-None-Match": first.headers["ETag"]},
+    )
+    assert resp.status_code == HTTPStatus.NOT_MODIFIED
+
+
 def test_film_detail_not_found(client):
     resp = client.get("/api/v1/films/00000000-0000-0000-0000-000000000000")
     assert resp.status_code == HTTPStatus.NOT_FOUND
@@ -51,6 +85,21 @@ def test_films_pagination(client):
     assert len(ids) == len(set(ids))
 
 
+def test_films_cursor_pagination(client):
+    resp = client.get("/api/v1/films?page_size=2")
+    ids = [x["uuid"] for x in resp.json()]
+    cursor = resp.headers["X-Next-Cursor"]
+
+    while cursor:
+        resp = client.get(f"/api/v1/films?page_size=2&cursor={cursor}")
+        assert resp.status_code == HTTPStatus.OK
+        ids += [x["uuid"] for x in resp.json()]
+        cursor = resp.headers.get("X-Next-Cursor")
+
+    assert len(ids) == 5
+    assert len(ids) == len(set(ids))
+
+
 def test_films_search(client):
     # найдём по слову "star" (есть в 3 фильмах)
     resp = client.get("/api/v1/films/search?query=star&page_size=10&page_number=1")
@@ -62,3 +111,110 @@ def test_films_search(client):
         "Wishes on a Falling Star",
         "Billion Star Hotel",
     ]
+
+
+def test_films_search_envelope(client):
+    resp = client.get("/api/v1/films/search?query=star&page_size=1&envelope=true")
+    assert resp.status_code == HTTPStatus.OK
+    body = resp.json()
+    assert [x["title"] for x in body["items"]] == ["Lunar: The Silver Star"]
+    assert body["total"] == {"value": 3, "relation": "eq"}
+    assert sum(g["count"] for g in body["genres"]) >= 3
+    # без envelope — прежний массив
+    plain = client.get("/api/v1/films/search?query=star&page_size=1")
+    assert plain.json() == body["items"]
+
+
+def test_fields_narrow_detail_list_and_batch(client):
+    film_id = "b31592e5-673d-46dc-a561-9446438aea0f"
+    detail = client.get(f"/api/v1/films/{film_id}?fields=title,uuid")
+    assert detail.json() == {"uuid": film_id, "title": "Lunar: The Silver Star"}
+
+    page = client.get("/api/v1/films?page_size=2&fields=uuid").json()
+    assert all(list(row) == ["uuid"] for row in page)
+
+    batch = client.post("/api/v1/films/batch?fields=title", json={"ids": [film_id]})
+    assert batch.json()["items"] == [{"title": "Lunar: The Silver Star"}]
+
+    bad = client.get("/api/v1/films/search?query=star&fields=description")
+    assert bad.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_films_batch_keeps_order_and_reports_missing(client):
+    unknown = "00000000-0000-0000-0000-000000000000"
+    ids = [
+        "27fc3dc6-2656-43cb-8e56-d0dfb75ea0b2",
+        unknown,
+        "b31592e5-673d-46dc-a561-9446438aea0f",
+        "27fc3dc6-2656-43cb-8e56-d0dfb75ea0b2",
+    ]
+    resp = client.post("/api/v1/films/batch", json={"ids": ids})
+    assert resp.status_code == HTTPStatus.OK
+    body = resp.json()
+    assert [x["uuid"] for x in body["items"]] == [ids[0], ids[2]]
+    assert body["items"][1]["title"] == "Lunar: The Silver Star"
+    assert body["missing"] == [unknown]
+
+
+def test_films_batch_validates_ids(client):
+    resp = client.post("/api/v1/films/batch", json={"ids": []})
+    assert resp.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    resp = client.post("/api/v1/films/batch", json={"ids": ["not-a-uuid"]})
+    assert resp.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_films_export_ndjson(client):
+    resp = client.get("/api/v1/films/export")
+    assert resp.status_code == HTTPStatus.OK
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    docs = [orjson.loads(line) for line in resp.content.splitlines()]
+    assert len(docs) == 5
+    assert docs[0]["id"] == "b31592e5-673d-46dc-a561-9446438aea0f"
+
+
+def test_films_export_fields_genre_and_gzip(client):
+    genre = "6f822a92-7b51-4753-8d00-ecfedf98a937"
+    resp = client.get(f"/api/v1/films/export?fields=id,title&genre={genre}&gzip=true")
+    assert resp.status_code == HTTPStatus.OK
+    assert resp.headers["content-encoding"] == "gzip"
+    # httpx сам распаковывает тело по Content-Encoding
+    lines = resp.content.splitlines()
+    docs = [orjson.loads(line) for line in lines]
+    assert [d["title"] for d in docs] == ["Lunar: The Silver Star", "Silent Moon"]
+    assert set(docs[0]) == {"id", "title"}
+
+
+def test_films_export_rejects_unknown_fields(client):
+    resp = client.get("/api/v1/films/export?fields=id,budget")
+    assert resp.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_metrics_use_route_template(client):
+    film_id = "b31592e5-673d-46dc-a561-9446438aea0f"
+    client.get(f"/api/v1/films/{film_id}")
+    client.get("/api/v1/films/does-not-exist")
+
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    body = resp.text
+    assert 'route="/api/v1/films/{film_id}"' in body
+    assert film_id not in body
+    assert 'status="404"' in body
+    assert "does-not-exist" not in body
+    assert "http_requests_in_progress" in body
+
+
+def test_films_suggest_by_title_and_word_prefix(client):
+    resp = client.get("/api/v1/films/suggest?prefix=SIL")
+    assert resp.status_code == HTTPStatus.OK
+    # начало названия и начало слова, по убыванию рейтинга
+    assert [x["title"] for x in resp.json()] == [
+        "Lunar: The Silver Star",
+        "Silent Moon",
+    ]
+    assert set(resp.json()[0]) == {"uuid", "title", "imdb_rating"}
+    assert "max-age" in resp.headers["Cache-Control"]
+
+    resp = client.get("/api/v1/films/suggest?prefix=lunar:%20the&limit=1")
+    assert [x["title"] for x in resp.json()] == ["Lunar: The Silver Star"]
+    assert client.get("/api/v1/films/suggest?prefix=xyz").json() == []
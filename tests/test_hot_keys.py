@@ -0,0 +1,232 @@
+import asyncio
+import random
+import time
+
+import orjson
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from core.settings import settings
+from services.cache_invalidation import CacheInvalidator
+from services.film import FilmService, get_film_service
+from services.hot_keys import CachePrewarmer, HotKeyTracker, get_hot_keys
+from services.local_cache import LocalCache
+from services.sketch import TopK
+from src import main
+from src.main import app
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return None
+
+    def zincrby(self, key, amount, member):
+        self.ops.append(lambda: self.redis.incr(key, member, amount))
+        return self
+
+    def zremrangebyrank(self, key, start, stop):
+        return self
+
+    def expire(self, key, seconds):
+        return self
+
+    async def execute(self):
+        return [op() for op in self.ops]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.zsets = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def incr(self, key, member, amount):
+        zset = self.zsets.setdefault(key, {})
+        zset[member] = zset.get(member, 0) + amount
+
+    async def zunion(self, keys, withscores=False):
+        total = {}
+        for key in keys:
+            for member, score in self.zsets.get(key, {}).items():
+                total[member] = total.get(member, 0) + score
+        return sorted(((m.encode(), s) for m, s in total.items()), key=lambda x: x[1])
+
+
+def test_topk_keeps_heavy_hitters():
+    rnd = random.Random(1)
+    top = TopK(k=5, width=256, depth=4)
+    stream = ["hot-%d" % (i % 3) for i in range(300)]
+    stream += ["cold-%d" % rnd.randrange(10_000) for _ in range(2000)]
+    rnd.shuffle(stream)
+    for item in stream:
+        top.add(item)
+
+    found = [item for item, _ in top.items()][:3]
+    assert sorted(found) == ["hot-0", "hot-1", "hot-2"]
+    assert len(top.items()) == 5
+
+
+def test_tracker_merges_workers_in_redis():
+    redis = FakeRedis()
+    first = HotKeyTracker(redis, k=10)
+    second = HotKeyTracker(redis, k=10)
+
+    async def run():
+        for _ in range(3):
+            first.record("detail", film_id="a")
+        second.record("detail", film_id="a")
+        second.record("detail", film_id="b")
+        await first.flush()
+        await second.flush()
+        return await first.hot(10)
+
+    hot = asyncio.run(run())
+    assert hot == [
+        ({"film_id": "a", "op": "detail"}, 4),
+        ({"film_id": "b", "op": "detail"}, 1),
+    ]
+
+
+def test_prewarm_replays_hot_requests_with_bounded_concurrency():
+    redis = FakeRedis()
+    tracker = HotKeyTracker(redis)
+    for n in range(20):
+        tracker.record("detail", film_id=str(n))
+    tracker.record("list", sort="-imdb_rating", genre=None, page_number=1, page_size=50)
+    tracker.record("search", query="star", page_number=300, page_size=50)
+
+    class Service:
+        def __init__(self):
+            self.calls = []
+            self.running = self.peak = 0
+
+        async def _call(self, name):
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            await asyncio.sleep(0.001)
+            self.running -= 1
+            self.calls.append(name)
+
+        async def get_film_raw(self, film_id):
+            await self._call("detail")
+
+        async def list_films_raw(self, sort, page_number, page_size, **options):
+            await self._call("list")
+
+        async def search_films_raw(self, query, page_number, page_size, **options):
+            # устаревший запрос: такая страница теперь слишком глубокая
+            raise HTTPException(status_code=400, detail="page is too deep")
+
+    service = Service()
+    prewarmer = CachePrewarmer(tracker, lambda: service, concurrency=4)
+
+    async def run():
+        await tracker.flush()
+        return await prewarmer.prewarm()
+
+    assert asyncio.run(run()) == 21
+    assert service.peak == 4
+    assert sorted(set(service.calls)) == ["detail", "list"]
+
+
+def test_api_records_requests(client):
+    tracker = HotKeyTracker(FakeRedis())
+    app.dependency_overrides[get_hot_keys] = lambda: tracker
+    film_id = "b31592e5-673d-46dc-a561-9446438aea0f"
+    client.get(f"/api/v1/films/{film_id}")
+    client.get(f"/api/v1/films/{film_id}")
+    client.get("/api/v1/films/search?query=%20Silver%20%20STAR")
+
+    counts = {orjson.loads(item)["op"]: c for item, c in tracker._top.items()}
+    assert counts == {"detail": 2, "search": 1}
+    assert any("silver star" in item for item, _ in tracker._top.items())
+
+
+def test_lifespan_starts_and_cancels_tracker_and_prewarmer(monkeypatch):
+    events = []
+
+    def background(name):
+        async def run(self):
+            events.append(f"{name}:start")
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                events.append(f"{name}:cancelled")
+                raise
+
+        return run
+
+    async def flush(self):
+        events.append("tracker:flush")
+
+    monkeypatch.setattr(settings, "HOT_KEYS_ENABLED", True)
+    monkeypatch.setattr(settings, "CACHE_PREWARM_ENABLED", True)
+    monkeypatch.setattr(HotKeyTracker, "run", background("tracker"))
+    monkeypatch.setattr(HotKeyTracker, "flush", flush)
+    monkeypatch.setattr(CachePrewarmer, "run", background("prewarm"))
+
+    with TestClient(app):
+        # задачи стартуют в цикле портала TestClient, не сразу после startup
+        started = time.monotonic()
+        while len(events) < 2 and time.monotonic() - started < 2:
+            time.sleep(0.01)
+        assert sorted(events) == ["prewarm:start", "tracker:start"]
+    # остановка воркера: задачи отменены, затем счётчики сброшены в Redis
+    assert sorted(events[2:4]) == ["prewarm:cancelled", "tracker:cancelled"]
+    assert events[4:] == ["tracker:flush"]
+
+
+def test_background_film_service_is_the_one_routes_get():
+    probe = FastAPI()
+
+    @probe.get("/")
+    def route(service: FilmService = Depends(get_film_service)):
+        return {"id": id(service)}
+
+    get_film_service.cache_clear()
+    try:
+        with TestClient(probe) as client:
+            routed = client.get("/").json()["id"]
+        assert id(main._film_service()) == routed
+    finally:
+        get_film_service.cache_clear()
+
+
+def test_incremental_load_message_triggers_prewarm():
+    prewarmer = CachePrewarmer(tracker=None, service_factory=None, check_interval=60)
+    warmed = []
+
+    async def prewarm():
+        warmed.append(1)
+        return 0
+
+    prewarmer.prewarm = prewarm
+    local = LocalCache(max_items=10, max_bytes=100, ttl=60)
+    inv = CacheInvalidator(redis=None, local_cache=local, channel="films:invalidate")
+    inv.reload_listeners.append(prewarmer.request)
+
+    async def run():
+        task = asyncio.create_task(prewarmer.run())
+        await asyncio.sleep(0.01)
+        # только страницы представлений: ключи Redis целы, прогревать нечего
+        views = {"o": "es_load", "k": [], "p": ["v1:films:rank:"]}
+        inv.handle_message(b"films:invalidate", orjson.dumps(views))
+        await asyncio.sleep(0.01)
+        assert len(warmed) == 1
+        purge = {"o": "es_load", "k": ["v1:f1"]}
+        inv.handle_message(b"films:invalidate", orjson.dumps(purge))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+    # при старте и после чистки ключей загрузчиком, без ожидания check_interval
+    assert len(warmed) == 2
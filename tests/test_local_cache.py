@@ -0,0 +1,56 @@
+import orjson
+
+from services.cache_invalidation import FLUSH_ALL, CacheInvalidator
+from services.local_cache import LocalCache
+
+
+def test_local_cache_lru_by_items():
+    cache = LocalCache(max_items=2, max_bytes=1000, ttl=60)
+    cache.set("a", 1, 1)
+    cache.set("b", 2, 1)
+    assert cache.get("a") == 1  # "a" становится самым свежим
+    cache.set("c", 3, 1)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_local_cache_bytes_cap_and_ttl():
+    cache = LocalCache(max_items=100, max_bytes=10, ttl=60)
+    cache.set("a", "x", 6)
+    cache.set("b", "y", 6)  # превышение объёма вытесняет "a"
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 6
+
+    cache.set("big", "z", 11)  # больше лимита — не кешируется
+    assert cache.get("big") is None
+
+    cache.set("short", "v", 1, ttl=0)
+    assert cache.get("short") is None
+
+
+def test_invalidation_message_drops_keys():
+    cache = LocalCache(max_items=10, max_bytes=100, ttl=60)
+    inv = CacheInvalidator(redis=None, local_cache=cache, channel="films:invalidate")
+    cache.set("a", 1, 1)
+    cache.set("b", 2, 1)
+
+    # собственные сообщения воркер игнорирует
+    own = orjson.dumps({"o": inv.origin, "k": ["a"]})
+    inv.handle_message(b"films:invalidate", own)
+    assert cache.get("a") == 1
+
+    other = orjson.dumps({"o": "another-worker", "k": ["a"]})
+    inv.handle_message(b"films:invalidate", other)
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+    inv.handle_message(b"__keyevent@0__:evicted", b"b")
+    assert cache.get("b") is None
+
+    cache.set("c", 3, 1)
+    flush = orjson.dumps({"o": "another-worker", "k": [FLUSH_ALL]})
+    inv.handle_message(b"films:invalidate", flush)
+    assert cache.get("c") is None
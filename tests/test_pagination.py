@@ -0,0 +1,29 @@
+import pytest
+
+from core.pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_roundtrip_with_pit():
+    cursor = encode_cursor([9.2, "b31592e5"], "films:list:sort=-imdb_rating", "pit-1")
+    assert decode_cursor(cursor, "films:list:sort=-imdb_rating") == (
+        [9.2, "b31592e5"],
+        "pit-1",
+    )
+
+
+def test_cursor_infinity_is_sent_as_string():
+    # sort-значение для фильма без рейтинга (missing: _last)
+    cursor = encode_cursor([float("-inf"), "id"], "films:list:")
+    assert decode_cursor(cursor, "films:list:") == (["-Infinity", "id"], None)
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "e30", ""])
+def test_cursor_rejects_garbage(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "films:list:")
+
+
+def test_cursor_rejects_other_query():
+    cursor = encode_cursor([1.0, "id"], "films:search:q=star")
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "films:search:q=moon")
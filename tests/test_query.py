@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from core.query import normalize_query, parse_stop_words
+from services.film import FilmService, _cache_key
+
+
+@pytest.mark.parametrize(
+    "raw", ["Star Wars", "star  wars ", "STAR WARS", "\tStar Wars"]
+)
+def test_query_spellings_share_one_form(raw):
+    assert normalize_query(raw) == "star wars"
+
+
+def test_stop_words_are_dropped_unless_nothing_is_left():
+    stop_words = parse_stop_words("The, of ,a")
+    assert normalize_query("The Lord of the Rings", stop_words) == "lord rings"
+    assert normalize_query("The A", stop_words) == "the a"
+    assert normalize_query("   ", stop_words) == ""
+
+
+def test_search_keys_have_fixed_length():
+    short = _cache_key("films:search", {"q": "a", "page_size": 50}, hashed=True)
+    long = _cache_key("films:search", {"q": "x" * 5000, "page_size": 50}, hashed=True)
+    assert short.startswith("films:search:")
+    assert len(short) == len(long) == len("films:search:") + 32
+
+
+def test_search_sends_normalized_query_to_es():
+    class Elastic:
+        def __init__(self):
+            self.queries = []
+
+        async def search(self, **search):
+            self.queries.append(search["query"]["multi_match"]["query"])
+            return {"hits": {"hits": []}}
+
+    elastic = Elastic()
+    service = FilmService(None, elastic)
+
+    async def run():
+        await service.search_films_raw("  Silver   STAR ", 1, 10)
+        return await service.search_films_raw(" \t ", 1, 10)
+
+    empty = asyncio.run(run())
+    assert elastic.queries == ["silver star"]
+    assert empty.payload == b"[]"
@@ -0,0 +1,183 @@
+import asyncio
+import struct
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+from core.pagination import decode_cursor
+from core.settings import settings
+from services.cache_invalidation import CacheInvalidator
+from services.film import FilmService
+from services.local_cache import LocalCache
+from services.rank_views import RankViews, es_sort_value
+
+FILMS = [
+    ("a", "Alpha", 9.2, ["g1"]),
+    ("b", "Beta", 8.0, ["g2"]),
+    ("c", "Gamma", 8.0, ["g1"]),
+    ("d", "Delta", None, ["g1"]),
+]
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return None
+
+    def zrange(self, key, start, stop):
+        self.ops.append(lambda: self.redis.zsets.get(key, [])[start : stop + 1])
+        return self
+
+    def exists(self, key):
+        self.ops.append(lambda: int(key in self.redis.zsets))
+        return self
+
+    async def execute(self):
+        return [op() for op in self.ops]
+
+
+class FakeRedis:
+    def __init__(self, built=True):
+        self.zsets = {}
+        self.rows = {}
+        if not built:
+            return
+        # порядок как у ZRANGE по score -рейтинг, равные — по id
+        ordered = sorted(FILMS, key=lambda f: (f[2] is None, -(f[2] or 0), f[0]))
+        self.zsets["films:rank:all"] = [f[0].encode() for f in ordered]
+        for film_id, title, rating, genres in ordered:
+            self.rows[film_id.encode()] = orjson.dumps(
+                {"uuid": film_id, "title": title, "imdb_rating": rating}
+            )
+            for genre in genres:
+                self.zsets.setdefault(f"films:rank:genre:{genre}", []).append(
+                    film_id.encode()
+                )
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def hmget(self, key, ids):
+        return [self.rows.get(i) for i in ids]
+
+    async def zrank(self, key, member):
+        members = self.zsets.get(key, [])
+        return members.index(member.encode()) if member.encode() in members else None
+
+
+class CountingElastic:
+    def __init__(self):
+        self.searches = 0
+
+    async def search(self, **search):
+        self.searches += 1
+        return {"hits": {"hits": []}}
+
+
+def _service(redis):
+    elastic = CountingElastic()
+    return FilmService(None, elastic, rank_views=RankViews(redis)), elastic
+
+
+def _uuids(entry):
+    return [row["uuid"] for row in orjson.loads(entry.payload)]
+
+
+def test_list_pages_come_from_rank_views():
+    service, elastic = _service(FakeRedis())
+
+    async def run():
+        first = await service.list_films_raw("-imdb_rating", 1, 2)
+        rest = await service.list_films_raw(
+            "-imdb_rating", 1, 2, cursor=first.next_cursor
+        )
+        genre = await service.list_films_raw("-imdb_rating", 2, 1, genre="g1")
+        return first, rest, genre
+
+    first, rest, genre = asyncio.run(run())
+
+    assert _uuids(first) == ["a", "b"]
+    assert _uuids(rest) == ["c", "d"]
+    assert _uuids(genre) == ["c"]
+    assert elastic.searches == 0
+    # курсор годится и для ES: sort-значения как у поля float
+    search_after, _ = decode_cursor(first.next_cursor, "films:list:sort=-imdb_rating")
+    assert search_after == [8.0, "b"]
+
+
+def test_list_falls_back_to_es_without_views_or_for_other_sorts():
+    async def run(service, sort):
+        return await service.list_films_raw(sort, 1, 2)
+
+    service, elastic = _service(FakeRedis(built=False))
+    asyncio.run(run(service, "-imdb_rating"))
+    assert elastic.searches == 1
+
+    service, elastic = _service(FakeRedis())
+    asyncio.run(run(service, "imdb_rating"))
+    assert elastic.searches == 1
+
+
+class Generation:
+    def __init__(self):
+        self.value = 1
+
+    async def prefix(self):
+        return f"v{self.value}:"
+
+
+def test_view_pages_in_l1_follow_generation_and_invalidation():
+    redis, generation = FakeRedis(), Generation()
+    local = LocalCache(max_items=10, max_bytes=10_000, ttl=60)
+    service = FilmService(
+        None,
+        CountingElastic(),
+        local_cache=local,
+        generation=generation,
+        rank_views=RankViews(redis),
+    )
+    inv = CacheInvalidator(redis=None, local_cache=local, channel="films:invalidate")
+
+    def page():
+        return _uuids(asyncio.run(service.list_films_raw("-imdb_rating", 1, 2)))
+
+    assert page() == ["a", "b"]
+    assert list(local._data) == ["v1:films:rank:all:0:2"]
+    redis.zsets["films:rank:all"].remove(b"a")
+    # горячая страница живёт в L1, пока её не отрежет поколение или сообщение
+    assert page() == ["a", "b"]
+    generation.value = 2
+    assert page() == ["b", "c"]
+
+    redis.zsets["films:rank:all"].remove(b"b")
+    message = orjson.dumps({"o": "es_load", "k": [], "p": ["v2:films:rank:"]})
+    inv.handle_message(b"films:invalidate", message)
+    assert page() == ["c", "d"]
+
+
+def test_es_sort_value_matches_float_field():
+    assert es_sort_value(9.2) == struct.unpack("f", struct.pack("f", 9.2))[0]
+    assert es_sort_value(9.2) != 9.2
+    assert es_sort_value(None) == float("-inf")
+
+
+def test_views_keep_the_es_result_window(monkeypatch):
+    monkeypatch.setattr(settings, "ES_MAX_RESULT_WINDOW", 4)
+    service, elastic = _service(FakeRedis())
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(service.list_films_raw("-imdb_rating", 3, 2))
+    # тот же ответ, что без представлений
+    assert exc.value.status_code == 400
+    assert elastic.searches == 0
+    assert _uuids(asyncio.run(service.list_films_raw("-imdb_rating", 2, 2))) == [
+        "c",
+        "d",
+    ]
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+from prometheus_client import REGISTRY
+
+from services.singleflight import SingleFlight
+
+
+def _coalesced(result):
+    labels = {"scope": "local", "result": result}
+    return REGISTRY.get_sample_value("film_cache_coalesced_total", labels) or 0.0
+
+
+def test_singleflight_coalesces_concurrent_calls():
+    sf = SingleFlight()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return ["row"]
+
+    async def run():
+        return await asyncio.gather(*(sf.do("films:list", load) for _ in range(10)))
+
+    leaders, followers = _coalesced("leader"), _coalesced("follower")
+    results = asyncio.run(run())
+
+    assert calls == 1
+    assert results == [["row"]] * 10
+    assert sf.coalesced == 9
+    assert not sf._inflight
+    # роли видны в /metrics
+    assert _coalesced("leader") - leaders == 1
+    assert _coalesced("follower") - followers == 9
+
+
+def test_singleflight_shares_errors_and_forgets_key():
+    sf = SingleFlight()
+
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("es down")
+
+    async def run():
+        return await asyncio.gather(
+            sf.do("k", boom), sf.do("k", boom), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+    # после ошибки ключ свободен — следующий вызов снова идёт в бэкенд
+    async def ok():
+        return 1
+
+    assert asyncio.run(sf.do("k", ok)) == 1
+    assert sf.calls == 2
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(sf.do("k", boom))
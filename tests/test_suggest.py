@@ -0,0 +1,74 @@
+import asyncio
+
+import orjson
+
+from services.suggest import SuggestIndex, SuggestService, normalize_title
+
+
+def _docs(n):
+    return [
+        {"id": f"id-{i}", "title": f"Star {i}", "imdb_rating": i / 10} for i in range(n)
+    ]
+
+
+def test_normalize_title():
+    assert normalize_title("  Amélie:  the   FABULOUS ") == "amelie the fabulous"
+
+
+def test_suggest_ranks_by_rating_and_limits():
+    docs = _docs(50) + [{"id": "none", "title": "Starless", "imdb_rating": None}]
+    index = SuggestIndex(docs, max_limit=5)
+
+    # короткий префикс — из предпосчитанных ответов, длинный — через bisect
+    assert _titles(index, "s", 3) == ["Star 49", "Star 48", "Star 47"]
+    assert _titles(index, "star", 3) == ["Star 49", "Star 48", "Star 47"]
+    assert _titles(index, "star 4", 3) == ["Star 49", "Star 48", "Star 47"]
+    assert _titles(index, "starl", 3) == ["Starless"]
+    # limit не больше max_limit
+    assert len(_titles(index, "star", 100)) == 5
+    assert _titles(index, "!!!", 3) == []
+
+
+def test_suggest_service_rebuilds_on_new_generation():
+    class Generation:
+        value = 1
+
+        async def current(self):
+            return self.value
+
+    class Elastic:
+        def __init__(self):
+            self.docs = _docs(3)
+
+        async def open_point_in_time(self, index, keep_alive):
+            return {"id": "pit"}
+
+        async def close_point_in_time(self, id):
+            return {}
+
+        async def search(self, **search):
+            start = search.get("search_after", [0])[0]
+            page = self.docs[start : start + search["size"]]
+            hits = [{"_source": d, "sort": [start + i + 1]} for i, d in enumerate(page)]
+            return {"pit_id": "pit", "hits": {"hits": hits}}
+
+    elastic, generation = Elastic(), Generation()
+    service = SuggestService(
+        elastic, index="movies", generation=generation, slice_size=2
+    )
+
+    async def run():
+        assert await service.stale()
+        await service.rebuild()
+        assert not await service.stale()
+        generation.value = 2
+        elastic.docs = _docs(5)
+        assert await service.stale()
+        await service.rebuild()
+
+    asyncio.run(run())
+    assert len(service.index) == 5
+
+
+def _titles(index, prefix, limit):
+    return [x["title"] for x in orjson.loads(index.payload(prefix, limit))]
@@ -0,0 +1,80 @@
+import asyncio
+
+from services.film import FilmService
+from services.ttl_policy import DETAIL, SEARCH, Ttl, TtlPolicy
+
+
+def _policy(**kwargs):
+    options = dict(
+        limits={DETAIL: (300, 300, 3600), SEARCH: (300, 60, 900)},
+        stale=300,
+        stale_if_error=86400,
+        fixed_ttl=300,
+        jitter=0.0,
+    )
+    options.update(kwargs)
+    return TtlPolicy(**options)
+
+
+def test_one_off_search_gets_short_ttl_without_stale_if_error_tail():
+    policy = _policy()
+    policy.observe_read(SEARCH, "films:search:abc", hit=False)
+    assert policy.ttl(SEARCH, "films:search:abc") == Ttl(60, 360)
+
+
+def test_hot_key_ttl_grows_up_to_ceiling():
+    policy = _policy()
+    ttls = []
+    for _ in range(64):
+        policy.observe_read(DETAIL, "film", hit=True)
+        ttls.append(policy.ttl(DETAIL, "film").soft)
+    assert ttls == sorted(ttls)
+    assert ttls[1] == 300
+    assert ttls[-1] == 3600
+    assert policy.ttl(DETAIL, "film").hard == 3600 + 86400
+
+
+def test_frequent_reloads_lower_ceiling(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("services.ttl_policy.time.monotonic", lambda: now[0])
+    policy = _policy(window=10**9)
+    for generation in range(5):
+        policy.observe_generation(f"v{generation}:")
+        now[0] += 1200
+    for _ in range(64):
+        policy.observe_read(DETAIL, "film", hit=True)
+    # каталог перезаливают раз в 20 минут — дольше 10 минут не держим
+    assert policy.ttl(DETAIL, "film").soft == 600
+
+
+def test_jitter_stays_in_bounds():
+    policy = _policy(jitter=0.1)
+    policy.observe_read(DETAIL, "film", hit=False)
+    ttls = {policy.ttl(DETAIL, "film").soft for _ in range(200)}
+    assert min(ttls) >= 270 and max(ttls) <= 330
+    assert len(ttls) > 10
+
+
+def test_fixed_policy_ignores_popularity():
+    policy = _policy(adaptive=False)
+    policy.observe_read(SEARCH, "q", hit=False)
+    assert policy.ttl(SEARCH, "q") == Ttl(300, 300 + 86400)
+
+
+def test_service_reports_hit_ratio_and_memory_saved(fake_redis, fake_es):
+    policy = _policy()
+    service = FilmService(fake_redis, fake_es, ttl_policy=policy)
+
+    async def run():
+        for query in ["star", "moon", "sun"]:
+            await service.search_films_raw(query, 1, 10)
+        for _ in range(3):
+            await service.search_films_raw("star", 1, 10)
+
+    asyncio.run(run())
+
+    # разовые запросы живут минимальный TTL и без суточного хвоста
+    assert sorted(fake_redis.ttls.values()) == [360, 360, 360]
+    stats = policy.stats()
+    assert stats["hit_ratio"] == 0.5
+    assert stats["memory_saved"] > 0.9